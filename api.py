@@ -0,0 +1,230 @@
+import os, json, time
+from datetime import datetime
+from flask import Flask, jsonify, Response, request
+
+import ipc
+import ledger
+
+# 읽기 전용 웹/API 프로세스: app.py(엔진)를 import하지 않고 엔진이 발행한 mmap 스냅샷만 읽는다
+# 실행: RUN_MODE=engine python app.py  +  gunicorn wsgi:app -k gthread --threads 8
+#       (또는 RUN_MODE=split python app.py 하나로 둘 다)
+
+STREAM_POLL = float(os.getenv("STREAM_POLL", 0.25))
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", 15))
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", 3000))
+ENGINE_STALE_SEC = float(os.getenv("ENGINE_STALE_SEC", 10))
+
+# 스냅샷 seq가 바뀔 때만 디코드. 워커 스레드들이 같은 캐시를 공유(교체는 참조 대입 한 번)
+class SnapshotView:
+    def __init__(self, root=ipc.SNAPSHOT_DIR):
+        self.root = root
+        self.meta_reader = ipc.SnapshotReader(ipc.snapshot_path("_engine", root))
+        self.events_reader = ipc.SnapshotReader(ipc.snapshot_path("_events", root))
+        self.readers = {}
+        self._meta = (None, None)
+        self._events = (None, None)
+        self._states = {}
+
+    def meta(self):
+        snap = self.meta_reader.read()
+        if snap is None:
+            return None
+        raw, meta = self._meta
+        if raw is not snap[1]:
+            meta = json.loads(snap[1])
+            self._meta = (snap[1], meta)
+        return meta
+
+    # 엔진 EventBus의 최근 이벤트 링: {"pid", "events": [[seq, kind, symbol, json], ...]}
+    def events(self):
+        snap = self.events_reader.read()
+        if snap is None:
+            return None
+        raw, events = self._events
+        if raw is not snap[1]:
+            events = json.loads(snap[1])
+            self._events = (snap[1], events)
+        return events
+
+    def snapshot(self, symbol):
+        if symbol not in self.readers:
+            self.readers[symbol] = ipc.SnapshotReader(ipc.snapshot_path(symbol, self.root))
+        return self.readers[symbol].read()
+
+    def state(self, symbol):
+        snap = self.snapshot(symbol)
+        if snap is None:
+            return None, None
+        version, raw = snap
+        cached = self._states.get(symbol)
+        if cached is None or cached[0] != version:
+            cached = (version, json.loads(raw))
+            self._states[symbol] = cached
+        return cached
+
+view = SnapshotView()
+trade_ledger = ledger.Ledger(readonly=True)
+app = Flask(__name__)
+
+def engine_meta():
+    meta = view.meta()
+    if meta is None:
+        return None
+    return dict(meta, age_sec=round(time.time() - meta["ts"], 3))
+
+def request_symbol(meta):
+    sym = request.args.get("symbol", meta["primary"]).upper()
+    if sym in meta["symbols"]:
+        return sym
+    for s, info in meta["symbols"].items():
+        if info["base"] == sym:
+            return s
+    return meta["primary"]
+
+def unavailable():
+    return jsonify({"error": "engine snapshot not available", "snapshot_dir": view.root}), 503
+
+@app.route("/")
+def home():
+    meta = engine_meta()
+    if meta is None:
+        return "Grid Trader API | engine not running", 503
+    stale = " (STALE)" if meta["age_sec"] > ENGINE_STALE_SEC else ""
+    return f"Grid Trader running | AUTO_MODE={meta['auto_mode']} TEST_MODE={meta['test_mode']}{stale}"
+
+# 심볼 스냅샷과 meta(변경 인덱스)는 따로 발행되므로 같은 version을 볼 때까지 다시 읽는다.
+# 끝내 못 맞추면 변경 인덱스 없이(since 무시) 전체를 준다: 다른 version의 인덱스로 델타를 만들면 바뀐 그리드를 영영 놓침
+def consistent_state(sym, meta, attempts=3):
+    for _ in range(attempts):
+        version, s = view.state(sym)
+        info = meta["symbols"].get(sym) if meta else None
+        if info is not None and info["version"] == version:
+            return version, s, ipc.SnapshotChanges(info["changes"])
+        meta = view.meta()
+    return version, s, None
+
+@app.route("/status")
+def status():
+    meta = engine_meta()
+    if meta is None:
+        return unavailable()
+    sym = request_symbol(meta)
+    snap = view.snapshot(sym)
+    if snap is None:
+        return unavailable()
+    version, payload = snap
+    etag = ipc.status_etag(sym, version, request.args)
+    if etag in request.if_none_match:
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+    if any(k in request.args for k in ipc.STATUS_PARAMS):
+        version, s, changes = consistent_state(sym, meta)
+        if s is None:
+            return unavailable()
+        payload = ipc.status_view(s, version, sym, changes, request.args)
+    resp = Response(payload, mimetype="application/json")
+    resp.set_etag(ipc.status_etag(sym, version, request.args))
+    return resp
+
+@app.route("/symbols")
+def symbols():
+    meta = engine_meta()
+    if meta is None:
+        return unavailable()
+    return jsonify({sym: {k: info[k] for k in ("krw", "btc", "strategy", "grids", "version")}
+                    for sym, info in meta["symbols"].items()})
+
+@app.route("/specs")
+def specs():
+    meta = engine_meta()
+    if meta is None:
+        return unavailable()
+    sym = request_symbol(meta)
+    return jsonify({"symbol": sym, "specs": meta["symbols"][sym]["specs"], "cache": meta["spec_cache"]})
+
+@app.route("/tick")
+def tick():
+    try:
+        return jsonify(ipc.call("tick"))
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e), "ts": datetime.utcnow().isoformat()}), 503
+
+@app.route("/metrics")
+def metrics():
+    meta = engine_meta()
+    if meta is None:
+        return unavailable()
+    text = meta["metrics"] + f"# TYPE gridbot_engine_snapshot_age_seconds gauge\ngridbot_engine_snapshot_age_seconds {meta['age_sec']}\n"
+    return Response(text, mimetype="text/plain; version=0.0.4")
+
+# 원장(SQLite WAL)은 엔진이 쓰는 중에도 읽기 전용 연결로 바로 조회. 미실현 손익은 엔진의 마지막 시세 기준
+@app.route("/pnl")
+def pnl():
+    meta = engine_meta()
+    if meta is None or not trade_ledger.available():
+        return unavailable()
+    sym = request_symbol(meta)
+    quote = meta["symbols"][sym]["quote"]
+    return jsonify(ledger.pnl_view(trade_ledger, sym, quote[0] if quote else None, request.args))
+
+@app.route("/fills")
+def fills():
+    meta = engine_meta()
+    if meta is None or not trade_ledger.available():
+        return unavailable()
+    return jsonify(ledger.fills_view(trade_ledger, request_symbol(meta), request.args))
+
+# 엔진이 스냅샷으로 내보낸 EventBus 링을 클라이언트별로 폴링해 그대로 중계 (state/fill/tick 모두, id=엔진 seq)
+# Last-Event-ID로 재접속하면 링에 남아 있는 만큼 이어서 보내고, 링 밖으로 밀린 구간은 gap 이벤트로 알린다. 엔진이 재시작되면(pid 변경) 새 seq부터
+def snapshot_events(kinds, symbol, last_id=None):
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+    ring = view.events() or {"pid": None, "events": []}
+    pid = ring["pid"]
+    last = last_id if last_id is not None else (ring["events"][-1][0] if ring["events"] else 0)
+    last_sent = time.monotonic()
+    while True:
+        ring = view.events() or {"pid": pid, "events": []}
+        if ring["pid"] != pid:
+            pid, last = ring["pid"], 0
+        events = ring["events"]
+        if events and last > events[-1][0]:
+            last = 0
+        if events and last and events[0][0] > last + 1:
+            yield f"event: gap\ndata: {json.dumps({'missed_after': last, 'resume_at': events[0][0]})}\n\n"
+        for seq, kind, sym, payload in events:
+            if seq <= last:
+                continue
+            last = seq
+            if (kinds and kind not in kinds) or (symbol and sym and sym != symbol):
+                continue
+            last_sent = time.monotonic()
+            yield f"id: {seq}\nevent: {kind}\ndata: {payload}\n\n"
+        if time.monotonic() - last_sent >= SSE_KEEPALIVE:
+            last_sent = time.monotonic()
+            yield ": keepalive\n\n"
+        time.sleep(STREAM_POLL)
+
+@app.route("/stream")
+def stream():
+    kinds = set(request.args["events"].split(",")) if request.args.get("events") else None
+    meta = engine_meta()
+    sym = request_symbol(meta) if meta and request.args.get("symbol") else None
+    last_id = request.headers.get("Last-Event-ID", type=int)
+    return Response(snapshot_events(kinds, sym, last_id), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# 거래소를 직접 부르지 않고 엔진이 마지막 틱에서 본 시세를 돌려준다
+@app.route("/price")
+def price():
+    meta = engine_meta()
+    if meta is None:
+        return unavailable()
+    sym = request_symbol(meta)
+    quote = meta["symbols"][sym]["quote"]
+    if not quote:
+        return jsonify({"price": None, "symbol": sym}), 503
+    return jsonify({"price": quote[0], "symbol": sym, "age_sec": round(time.time() - quote[1], 3)})
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", 8080)), threaded=True)
@@ -1,33 +1,64 @@
-import os, time, json, logging, random, threading
+import os, re, sys, time, json, logging, random, threading, atexit, heapq, itertools, queue, signal, subprocess
+BOOT_T0 = time.perf_counter()
+from bisect import bisect_left, bisect_right, insort
 from datetime import datetime
 from threading import Thread
-from flask import Flask, jsonify
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
+from flask import Flask, jsonify, Response, request
 import requests
-import feedparser, pytz
+import pytz
+import ipc
+import gridstore
+import ledger
+import gridcore
+from gridcore import (make_exchange, make_grid_orders, sim_fill_price, TICK_TABLES, tick_size, MarketSpecRegistry,
+                      STRATEGY_PROFILES, apply_strategy_profile)
 
 # ---------- Config & Modes ----------
+# 그리드/검증/전략 관련 설정은 gridcore.py가 읽는다
+from gridcore import (EXCHANGE_ID, API_KEY, API_SECRET, SYMBOL, TOTAL_KRW, N_GRIDS, PRICE_LOW, PRICE_HIGH, GRID_MODE,
+                      STRATEGY_PROFILES_FILE, PRICE_PADDING, CHECK_INTERVAL, SIM_SLIPPAGE, MARKET_SPEC_TTL, MARKET_SPEC_RETRY)
 DEFAULT_TEST_MODE = os.getenv("TEST_MODE", "true").lower() == "true"
 SIMULATION = os.getenv("SIMULATION", "true").lower() == "true"
 AUTO_MODE_ENV = os.getenv("AUTO_MODE", "false").lower() == "true"
-EXCHANGE_ID = os.getenv("EXCHANGE", "upbit")
-API_KEY = os.getenv("API_KEY", "")
-API_SECRET = os.getenv("API_SECRET", "")
-SYMBOL = os.getenv("SYMBOL", "BTC/KRW")
-TOTAL_KRW = float(os.getenv("TOTAL_KRW", 200000))
-N_GRIDS = int(os.getenv("N_GRIDS", 20))
-PRICE_LOW = os.getenv("PRICE_LOW")
-PRICE_HIGH = os.getenv("PRICE_HIGH")
-GRID_MODE = os.getenv("GRID_MODE", "equal")
-PRICE_PADDING = float(os.getenv("PRICE_PADDING", 0.0))
-CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", 5))
+SYMBOLS = [SYMBOL] + [s.strip().upper() for s in os.getenv("SYMBOLS", "").split(",") if s.strip() and s.strip().upper() != SYMBOL]
+SYMBOL_WORKERS = int(os.getenv("SYMBOL_WORKERS", min(4, len(SYMBOLS))))
 CONFIRM_TIMEOUT = int(os.getenv("CONFIRM_TIMEOUT", 30))
+SIM_ENGINE = os.getenv("SIM_ENGINE", "fixed")
+EXEC_WORKERS = int(os.getenv("EXEC_WORKERS", 4))
+ORDER_RATE_PER_SEC = float(os.getenv("ORDER_RATE_PER_SEC", 8))
+ORDER_BURST = int(os.getenv("ORDER_BURST", 8))
+ORDER_PENDING_SEC = float(os.getenv("ORDER_PENDING_SEC", 30))
+SSE_BUFFER = int(os.getenv("SSE_BUFFER", 256))
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", 15))
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", 3000))
+PRICE_FEED = os.getenv("PRICE_FEED", "rest").lower()
+STREAM_URL = os.getenv("STREAM_URL", "wss://api.upbit.com/websocket/v1")
+STREAM_STALE_SEC = float(os.getenv("STREAM_STALE_SEC", 10))
+# 적응형 폴링: 가장 가까운 레벨까지 SCHED_NEAR_PCT 거리일 때 check_interval, 가까울수록 짧게/멀수록 길게
+ADAPTIVE_POLL = os.getenv("ADAPTIVE_POLL", "true").lower() == "true"
+SCHED_NEAR_PCT = float(os.getenv("SCHED_NEAR_PCT", 0.002))
+SCHED_MIN_INTERVAL = float(os.getenv("SCHED_MIN_INTERVAL", 1))
+SCHED_MAX_INTERVAL = float(os.getenv("SCHED_MAX_INTERVAL", 60))
 DATA_FILE = os.getenv("DATA_FILE", "grid_state.json")
 LOGFILE = os.getenv("LOGFILE", "grid_trader.log")
 PORT = int(os.getenv("PORT", 8080))
+# all: 한 프로세스에서 엔진+Flask / engine: 엔진만(스냅샷 발행+명령 소켓) / split: engine + gunicorn(wsgi:app) 자식 프로세스
+RUN_MODE = os.getenv("RUN_MODE", "all").lower()
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", 0.2))
+# engine/split: API 프로세스의 /stream이 읽을 최근 이벤트 수 (스냅샷 "_events"에 링으로 발행)
+EVENT_HISTORY = int(os.getenv("EVENT_HISTORY", 512))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", 2))
+WEB_THREADS = int(os.getenv("WEB_THREADS", 8))
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "")
 TELEGRAM_API = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}" if TELEGRAM_BOT_TOKEN else ""
+TG_QUEUE_MAX = int(os.getenv("TG_QUEUE_MAX", 500))
+TG_RATE_PER_SEC = float(os.getenv("TG_RATE_PER_SEC", 1))
+TG_BURST = int(os.getenv("TG_BURST", 3))
+TG_DIGEST_WINDOW = float(os.getenv("TG_DIGEST_WINDOW", 2))
 
 # --- 뉴스 환경 ---
 NEWS_ENABLED_DEFAULT = os.getenv("NEWS_ENABLED", "true").lower() == "true"
@@ -37,11 +68,25 @@ NEWS_SOURCES = [s.strip().lower() for s in os.getenv("NEWS_SOURCES", "coindesk,c
 NEWS_FILTER = [s.strip().lower() for s in os.getenv("NEWS_FILTER", "bitcoin,btc").split(",") if s.strip()]
 LOCAL_TZ = pytz.timezone(os.getenv("TIMEZONE", "Asia/Seoul"))
 
+NEWS_FETCH_WORKERS = int(os.getenv("NEWS_FETCH_WORKERS", 4))
+NEWS_FETCH_TIMEOUT = float(os.getenv("NEWS_FETCH_TIMEOUT", 10))
+NEWS_CACHE_TTL = float(os.getenv("NEWS_CACHE_TTL", 300))
+NEWS_NOW_MAX_AGE = float(os.getenv("NEWS_NOW_MAX_AGE", 60))
+NEWS_CACHE_FILE = os.getenv("NEWS_CACHE_FILE", "news_cache.json")
+NEWS_SEEN_FILE = os.getenv("NEWS_SEEN_FILE", "news_seen.json")
+NEWS_SEEN_MAX = int(os.getenv("NEWS_SEEN_MAX", 5000))
+NEWS_SEEN_DAYS = float(os.getenv("NEWS_SEEN_DAYS", 30))
+
 RSS_MAP = {
     "coindesk": "https://www.coindesk.com/arc/outboundfeeds/rss/",
     "cointelegraph": "https://cointelegraph.com/rss",
     "bitcoinmagazine": "https://bitcoinmagazine.com/.rss/full/",
 }
+# 추가 소스: NEWS_RSS_EXTRA="name=url,name2=url2"
+for _pair in os.getenv("NEWS_RSS_EXTRA", "").split(","):
+    if "=" in _pair:
+        _name, _url = _pair.split("=", 1)
+        RSS_MAP[_name.strip().lower()] = _url.strip()
 
 # ---------- Logging ----------
 logger = logging.getLogger("grid_trader")
@@ -52,49 +97,536 @@ fh.setFormatter(fmt)
 logger.addHandler(fh)
 logger.addHandler(logging.StreamHandler())
 
+# ---------- Startup timing ----------
+# 부팅 구간별 소요시간. 첫 / 응답이나 첫 틱 때 한 번 로그로 남기고 /metrics에도 노출
+class StartupReport:
+    def __init__(self, t0):
+        self.t0 = self.last = t0
+        self.phases = []
+        self.reported = False
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def finish(self, event):
+        if self.reported:
+            return
+        self.reported = True
+        self.mark(event)
+        parts = " | ".join(f"{p}={d * 1000:.0f}ms" for p, d in self.phases)
+        logger.info(f"startup {self.last - self.t0:.2f}s | {parts}")
+
+startup = StartupReport(BOOT_T0)
+startup.mark("imports")
+
+# ---------- Metrics ----------
+# 스레드별 샤드에 누적하고 /metrics 요청 때만 합산 → 핫패스는 락 없이 자기 스레드 dict만 갱신
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOCK_BUCKETS = (0.000001, 0.000005, 0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+metrics_registry = []
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+        metrics_registry.append(self)
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                # 요청마다 스레드가 생기므로 등록할 때도 끝난 스레드 샤드를 접는다 (/metrics를 안 긁어도 목록이 안 커짐)
+                self._prune()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _merge(self, into, key, val):
+        into[key] = into.get(key, 0) + val
+
+    # 끝난 스레드의 샤드는 더 안 바뀌므로 _retired에 합치고 목록에서 뺀다. self._lock 안에서 호출
+    def _prune(self):
+        alive = []
+        for th, shard in self._shards:
+            if th.is_alive():
+                alive.append((th, shard))
+            else:
+                for key, val in list(shard.items()):
+                    self._merge(self._retired, key, val)
+        self._shards = alive
+        return alive
+
+    def collect(self):
+        with self._lock:
+            alive = self._prune()
+            total = {}
+            for key, val in list(self._retired.items()):
+                self._merge(total, key, val)
+            for _, shard in alive:
+                for key, val in list(shard.items()):
+                    self._merge(total, key, val)
+        return total
+
+    def labelstr(self, values, extra=None):
+        pairs = list(zip(self.labelnames, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, val in sorted(self.collect().items()):
+            lines.append(f"{self.name}{self.labelstr(key)} {val}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, n=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + n
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        h = shard.get(labels)
+        if h is None:
+            h = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        h[bisect_left(self.buckets, value)] += 1
+        h[-1] += value
+
+    def _merge(self, into, key, val):
+        cur = into.get(key)
+        into[key] = list(val) if cur is None else [a + b for a, b in zip(cur, val)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, h in sorted(self.collect().items()):
+            acc = 0
+            for le, n in zip(self.buckets + ("+Inf",), h):
+                acc += n
+                lines.append(f"{self.name}_bucket{self.labelstr(key, ('le', le))} {acc}")
+            lines.append(f"{self.name}_sum{self.labelstr(key)} {h[-1]:.6f}")
+            lines.append(f"{self.name}_count{self.labelstr(key)} {acc}")
+        return lines
+
+# 값은 스크레이프 시점에 fn()이 (라벨튜플, 값) 목록으로 돌려줌. 이미 다른 곳에서 세는 누적값은 kind="counter"
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), fn=None, kind="gauge"):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+        self.kind = kind
+
+    def collect(self):
+        try:
+            return dict(self.fn()) if self.fn else {}
+        except Exception as e:
+            logger.warning(f"metric {self.name} failed: {e}")
+            return {}
+
+# 가장 바깥 acquire만 대기/보유 시간을 잰다 (RLock 재진입은 제외)
+class TimedLock:
+    def __init__(self, lock, name):
+        self._lock = lock
+        self.name = name
+        self._local = threading.local()
+
+    def acquire(self, blocking=True, timeout=-1):
+        t0 = time.perf_counter()
+        ok = self._lock.acquire(blocking, timeout)
+        if ok:
+            depth = getattr(self._local, "depth", 0)
+            if depth == 0:
+                self._local.since = time.perf_counter()
+                LOCK_WAIT.observe(self._local.since - t0, self.name)
+            self._local.depth = depth + 1
+        return ok
+
+    def release(self):
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            LOCK_HOLD.observe(time.perf_counter() - self._local.since, self.name)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+TICK_SECONDS = Histogram("gridbot_tick_seconds", "Grid tick duration", ["symbol"])
+PRICE_FEED_SECONDS = Histogram("gridbot_price_feed_seconds", "Exchange ticker request latency", ["op"])
+SPECS_SECONDS = Histogram("gridbot_specs_seconds", "get_ccxt_specs latency", buckets=LOCK_BUCKETS)
+STORE_SECONDS = Histogram("gridbot_state_store_seconds", "State journal append / snapshot / compaction time", ["op"])
+LOCK_WAIT = Histogram("gridbot_state_lock_wait_seconds", "Time spent waiting for a state lock", ["store"], LOCK_BUCKETS)
+LOCK_HOLD = Histogram("gridbot_state_lock_hold_seconds", "Time a state lock was held", ["store"], LOCK_BUCKETS)
+ORDERS = Counter("gridbot_orders_total", "Filled orders", ["symbol", "side"])
+ORDERS_SUBMITTED = Counter("gridbot_orders_submitted_total", "Limit orders accepted by the exchange", ["symbol", "side"])
+ORDER_REJECTS = Counter("gridbot_order_rejects_total", "Orders not placed", ["symbol", "side", "reason"])
+LEDGER_SECONDS = Histogram("gridbot_ledger_seconds", "Trade ledger write / query time", ["op"], LOCK_BUCKETS)
+
+def metrics_text():
+    lines = []
+    for m in metrics_registry:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
 # ---------- State ----------
-state_lock = threading.Lock()
-telegram_answers = {}
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", 60))
+JOURNAL_MAX_BYTES = int(os.getenv("JOURNAL_MAX_BYTES", 1_000_000))
+# 스냅샷 형식: json(사람이 읽는 형식) | binary(gridstore 열 압축). 읽을 때는 둘 다 자동 인식
+STATE_FORMAT = os.getenv("STATE_FORMAT", "json").lower()
+FILL_HISTORY = int(os.getenv("FILL_HISTORY", 1000))
 
-def load_state():
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, "r") as f:
-                return json.load(f)
-        except Exception:
-            pass
+def default_state():
     return {
         "krw": TOTAL_KRW, "btc": 0.0,
-        "grid_orders": {},
+        "grid_orders": gridstore.GridTable(),
+        "fills": gridstore.FillRing(FILL_HISTORY),
         "auto_mode": AUTO_MODE_ENV,
         "test_mode": DEFAULT_TEST_MODE,
         "news_enabled": NEWS_ENABLED_DEFAULT,
         "news_filter": NEWS_FILTER,
-        "news_seen_ids": [],
         "strategy": None,
         "price_low": None, "price_high": None,
         "n_grids": N_GRIDS, "price_padding": PRICE_PADDING, "check_interval": CHECK_INTERVAL,
+        "version": 0,
         "updated_at": datetime.utcnow().isoformat()
     }
 
-def save_state(s):
-    s["updated_at"] = datetime.utcnow().isoformat()
-    with open(DATA_FILE, "w") as f:
-        json.dump(s, f, indent=2, default=str)
+def apply_event(s, ev):
+    for k, v in (ev.get("fields") or {}).items():
+        s[k] = v
+    for k in ev.get("drop") or ():
+        s.pop(k, None)
+    go = s.setdefault("grid_orders", {})
+    for k, upd in (ev.get("grids") or {}).items():
+        go.setdefault(k, {}).update(upd)
+    for f in ev.get("fills") or ():
+        s["fills"].append(f)
+    s["version"] = ev["v"]
+    s["updated_at"] = ev["ts"]
+
+# 메모리 상태가 기준. 변경은 이벤트로 journal에 append, 스냅샷은 flusher가 주기적으로 기록 후 journal 압축
+class StateStore:
+    def __init__(self, path, flush_interval=STATE_FLUSH_INTERVAL, journal_max_bytes=JOURNAL_MAX_BYTES):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.flush_interval = flush_interval
+        self.journal_max_bytes = journal_max_bytes
+        self.lock = TimedLock(threading.RLock(), os.path.basename(path))
+        self.data = self._read()
+        self.version = int(self.data.get("version", 0))
+        self.flushed_version = self.version
+        # 압축 전 journal에 남은 체결 이벤트 (스냅샷에 이미 들어간 것 포함). 원장 보충용
+        self.journal_fills = []
+        self.replayed = self._replay()
+        self._journal = None
+        self._journal_bytes = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        self._dump_cache = (None, None)
+        self._io_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+        self.listeners = []
+
+    def _read(self):
+        if os.path.exists(self.path):
+            try:
+                return gridstore.load_any(self.path, FILL_HISTORY)
+            except Exception as e:
+                logger.warning(f"state load failed, starting fresh: {e}")
+        return default_state()
+
+    # 찢어진 마지막 줄(쓰다 죽음)부터는 잘라내 .torn에 보관: 남겨두면 이후 append가 그 뒤에 붙어 다음 재시작 때 통째로 버려짐
+    def _replay(self):
+        if not os.path.exists(self.journal_path):
+            return 0
+        n = good = 0
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("no newline")
+                    ev = json.loads(line)
+                except ValueError:
+                    logger.warning(f"journal: dropping torn tail record at byte {good}")
+                    break
+                good += len(line)
+                if ev.get("fills"):
+                    self.journal_fills.append((ev["v"], ev["fills"]))
+                if ev["v"] <= self.version:
+                    continue
+                apply_event(self.data, ev)
+                self.version = ev["v"]
+                n += 1
+        if good < os.path.getsize(self.journal_path):
+            with open(self.journal_path, "r+b") as f:
+                f.seek(good)
+                with open(f"{self.journal_path}.torn", "ab") as torn:
+                    torn.write(f.read())
+                f.truncate(good)
+                f.flush()
+                os.fsync(f.fileno())
+        if n:
+            logger.info(f"journal: replayed {n} events -> v{self.version}")
+        return n
+
+    def record(self, event, fields=None, grids=None, critical=False, drop=None, fills=None):
+        with self.lock:
+            t0 = time.perf_counter()
+            ev = {"v": self.version + 1, "ts": datetime.utcnow().isoformat(), "type": event}
+            if fields:
+                ev["fields"] = fields
+            if grids:
+                ev["grids"] = grids
+            if drop:
+                ev["drop"] = list(drop)
+            if fills:
+                ev["fills"] = fills
+            line = json.dumps(ev, default=str) + "\n"
+            if self._journal is None:
+                self._journal = open(self.journal_path, "a")
+            self._journal.write(line)
+            self._journal.flush()
+            if critical:
+                os.fsync(self._journal.fileno())
+            self._journal_bytes += len(line)
+            apply_event(self.data, ev)
+            self.version = ev["v"]
+            for fn in self.listeners:
+                fn(self.data, ev)
+            if self._journal_bytes > self.journal_max_bytes:
+                self._wake.set()
+            STORE_SECONDS.observe(time.perf_counter() - t0, "record")
+            return self.version
+
+    # /status·스냅샷용 뷰. 체결 이력 링은 파일에만 저장하고 뷰에서는 뺀다 (조회는 /fills = 원장)
+    def dumps(self):
+        with self.lock:
+            version, payload = self._dump_cache
+            if version != self.version:
+                payload = json.dumps({k: v for k, v in self.data.items() if k not in ipc.HIDDEN_FIELDS},
+                                     default=gridstore.json_default)
+                self._dump_cache = (self.version, payload)
+            return self.version, payload
+
+    def encode(self):
+        with self.lock:
+            if STATE_FORMAT == "binary":
+                return self.version, gridstore.encode_state(self.data)
+            return self.version, json.dumps(self.data, default=gridstore.json_default).encode()
+
+    def flush(self):
+        with self._io_lock:
+            if self.version == self.flushed_version and os.path.exists(self.path):
+                return False
+            version, payload = self.encode()
+            t0 = time.perf_counter()
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            STORE_SECONDS.observe(time.perf_counter() - t0, "flush")
+            self.flushed_version = version
+            self.compact(version)
+            return True
+
+    def compact(self, upto):
+        with self.lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if not os.path.exists(self.journal_path):
+                return
+            t0 = time.perf_counter()
+            tail = []
+            with open(self.journal_path, "r") as f:
+                for line in f:
+                    try:
+                        if line.endswith("\n") and json.loads(line)["v"] > upto:
+                            tail.append(line)
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning("journal: skipping unreadable record during compaction")
+            tmp = f"{self.journal_path}.tmp"
+            with open(tmp, "w") as f:
+                f.writelines(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.journal_path)
+            self._journal_bytes = sum(len(line) for line in tail)
+            STORE_SECONDS.observe(time.perf_counter() - t0, "compact")
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"state flush failed: {e}")
+
+    def start(self):
+        if self._flusher is None:
+            self._flusher = Thread(target=self._flush_loop, daemon=True, name="state-flusher")
+            self._flusher.start()
+            atexit.register(self.flush)
+
+# 필드/그리드별 마지막 변경 version. /status?since= 델타 계산용 (프로세스 시작 이후 이벤트만 추적)
+class ChangeIndex:
+    def __init__(self, state_store):
+        self.base = state_store.version
+        self.fields = {}
+        self.grids = {}
+        self.removed = {}
+        state_store.listeners.append(self.on_event)
+
+    def on_event(self, s, ev):
+        v = ev["v"]
+        for k in ev.get("fields") or ():
+            self.fields[k] = v
+            self.removed.pop(k, None)
+        for k in ev.get("drop") or ():
+            self.removed[k] = v
+            self.fields.pop(k, None)
+        for k in ev.get("grids") or ():
+            self.grids[k] = v
+
+    def since(self, version):
+        return ([k for k, v in self.fields.items() if v > version],
+                [k for k, v in self.grids.items() if v > version],
+                [k for k, v in self.removed.items() if v > version])
+
+    def to_dict(self):
+        return {"base": self.base, "fields": dict(self.fields), "grids": dict(self.grids), "removed": dict(self.removed)}
+
+store = StateStore(DATA_FILE)
+state_lock = store.lock
+startup.mark("state")
+
+def load_state():
+    return store.data
+
+# ---------- Trade ledger ----------
+# 체결 이벤트(record의 fills)를 SQLite 원장(LEDGER_FILE)에 옮겨 적는다. 실패해도 상태 기록은 막지 않고
+# 큐에 남겨 다음 체결 때 다시 시도. 원장 쓰기는 (심볼, 이벤트 version) 기준으로 멱등이라 재시도/재생이 안전
+trade_ledger = ledger.Ledger()
+ledger_pending = deque()
+ledger_lock = threading.Lock()
+
+def ledger_drain():
+    with ledger_lock:
+        while ledger_pending:
+            symbol, version, fills = ledger_pending[0]
+            try:
+                trade_ledger.add(symbol, fills, version=version)
+            except Exception as e:
+                logger.exception(f"ledger write err ({len(ledger_pending)} pending): {e}")
+                return
+            ledger_pending.popleft()
+
+def ledger_writer(symbol):
+    def on_event(s, ev):
+        if not ev.get("fills"):
+            return
+        t0 = time.perf_counter()
+        ledger_pending.append((symbol, ev["v"], ev["fills"]))
+        ledger_drain()
+        LEDGER_SECONDS.observe(time.perf_counter() - t0, "write")
+    return on_event
+
+# 부팅 시 journal에 남은 체결 이벤트를 원장에 다시 넣는다 (이미 있는 건 무시). 크래시/커밋 실패로 빠진 체결 복구
+def ledger_backfill(symbol, state_store):
+    added = 0
+    for version, fills in state_store.journal_fills:
+        try:
+            added += trade_ledger.add(symbol, fills, version=version)
+        except Exception as e:
+            logger.exception(f"ledger backfill err: {e}")
+            break
+    if added:
+        logger.info(f"ledger: backfilled {added} fills for {symbol} from journal")
+    state_store.journal_fills = []
+    return added
+
+def pnl_text(p):
+    mark = f"{int(p['mark']):,}" if p["mark"] is not None else "-"
+    unreal = f"{int(p['unrealized']):,}" if p["unrealized"] is not None else "-"
+    today = p["today"] or {}
+    lines = [f"손익 ({p['symbol']})",
+             f"실현: {int(p['realized']):,} | 미실현: {unreal} (현재가 {mark})",
+             f"보유: {p['position']:.8g} | 평단: {int(p['avg_cost'] or 0):,}",
+             f"체결 {p['fills']}건 | 왕복 {p['round_trips']}회 | 수수료 {int(p['fees']):,}",
+             f"오늘: 실현 {int(today.get('realized', 0)):,} | 매수 {today.get('buys', 0)} / 매도 {today.get('sells', 0)} | 왕복 {today.get('round_trips', 0)}"]
+    if p["grids"]:
+        lines.append("상위 그리드: " + ", ".join(f"#{g['grid']} {int(g['realized']):+,} ({g['round_trips']}회)" for g in p["grids"]))
+    return "\n".join(lines)
 
 # ---------- Price feeds ----------
+# 프로세스 공용 거래소 클라이언트: 역할별로 처음 실제로 쓸 때 한 번 만든다 (ccxt import도 그 시점)
+# market = 시세/마켓 스펙, trade = 주문 (주문이 load_markets 뒤에서 레이트리밋 대기하지 않도록 분리)
+class ExchangeRegistry:
+    def __init__(self, factory=make_exchange):
+        self.factory = factory
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def get(self, role="market"):
+        ex = self.clients.get(role)
+        if ex is None:
+            with self.lock:
+                ex = self.clients.get(role)
+                if ex is None:
+                    t0 = time.perf_counter()
+                    ex = self.clients[role] = self.factory()
+                    logger.info(f"exchange client '{role}' ready in {time.perf_counter() - t0:.2f}s")
+        return ex
+
+    def factory_for(self, role):
+        return lambda: self.get(role)
+
+exchanges = ExchangeRegistry()
+
 class LivePriceFeed:
-    def __init__(self):
-        import ccxt
-        ex_class = getattr(ccxt, EXCHANGE_ID)
-        cfg = {"apiKey": API_KEY, "secret": API_SECRET, "enableRateLimit": True}
-        proxy = os.getenv("HTTPS_PROXY") or os.getenv("HTTP_PROXY")
-        if proxy:
-            cfg["proxies"] = {"http": proxy, "https": proxy}
-        self.ex = ex_class(cfg)
+    @property
+    def ex(self):
+        return exchanges.get("market")
+
     def last(self, symbol):
+        t0 = time.perf_counter()
         t = self.ex.fetch_ticker(symbol)
+        PRICE_FEED_SECONDS.observe(time.perf_counter() - t0, "fetch_ticker")
         return float(t["last"])
+    def last_many(self, symbols):
+        if not self.ex.has.get("fetchTickers"):
+            return {sym: self.last(sym) for sym in symbols}
+        t0 = time.perf_counter()
+        t = self.ex.fetch_tickers(symbols)
+        PRICE_FEED_SECONDS.observe(time.perf_counter() - t0, "fetch_tickers")
+        return {sym: float(t[sym]["last"]) for sym in symbols if sym in t}
 
 class TestPriceFeed:
     def __init__(self, start_price=None, vol=None):
@@ -106,355 +638,1250 @@ class TestPriceFeed:
         self.price *= (1 + step)
         return round(self.price, 0)
 
-try:
-    live_feed = LivePriceFeed()
-except Exception as e:
-    live_feed = None
-    logger.warning(f"LivePriceFeed init failed (ok in TEST_MODE): {e}")
+def upbit_code(symbol):
+    base, quote = symbol.upper().split("/")
+    return f"{quote}-{base}"
+
+# Upbit WebSocket ticker 구독: 최신가 + 구간 고가/저가를 메모리에 유지, 끊기면 backoff 재연결, 오래되면 REST로 fallback
+class StreamPriceFeed:
+    def __init__(self, url, symbols, fallback=None):
+        self.url = url
+        self.symbols = list(symbols)
+        self.fallback = fallback
+        self.lock = threading.Lock()
+        self.prices = {}
+        self.ranges = {}
+        self.updated_at = {}
+        self.connected = False
+        self.reconnects = 0
+        self._thread = None
+        self.bands = {}
+        self.on_cross = None
+
+    # 다음 매수/매도 레벨을 넘는 체결이 들어오면 스케줄러를 즉시 깨운다 (한 번 깨우면 다음 틱이 다시 등록)
+    def watch(self, symbol, lo, hi):
+        self.bands[symbol] = (-float("inf") if lo is None else lo, float("inf") if hi is None else hi)
+
+    def on_price(self, symbol, price):
+        with self.lock:
+            self.prices[symbol] = price
+            self.updated_at[symbol] = time.monotonic()
+            lo, hi = self.ranges.get(symbol, (price, price))
+            self.ranges[symbol] = (min(lo, price), max(hi, price))
+        band = self.bands.get(symbol)
+        if band and (price <= band[0] or price >= band[1]) and self.on_cross:
+            del self.bands[symbol]
+            self.on_cross(symbol)
+
+    def _run(self):
+        import websocket
+        codes = {upbit_code(sym): sym for sym in self.symbols}
+        backoff = 1
+        while True:
+            try:
+                ws = websocket.create_connection(self.url, timeout=30)
+                ws.send(json.dumps([{"ticket": f"gridbot-{os.getpid()}"}, {"type": "ticker", "codes": list(codes)}]))
+                self.connected = True
+                backoff = 1
+                logger.info(f"price stream connected | {self.url} | {list(codes)}")
+                while True:
+                    msg = json.loads(ws.recv())
+                    sym = codes.get(msg.get("code"))
+                    if sym and msg.get("trade_price") is not None:
+                        self.on_price(sym, float(msg["trade_price"]))
+            except Exception as e:
+                self.connected = False
+                self.reconnects += 1
+                logger.warning(f"price stream dropped ({e}); reconnect in {backoff}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, daemon=True, name="price-stream")
+            self._thread.start()
+
+    def fresh(self, symbol):
+        ts = self.updated_at.get(symbol)
+        return ts is not None and time.monotonic() - ts < STREAM_STALE_SEC
+
+    def last(self, symbol):
+        with self.lock:
+            if self.fresh(symbol):
+                return self.prices[symbol]
+        if self.fallback is None:
+            raise RuntimeError(f"no fresh stream price for {symbol}")
+        p = self.fallback.last(symbol)
+        self.on_price(symbol, p)
+        return p
+
+    def take_range(self, symbol):
+        with self.lock:
+            p = self.prices.get(symbol)
+            rng = self.ranges.get(symbol)
+            if p is not None:
+                self.ranges[symbol] = (p, p)
+            return rng
+
+live_feed = LivePriceFeed()
 test_feed = TestPriceFeed()
+stream_feed = StreamPriceFeed(STREAM_URL, SYMBOLS, fallback=live_feed) if PRICE_FEED == "stream" else None
 
-def get_price(symbol):
+# 실거래(SIMULATION=false)에서는 테스트 모드를 무시한다: 랜덤 시세로 만든 그리드에 실제 지정가가 걸리면 안 됨
+def test_mode_on():
+    if not SIMULATION:
+        return False
     with state_lock:
-        s = load_state()
-        use_test = s.get("test_mode", True)
-    if use_test or live_feed is None:
-        return test_feed.last(symbol)
-    return live_feed.last(symbol)
-
-# ---------- Utils ----------
-def frange(start, stop, n):
-    if n <= 1:
-        return [start]
-    step = (stop - start) / float(n - 1)
-    return [start + i * step for i in range(n)]
-
-def build_grid(price_low, price_high, n_grids, mode='equal'):
-    if mode == 'equal':
-        return frange(price_low, price_high, n_grids + 1)
-    ratios = [i / n_grids for i in range(n_grids + 1)]
-    return [price_low * (price_high / price_low) ** r for r in ratios]
-
-# --- [VALIDATION] Tick/Min rules for Upbit ------------------------------------
-def krw_tick_size(price: float) -> float:
-    p = float(price)
-    if p >= 2_000_000: return 1000
-    if p >= 1_000_000: return 1000
-    if p >=   500_000: return 500
-    if p >=   100_000: return 100
-    if p >=    50_000: return 50
-    if p >=    10_000: return 10
-    if p >=     5_000: return 5
-    if p >=     1_000: return 1
-    if p >=       100: return 1
-    if p >=        10: return 0.1
-    if p >=         1: return 0.01
-    if p >=       0.1: return 0.001
-    if p >=      0.01: return 0.0001
-    if p >=     0.001: return 0.00001
-    if p >=    0.0001: return 0.000001
-    if p >=   0.00001: return 0.0000001
-    return 0.00000001
-
-def normalize_to_tick(value: float, tick: float) -> float:
-    if tick <= 0:
-        return float(value)
-    return round(round(float(value) / tick) * tick, 8)
-
-def normalize_decimals(x: float, precision_decimals: int or None) -> float:
-    if precision_decimals is None:
-        return float(x)
-    q = 10 ** precision_decimals
-    return round(float(x) * q) / q
+        return load_state().get("test_mode", True)
+
+def price_source(symbol=SYMBOL):
+    if test_mode_on():
+        return bots[symbol].test_feed
+    return stream_feed or live_feed
+
+def get_price(symbol):
+    return price_source(symbol).last(symbol)
+
+def get_price_range(symbol):
+    feed = price_source(symbol)
+    current = feed.last(symbol)
+    rng = feed.take_range(symbol) if feed is stream_feed else None
+    if not rng:
+        return current, current, current
+    return current, min(rng[0], current), max(rng[1], current)
+
+def get_quotes(symbols):
+    if len(symbols) > 1 and price_source(symbols[0]) is live_feed:
+        return {sym: (p, p, p) for sym, p in live_feed.last_many(symbols).items()}
+    return {sym: get_price_range(sym) for sym in symbols}
+
+# ---------- Validation ----------
+# 규칙은 gridcore에, 여기서는 프로세스 공용 스펙 캐시(테스트 모드면 거래소 미접속)와 지연 측정만 얹는다
+spec_registry = MarketSpecRegistry(exchanges.factory_for("market"), enabled=lambda: not test_mode_on())
 
 def get_ccxt_specs(symbol: str):
-    try:
-        import ccxt
-        ex_class = getattr(ccxt, EXCHANGE_ID)
-        cfg = {"apiKey": API_KEY, "secret": API_SECRET, "enableRateLimit": True}
-        proxy = os.getenv("HTTPS_PROXY") or os.getenv("HTTP_PROXY")
-        if proxy:
-            cfg["proxies"] = {"http": proxy, "https": proxy}
-        ex = ex_class(cfg)
-        markets = ex.load_markets()
-        m = markets.get(symbol)
-        if not m:
-            return None
-        price_prec = None
-        amt_prec = None
-        if isinstance(m.get("precision"), dict):
-            price_prec = m["precision"].get("price")
-            amt_prec = m["precision"].get("amount")
-        limits = (m.get("limits") or {})
-        min_cost = (limits.get("cost") or {}).get("min")
-        min_amt  = (limits.get("amount") or {}).get("min")
-        return {"price_prec": price_prec, "amt_prec": amt_prec, "min_cost": min_cost, "min_amt": min_amt}
-    except Exception:
-        return None
+    t0 = time.perf_counter()
+    specs = spec_registry.get(symbol)
+    SPECS_SECONDS.observe(time.perf_counter() - t0)
+    return specs
 
 def validate_order(symbol: str, side: str, price: float, amount: float):
-    s = symbol.upper()
-    px = float(price)
-    qty = float(amount)
-    specs = get_ccxt_specs(symbol)
-    price_prec = specs.get("price_prec") if specs else None
-    amt_prec   = specs.get("amt_prec") if specs else None
-    min_cost   = specs.get("min_cost") if specs else None
-    min_amt    = specs.get("min_amt") if specs else None
-
-    if s.endswith("/KRW"):
-        tick = krw_tick_size(px)
-        px = normalize_to_tick(px, tick)
-        min_total = 5000.0
-        if isinstance(min_cost, (int, float)) and min_cost > 0:
-            min_total = max(min_total, float(min_cost))
-        qty = normalize_decimals(qty, amt_prec)
-        total = px * qty
-        if total + 1e-9 < min_total:
-            need = min_total / max(px, 1e-12)
-            return (False, f"KRW 최소주문금액 {int(min_total):,}원 미만 (현재 {int(total):,}원). 수량≥{need:.8f} 필요", px, qty)
-
-    elif s.endswith("/USDT"):
-        if price_prec is not None:
-            px = normalize_decimals(px, price_prec)
-        else:
-            if px >= 1: tick = 0.01
-            elif px >= 0.1: tick = 0.001
-            else: tick = 0.0001
-            px = normalize_to_tick(px, tick)
-        min_total = 0.5
-        if isinstance(min_cost, (int, float)) and min_cost > 0:
-            min_total = max(min_total, float(min_cost))
-        qty = normalize_decimals(qty, amt_prec)
-        total = px * qty
-        if total + 1e-12 < min_total:
-            need = min_total / max(px, 1e-12)
-            return (False, f"USDT 최소주문금액 {min_total} USDT 미만 (현재 {total:.6f}). 수량≥{need:.8f} 필요", px, qty)
-
-    elif s.endswith("/BTC"):
-        min_q = 0.00005
-        if isinstance(min_amt, (int, float)) and min_amt > 0:
-            min_q = max(min_q, float(min_amt))
-        qty = normalize_decimals(qty, amt_prec)
-        if qty + 1e-12 < min_q:
-            return (False, f"BTC 마켓 최소 주문수량 {min_q} BTC 미만 (현재 {qty})", px, qty)
-        px = normalize_decimals(px, price_prec)
+    return gridcore.validate_order(symbol, side, price, amount, get_ccxt_specs(symbol))
+
+def validate_ladder(symbol, grids):
+    return gridcore.validate_ladder(symbol, grids, get_ccxt_specs(symbol))
+
+# ---------- Telegram outbound ----------
+# 전송은 전용 스레드가 큐에서 꺼내 처리: keep-alive 세션, 채팅별 토큰 버킷, 429 retry_after 준수, 체결 알림은 묶어서 1건으로
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+
+    def wait_time(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class TelegramSender:
+    MAX_LEN = 4000
+
+    def __init__(self, api, chat_id, maxsize=TG_QUEUE_MAX, rate=TG_RATE_PER_SEC, burst=TG_BURST, digest_window=TG_DIGEST_WINDOW):
+        self.api = api
+        self.chat_id = chat_id
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.rate, self.burst = rate, burst
+        self.buckets = {}
+        self.digest_window = digest_window
+        self.session = requests.Session()
+        self.sent = self.failed = self.dropped = self.coalesced = 0
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def send(self, text, kind=None, reply_markup=None, chat_id=None):
+        if not self.api or not (chat_id or self.chat_id):
+            return False
+        self.start()
+        try:
+            self.queue.put_nowait({"chat_id": chat_id or self.chat_id, "text": text, "kind": kind, "reply_markup": reply_markup})
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Telegram queue full, dropped: {text[:60]!r}")
+            return False
+
+    def start(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = Thread(target=self._run, daemon=True, name="tg-sender")
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            msg = self.queue.get()
+            try:
+                if msg["kind"] == "fill":
+                    msg, held = self._digest(msg)
+                    self._post(msg)
+                    if held:
+                        self._post(held)
+                else:
+                    self._post(msg)
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Telegram send failed: {e}")
+
+    def _digest(self, first):
+        texts = [first["text"]]
+        size = len(first["text"])
+        deadline = time.monotonic() + self.digest_window
+        held = None
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                nxt = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if nxt["kind"] != "fill" or nxt["chat_id"] != first["chat_id"] or size + len(nxt["text"]) > self.MAX_LEN:
+                held = nxt
+                break
+            texts.append(nxt["text"])
+            size += len(nxt["text"]) + 2
+        if len(texts) > 1:
+            self.coalesced += len(texts) - 1
+            first = {**first, "text": f"[체결 {len(texts)}건]\n" + "\n\n".join(texts)}
+        return first, held
+
+    def _post(self, msg, attempts=4):
+        bucket = self.buckets.setdefault(msg["chat_id"], TokenBucket(self.rate, self.burst))
+        data = {"chat_id": msg["chat_id"], "text": msg["text"]}
+        if msg.get("reply_markup"):
+            data["reply_markup"] = msg["reply_markup"]
+        for attempt in range(attempts):
+            wait = bucket.wait_time()
+            while wait > 0:
+                time.sleep(wait)
+                wait = bucket.wait_time()
+            try:
+                r = self.session.post(f"{self.api}/sendMessage", data=data, timeout=10)
+            except Exception as e:
+                logger.warning(f"Telegram send failed: {e}")
+                time.sleep(2 ** attempt)
+                continue
+            if r.status_code == 429:
+                try:
+                    retry_after = float(r.json().get("parameters", {}).get("retry_after", 1))
+                except ValueError:
+                    retry_after = 1.0
+                logger.warning(f"Telegram 429, retry after {retry_after}s")
+                time.sleep(retry_after)
+                continue
+            if r.ok:
+                self.sent += 1
+                return True
+            logger.warning(f"Telegram send failed: HTTP {r.status_code} {r.text[:200]}")
+            break
+        self.failed += 1
+        return False
 
-    else:
-        px = normalize_decimals(px, price_prec)
-        qty = normalize_decimals(qty, amt_prec)
-        if isinstance(min_cost, (int, float)) and min_cost > 0 and px * qty + 1e-12 < float(min_cost):
-            need = float(min_cost) / max(px, 1e-12)
-            return (False, f"최소 주문 금액 {min_cost} 미만. 수량≥{need:.8f} 필요", px, qty)
-        if isinstance(min_amt, (int, float)) and min_amt > 0 and qty + 1e-12 < float(min_amt):
-            return (False, f"최소 주문 수량 {min_amt} 미만 (현재 {qty})", px, qty)
-
-    return (True, "OK", px, qty)
-# --- [VALIDATION] END ----------------------------------------------------------
-
-def tg_send(text):
-    if not TELEGRAM_API or not TELEGRAM_CHAT_ID:
-        return
-    try:
-        requests.post(f"{TELEGRAM_API}/sendMessage", data={"chat_id": TELEGRAM_CHAT_ID, "text": text}, timeout=10)
-    except Exception as e:
-        logger.warning(f"Telegram send failed: {e}")
+    def stats(self):
+        return {"queued": self.queue.qsize(), "sent": self.sent, "failed": self.failed,
+                "dropped": self.dropped, "coalesced": self.coalesced}
+
+tg_sender = TelegramSender(TELEGRAM_API, TELEGRAM_CHAT_ID)
+
+def tg_send(text, kind=None):
+    return tg_sender.send(text, kind=kind)
 
 def tg_send_confirm(text, payload_id):
-    if not TELEGRAM_API or not TELEGRAM_CHAT_ID:
-        return False
     keyboard = {
         "inline_keyboard": [[
             {"text": "예", "callback_data": json.dumps({"id": payload_id, "ans": "yes"})},
             {"text": "아니오", "callback_data": json.dumps({"id": payload_id, "ans": "no"})}
         ]]
     }
-    data = {"chat_id": TELEGRAM_CHAT_ID, "text": text, "reply_markup": json.dumps(keyboard)}
-    try:
-        r = requests.post(f"{TELEGRAM_API}/sendMessage", data=data, timeout=10)
-        return r.ok
-    except Exception as e:
-        logger.warning(f"Telegram send failed: {e}")
-        return False
-
-# ---------- Strategy Presets ----------
-STRATEGY_PROFILES = {
-    "up": {"name":"Up (상승장)","up_pct":0.025,"down_pct":0.010,"n_grids":30,"padding":0.0,"interval":3,"target_note":"다음 그리드 도달 시 매도"},
-    "middle":{"name":"Middle (횡보장)","up_pct":0.015,"down_pct":0.015,"n_grids":40,"padding":0.0,"interval":3,"target_note":"다음 그리드 도달 시 매도"},
-    "down":{"name":"Down (하락장)","up_pct":0.008,"down_pct":0.030,"n_grids":20,"padding":0.0,"interval":5,"target_note":"반등 시 빠른 매도"},
-}
-
-def apply_strategy_profile(s, current_price, key):
-    prof = STRATEGY_PROFILES.get(key)
-    if not prof:
-        return None
-    low = current_price * (1.0 - prof["down_pct"])
-    high = current_price * (1.0 + prof["up_pct"])
-    s["strategy"] = key
-    s["price_low"] = low
-    s["price_high"] = high
-    s["n_grids"] = prof["n_grids"]
-    s["price_padding"] = prof["padding"]
-    s["check_interval"] = prof["interval"]
-    return (f"전략: {prof['name']} ({key})\n"
-            f"범위: {int(low):,} ~ {int(high):,}\n"
-            f"N_GRIDS: {prof['n_grids']} | PADDING: {prof['padding']} | INTERVAL: {prof['interval']}s\n"
-            f"목표가: {prof['target_note']}")
+    return tg_sender.send(text, reply_markup=json.dumps(keyboard))
+
+# ---------- Event stream ----------
+# 프로세스 내 단일 fan-out: 발행은 한 번 직렬화 후 구독자별 bounded 큐에 put_nowait만 하고, 가득 찬 구독자는 끊는다
+class Subscriber:
+    __slots__ = ("queue", "kinds", "symbol", "dropped")
+
+    def __init__(self, maxsize, kinds=None, symbol=None):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.kinds = kinds
+        self.symbol = symbol
+        self.dropped = False
+
+class EventBus:
+    def __init__(self, maxsize=SSE_BUFFER):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.subscribers = ()
+        self.published = self.dropped = 0
+        self._seq = itertools.count(1)
+        # engine 모드에서만 켠다: 구독자가 없어도 최근 이벤트를 (seq, kind, symbol, json) 링으로 보관
+        self.history = None
+
+    def subscribe(self, kinds=None, symbol=None):
+        sub = Subscriber(self.maxsize, kinds, symbol)
+        with self.lock:
+            self.subscribers = self.subscribers + (sub,)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscribers = tuple(s for s in self.subscribers if s is not sub)
+
+    def publish(self, kind, data, symbol=None):
+        subs = self.subscribers
+        if not subs and self.history is None:
+            return
+        seq = next(self._seq)
+        payload = json.dumps(data, default=str)
+        if self.history is not None:
+            with self.lock:
+                self.history.append((seq, kind, symbol, payload))
+        msg = f"id: {seq}\nevent: {kind}\ndata: {payload}\n\n"
+        self.published += 1
+        for sub in subs:
+            if (sub.kinds and kind not in sub.kinds) or (sub.symbol and symbol and sub.symbol != symbol):
+                continue
+            try:
+                sub.queue.put_nowait(msg)
+            except queue.Full:
+                sub.dropped = True
+                self.dropped += 1
+                self.unsubscribe(sub)
+
+    def stream(self, sub):
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while not sub.dropped:
+                try:
+                    yield sub.queue.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+            yield "event: dropped\ndata: {\"reason\": \"slow consumer\"}\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+    def recent(self):
+        with self.lock:
+            return list(self.history or ())
+
+    def stats(self):
+        return {"subscribers": len(self.subscribers), "published": self.published, "dropped": self.dropped}
+
+bus = EventBus()
+
+def publish_state_event(symbol):
+    def on_event(s, ev):
+        bus.publish("state", {"symbol": symbol, "v": ev["v"], "type": ev["type"], "fields": ev.get("fields"),
+                              "removed": ev.get("drop"),
+                              "grids": {k: g.get("status") for k, g in (ev.get("grids") or {}).items()}}, symbol)
+    return on_event
 
 # ---------- Orders ----------
-def place_order(side, price, amount):
-    ok, msg, adj_price, adj_amount = validate_order(SYMBOL, side, price, amount)
-    if not ok:
-        logger.info(f"[ORDER REJECT] {msg}")
-        tg_send(f"❌ 주문 거절: {msg}")
-        return None
-    price = adj_price
-    amount = adj_amount
-    slippage = 0.003
-    exec_price = price * (1 + slippage if side == "sell" else 1 - slippage)
-
+def record_fill(bot, side, price, amount, grid_key=None, order=None, fee=0.0, check_funds=True, grid_extra=None):
     with state_lock:
-        s = load_state()
+        auto = load_state().get("auto_mode")
+    with bot.store.lock:
+        s = bot.state
+        krw, btc = s["krw"], s["btc"]
         if side == "buy":
-            cost = exec_price * amount
-            if s["krw"] >= cost:
-                s["krw"] -= cost
-                s["btc"] += amount
-            else:
+            cost = price * amount
+            if check_funds and krw < cost:
+                ORDER_REJECTS.inc(bot.symbol, side, "funds")
                 logger.info("KRW 부족 → 매수 불가")
                 return None
+            krw -= cost + fee
+            btc += amount
         else:
-            if s["btc"] >= amount:
-                s["btc"] -= amount
-                s["krw"] += exec_price * amount
-            else:
-                logger.info("BTC 부족 → 매도 불가")
+            if check_funds and btc < amount:
+                ORDER_REJECTS.inc(bot.symbol, side, "funds")
+                logger.info(f"{bot.base} 부족 → 매도 불가")
                 return None
-        save_state(s)
+            btc -= amount
+            krw += price * amount - fee
+        grids = None
+        if grid_key is not None:
+            grids = {grid_key: {"status": "bought" if side == "buy" else "sold", **(grid_extra or {})}}
+        fill = {"ts": time.time(), "grid": grid_key, "side": side, "price": price, "amount": amount, "fee": fee,
+                "order_id": (order or {}).get("id")}
+        bot.store.record(f"{side}_filled", fields={"krw": krw, "btc": btc}, grids=grids, critical=True, fills=[fill])
+    ORDERS.inc(bot.symbol, side)
+    bus.publish("fill", {"symbol": bot.symbol, "grid": grid_key, "side": side, "price": price, "amount": amount,
+                         "fee": fee, "krw": krw, "base": btc, "backend": bot.backend.name}, bot.symbol)
+
+    logger.info(f"[{bot.backend.name.upper()}] {side.upper()} {amount} {bot.symbol} @ {int(price):,}")
+    if auto and TELEGRAM_API and TELEGRAM_CHAT_ID:
+        tg_send(f"[AUTO 체결] {side.upper()} {amount} {bot.symbol} @ {int(price):,}\nKRW: {int(krw):,} / {bot.base}: {btc}", kind="fill")
+    return krw, btc
+
+# 체결을 로컬 잔고에 바로 반영(고정 슬리피지)
+class SimBackend:
+    name = "sim"
+    live = False
+
+    def sync(self, bot, current, post_buys):
+        pass
+
+    def execute(self, bot, side, price, amount, grid_key=None):
+        exec_price = sim_fill_price(side, price)
+        order = {"id": f"SIM-{side}-{int(time.time())}", "side": side, "price": exec_price, "amount": amount, "status": "closed"}
+        return order if record_fill(bot, side, exec_price, amount, grid_key, order) else None
+
+def _fee_cost(o):
+    fee = o.get("fee")
+    if isinstance(fee, dict) and fee.get("cost") is not None:
+        return float(fee["cost"])
+    return sum(float(f.get("cost") or 0) for f in o.get("fees") or [])
+
+# 실거래: 그리드 지정가를 미리 걸어두고(동시 제출, 계정 단위 rate limit), 틱마다 미체결/종료 주문을 한 번씩 조회해 대사.
+# 제출 전에 clientOrderId를 journal에 기록 → 응답을 못 받아도 같은 id로 재제출/채택되어 중복 주문이 생기지 않는다
+class LiveBackend:
+    name = "live"
+    live = True
+
+    def __init__(self, exchange_factory=exchanges.factory_for("trade"), workers=EXEC_WORKERS, rate=ORDER_RATE_PER_SEC,
+                 burst=ORDER_BURST, pending_sec=ORDER_PENDING_SEC):
+        self.exchange_factory = exchange_factory
+        self.pending_sec = pending_sec
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="orders")
+        self.bucket = TokenBucket(rate, burst)
+        self.bucket_lock = threading.Lock()
+        self._ex = None
+        self._ex_lock = threading.Lock()
+
+    @property
+    def ex(self):
+        if self._ex is None:
+            with self._ex_lock:
+                if self._ex is None:
+                    self._ex = self.exchange_factory()
+        return self._ex
+
+    def client_id(self, bot, k, side, attempt):
+        with bot.store.lock:
+            prefix = bot.state.get("cid_prefix")
+            if not prefix:
+                prefix = f"gb{os.urandom(4).hex()}"
+                bot.store.record("cid_prefix", fields={"cid_prefix": prefix}, critical=True)
+        return f"{prefix}-{k}-{side[0]}{attempt}"
+
+    def _create(self, symbol, oo):
+        with self.bucket_lock:
+            wait = self.bucket.wait_time()
+            while wait > 0:
+                time.sleep(wait)
+                wait = self.bucket.wait_time()
+        return self.ex.create_order(symbol, "limit", oo["side"], oo["amount"], oo["price"], {"clientOrderId": oo["cid"]})
+
+    def submit(self, bot, orders):
+        if not orders:
+            return {}
+        from ccxt import DuplicateOrderId, InvalidOrder, InsufficientFunds
+        now = time.time()
+        intents = {}
+        for k, side, price, amount, attempt in orders:
+            intents[k] = {"side": side, "price": price, "amount": amount, "attempt": attempt, "ts": now, "id": None,
+                          "status": "pending", "cid": self.client_id(bot, k, side, attempt)}
+        bot.store.record("orders_submitted", grids={k: {"open_order": oo} for k, oo in intents.items()}, critical=True)
+
+        futures = {k: self.pool.submit(self._create, bot.symbol, oo) for k, oo in intents.items()}
+        updates, placed = {}, {}
+        for k, fut in futures.items():
+            oo = intents[k]
+            try:
+                o = fut.result()
+            except DuplicateOrderId:
+                logger.info(f"[{bot.symbol}] order {oo['cid']} already on the exchange, adopting on reconcile")
+                continue
+            except (InvalidOrder, InsufficientFunds) as e:
+                ORDER_REJECTS.inc(bot.symbol, oo["side"], "exchange")
+                logger.warning(f"[{bot.symbol}] order rejected #{k} {oo['side']} {oo['cid']}: {e}")
+                updates[k] = {"open_order": None, "attempt": oo["attempt"] + 1}
+                continue
+            except Exception as e:
+                logger.warning(f"[{bot.symbol}] order submit unknown #{k} {oo['cid']}: {e}")
+                continue
+            ORDERS_SUBMITTED.inc(bot.symbol, oo["side"])
+            placed[k] = updates[k] = {"open_order": {**oo, "id": o["id"], "status": "open"}}
+        if updates:
+            bot.store.record("orders_acked", grids=updates)
+        return placed
+
+    def execute(self, bot, side, price, amount, grid_key=None):
+        with bot.store.lock:
+            attempt = bot.state["grid_orders"].get(grid_key, {}).get("attempt", 0)
+        placed = self.submit(bot, [(grid_key, side, price, amount, attempt)])
+        return placed.get(grid_key, {}).get("open_order")
+
+    def _closed(self, symbol, since):
+        since_ms = int((since - 60) * 1000)
+        if self.ex.has.get("fetchClosedOrders"):
+            out = {}
+            for o in self.ex.fetch_closed_orders(symbol, since_ms):
+                out[o["id"]] = o
+                if o.get("clientOrderId"):
+                    out[o["clientOrderId"]] = o
+            return out
+        agg = {}
+        for t in self.ex.fetch_my_trades(symbol, since_ms):
+            a = agg.setdefault(t["order"], {"id": t["order"], "status": "closed", "filled": 0.0, "cost": 0.0, "fee": {"cost": 0.0}})
+            a["filled"] += float(t["amount"])
+            a["cost"] += float(t["cost"] or t["price"] * t["amount"])
+            a["fee"]["cost"] += _fee_cost(t)
+        for a in agg.values():
+            a["average"] = a["cost"] / a["filled"]
+        return agg
+
+    def reconcile(self, bot):
+        with bot.store.lock:
+            tracked = {k: (dict(g["open_order"]), g.get("attempt", 0)) for k, g in bot.state["grid_orders"].items() if g.get("open_order")}
+        if not tracked:
+            return
+        open_orders = self.ex.fetch_open_orders(bot.symbol)
+        by_id = {o["id"]: o for o in open_orders}
+        by_cid = {o["clientOrderId"]: o for o in open_orders if o.get("clientOrderId")}
+        updates, gone = {}, {}
+        for k, (oo, attempt) in tracked.items():
+            o = by_id.get(oo["id"]) or by_cid.get(oo["cid"])
+            if o is None:
+                gone[k] = (oo, attempt)
+            elif oo["status"] == "pending":
+                updates[k] = {"open_order": {**oo, "id": o["id"], "status": "open"}}
+
+        fills = []
+        if gone:
+            done = self._closed(bot.symbol, min(oo["ts"] for oo, _ in gone.values()))
+            for k, (oo, attempt) in gone.items():
+                o = done.get(oo["id"]) or done.get(oo["cid"])
+                if o is None and oo["id"]:
+                    from ccxt import OrderNotFound
+                    try:
+                        o = self.ex.fetch_order(oo["id"], bot.symbol)
+                    except OrderNotFound:
+                        o = {"id": oo["id"], "status": "canceled", "filled": 0}
+                    except Exception as e:
+                        logger.warning(f"[{bot.symbol}] order lookup failed {oo['cid']}: {e}")
+                if o is None or o.get("status") == "open":
+                    continue
+                filled = float(o.get("filled") or 0)
+                if filled > 0:
+                    fills.append((k, oo, o, filled))
+                else:
+                    updates[k] = {"open_order": None, "attempt": attempt + 1}
+        if updates:
+            bot.store.record("orders_reconciled", grids=updates)
+
+        for k, oo, o, filled in fills:
+            price = float(o.get("average") or o.get("price") or oo["price"])
+            order = {"id": o["id"], "cid": oo["cid"], "side": oo["side"], "price": price, "amount": filled, "status": "closed"}
+            extra = {"open_order": None, "amount": filled}
+            if oo["side"] == "sell" and filled < oo["amount"] - 1e-12:
+                extra = {"open_order": None, "status": "bought", "amount": oo["amount"] - filled, "attempt": oo["attempt"] + 1}
+            record_fill(bot, oo["side"], price, filled, k, order, _fee_cost(o), check_funds=False, grid_extra=extra)
+
+    def sync(self, bot, current, post_buys):
+        self.reconcile(bot)
+        now = time.time()
+        want = []
+        with bot.store.lock:
+            s = bot.state
+            go = s["grid_orders"]
+            krw = s["krw"] - sum(g["open_order"]["price"] * g["open_order"]["amount"]
+                                 for g in go.values() if g.get("open_order") and g["open_order"]["side"] == "buy")
+            for k, g in go.items():
+                oo = g.get("open_order")
+                if oo:
+                    if oo["status"] == "pending" and now - oo["ts"] > self.pending_sec:
+                        want.append((k, oo["side"], oo["price"], oo["amount"], oo["attempt"]))
+                    continue
+                if g["status"] == "idle" and post_buys and g["buy_price"] < current:
+                    side, price = "buy", g["buy_price"]
+                elif g["status"] == "bought":
+                    side, price = "sell", g["sell_price"]
+                else:
+                    continue
+                amount = g["amount"]
+                if not g.get("validated"):
+                    ok, _, price, amount = validate_order(bot.symbol, side, price, amount)
+                    if not ok:
+                        continue
+                if side == "buy":
+                    if krw < price * amount:
+                        continue
+                    krw -= price * amount
+                want.append((k, side, price, amount, g.get("attempt", 0)))
+        self.submit(bot, want)
+
+# 시뮬레이션 모드 + SIM_ENGINE=book: fillsim 호가창 엔진을 붙인 mock 거래소에 지정가를 걸어 부분체결/큐 위치/수수료/지연까지 반영
+class BookSimBackend(LiveBackend):
+    name = "booksim"
 
-    logger.info(f"[SIM] {side.upper()} {amount} {SYMBOL} @ {int(exec_price):,}")
-    with state_lock:
-        s2 = load_state()
-    if s2.get("auto_mode") and TELEGRAM_API and TELEGRAM_CHAT_ID:
-        tg_send(f"[AUTO 체결] {side.upper()} {amount} {SYMBOL} @ {int(exec_price):,}\nKRW: {int(s2['krw']):,} / BTC: {s2['btc']}")
-    return {"id": f"SIM-{side}-{int(time.time())}", "side": side, "price": exec_price, "amount": amount, "status": "closed"}
+    def __init__(self):
+        super().__init__(exchange_factory=self._make_exchange, rate=1e9, burst=1_000_000, pending_sec=float("inf"))
+        self.funded = set()
+
+    def _make_exchange(self):
+        import fillsim, mock_exchange
+        def engine(symbol):
+            quote = symbol.split("/")[1]
+            tick_fn = (lambda p: tick_size(quote, p)) if quote in TICK_TABLES else fillsim.relative_tick
+            return fillsim.FillSim(tick_fn=tick_fn)
+        return mock_exchange.MockExchange(balance=0.0, engine_factory=engine)
+
+    def sync(self, bot, current, post_buys):
+        if bot.symbol not in self.funded:
+            with bot.store.lock:
+                krw, base = bot.state["krw"], bot.state["btc"]
+            self.ex.fund(bot.quote, krw)
+            self.ex.fund(bot.base, base)
+            self.funded.add(bot.symbol)
+        self.ex.set_price(bot.symbol, current)
+        super().sync(bot, current, post_buys)
+
+if not SIMULATION:
+    execution = LiveBackend()
+elif SIM_ENGINE == "book":
+    execution = BookSimBackend()
+else:
+    execution = SimBackend()
+
+def place_order(side, price, amount, grid_key=None, bot=None, validated=False):
+    bot = bot or bots[SYMBOL]
+    if not validated:
+        ok, msg, price, amount = validate_order(bot.symbol, side, price, amount)
+        if not ok:
+            ORDER_REJECTS.inc(bot.symbol, side, "validate")
+            logger.info(f"[ORDER REJECT] {msg}")
+            tg_send(f"❌ 주문 거절: {msg}")
+            return None
+    return bot.backend.execute(bot, side, price, amount, grid_key)
+
+# ---------- Grid ladder ----------
+# idle 매수 레벨(buy_price 순)과 bought 매도 레벨(sell_price 순)을 정렬 유지 → 틱당 O(log n + 체결 수)
+class GridLadder:
+    KEY_MAX = chr(0x10FFFF)
+
+    def __init__(self):
+        self.signature = None
+        self.idle = []
+        self.bought = []
+        self.where = {}
+        self.ready = False
+
+    def rebuild(self, go):
+        self.idle, self.bought, self.where = [], [], {}
+        for k, g in go.items():
+            self._add(k, g)
+        self.ready = True
+
+    def _add(self, k, g):
+        status = g.get("status")
+        if status == "idle":
+            arr, entry = self.idle, (g["buy_price"], k)
+        elif status == "bought":
+            arr, entry = self.bought, (g["sell_price"], k)
+        else:
+            return
+        insort(arr, entry)
+        self.where[k] = (arr, entry)
+
+    def _remove(self, k):
+        loc = self.where.pop(k, None)
+        if loc:
+            arr, entry = loc
+            i = bisect_left(arr, entry)
+            if i < len(arr) and arr[i] == entry:
+                del arr[i]
+
+    def on_event(self, s, ev):
+        if not self.ready:
+            return
+        go = s["grid_orders"]
+        for k in (ev.get("grids") or {}):
+            self._remove(k)
+            self._add(k, go[k])
+
+    def buys_at(self, price):
+        i = bisect_left(self.idle, (price, ""))
+        return [k for _, k in self.idle[i:]]
+
+    def sells_at(self, price):
+        i = bisect_right(self.bought, (price, self.KEY_MAX))
+        return [k for _, k in self.bought[:i]]
+
+    # 현재가 아래 가장 가까운 idle 매수가, 위로 가장 가까운 bought 매도가. 이 구간을 벗어나야 새 주문이 생긴다
+    def band(self, price):
+        i = bisect_left(self.idle, (price, ""))
+        j = bisect_right(self.bought, (price, self.KEY_MAX))
+        return (self.idle[i - 1][0] if i else None,
+                self.bought[j][0] if j < len(self.bought) else None)
+
+# ---------- Symbols ----------
+def symbol_data_file(symbol):
+    if symbol == SYMBOL:
+        return DATA_FILE
+    root, ext = os.path.splitext(DATA_FILE)
+    return f"{root}.{symbol.replace('/', '-')}{ext or '.json'}"
+
+# 심볼별 독립 상태(잔고/그리드/전략)와 래더. 모드·뉴스 같은 전역 설정은 기본 심볼(SYMBOL) 상태에 둔다
+class SymbolBot:
+    def __init__(self, symbol, state_store=None):
+        self.symbol = symbol
+        self.base, self.quote = symbol.split("/")
+        self.store = state_store or StateStore(symbol_data_file(symbol))
+        self.ladder = GridLadder()
+        self.store.listeners.append(self.ladder.on_event)
+        self.test_feed = test_feed if symbol == SYMBOL else TestPriceFeed()
+        self.tick_lock = threading.Lock()
+        self.backend = execution
+        self.changes = ChangeIndex(self.store)
+        self.store.listeners.append(publish_state_event(symbol))
+        self.store.listeners.append(ledger_writer(symbol))
+        ledger_backfill(symbol, self.store)
+        self.last_quote = None
+        self.band = None
+
+    @property
+    def state(self):
+        return self.store.data
+
+    def interval(self):
+        with self.store.lock:
+            return self.store.data.get("check_interval", CHECK_INTERVAL)
+
+bots = {sym: SymbolBot(sym, store if sym == SYMBOL else None) for sym in SYMBOLS}
+startup.mark("bots")
+
+def grid_occupancy():
+    for sym, bot in bots.items():
+        with bot.store.lock:
+            go = bot.state.get("grid_orders", {})
+            if bot.ladder.ready:
+                idle, bought = len(bot.ladder.idle), len(bot.ladder.bought)
+            else:
+                idle, bought = go.count("idle"), go.count("bought")
+            total = len(go)
+        yield (sym, "idle"), idle
+        yield (sym, "bought"), bought
+        yield (sym, "sold"), total - idle - bought
+
+def balances():
+    for sym, bot in bots.items():
+        with bot.store.lock:
+            yield (sym, bot.quote), bot.state.get("krw", 0)
+            yield (sym, bot.base), bot.state.get("btc", 0)
+
+Gauge("gridbot_startup_seconds", "Boot time by phase", ["phase"], lambda: [((p,), d) for p, d in startup.phases])
+Gauge("gridbot_grid_levels", "Grid levels by status", ["symbol", "status"], grid_occupancy)
+Gauge("gridbot_balance", "Simulated balances", ["symbol", "asset"], balances)
+Gauge("gridbot_sse_subscribers", "Connected /stream clients", (), lambda: [((), len(bus.subscribers))])
+Gauge("gridbot_sse_dropped_total", "/stream clients dropped for falling behind", (), lambda: [((), bus.dropped)], kind="counter")
+Gauge("gridbot_telegram_failures_total", "Telegram messages that could not be delivered", ["reason"],
+      lambda: [(("failed",), tg_sender.failed), (("dropped",), tg_sender.dropped)], kind="counter")
+
+def pick_bot(parts):
+    for p in parts[1:]:
+        sym = p.upper()
+        bot = bots.get(sym) or next((b for b in bots.values() if b.base == sym), None)
+        if bot:
+            return bot, [x for x in parts if x is not p]
+    return bots[SYMBOL], parts
+
+# ---------- Approvals ----------
+# 수동 모드 매수 승인 대기열: 틱은 요청만 등록하고 즉시 반환, 콜백 수신 시 주문, 만료는 deadline 힙으로 처리
+class ApprovalQueue:
+    def __init__(self, timeout=CONFIRM_TIMEOUT):
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.by_grid = {}
+        self.deadlines = []
+        self._seq = itertools.count(1)
+
+    def submit(self, symbol, grid, side, price, amount):
+        now = time.time()
+        rec = {"id": f"{side}_{grid}_{int(now)}_{next(self._seq)}", "symbol": symbol, "grid": grid, "side": side,
+               "price": price, "amount": amount, "expires_at": now + self.timeout}
+        with self.lock:
+            self.pending[rec["id"]] = rec
+            self.by_grid[(symbol, grid)] = rec["id"]
+            heapq.heappush(self.deadlines, (rec["expires_at"], rec["id"]))
+        return rec
+
+    def _drop(self, pid):
+        rec = self.pending.pop(pid, None)
+        if rec and self.by_grid.get((rec["symbol"], rec["grid"])) == pid:
+            del self.by_grid[(rec["symbol"], rec["grid"])]
+        return rec
+
+    def is_pending(self, symbol, grid):
+        with self.lock:
+            return (symbol, grid) in self.by_grid
+
+    def resolve(self, pid):
+        with self.lock:
+            rec = self.pending.get(pid)
+            if rec is None or rec["expires_at"] < time.time():
+                return None
+            return self._drop(pid)
+
+    def expire(self, now=None):
+        now = now or time.time()
+        expired = []
+        with self.lock:
+            while self.deadlines and self.deadlines[0][0] <= now:
+                _, pid = heapq.heappop(self.deadlines)
+                rec = self._drop(pid)
+                if rec:
+                    expired.append(rec)
+        return expired
+
+    def snapshot(self):
+        with self.lock:
+            return sorted(self.pending.values(), key=lambda r: r["expires_at"])
+
+approvals = ApprovalQueue()
+
+def on_approval(pid, ans):
+    rec = approvals.resolve(pid)
+    if rec is None:
+        tg_send("⌛ 만료되었거나 이미 처리된 승인 요청입니다.")
+        return
+    if ans != "yes":
+        logger.info(f"approval declined | grid #{rec['grid']} {pid}")
+        return
+    bot = bots[rec["symbol"]]
+    with bot.store.lock:
+        g = bot.state["grid_orders"].get(rec["grid"])
+        still_idle = g is not None and g.get("status") == "idle"
+    if still_idle:
+        place_order(rec["side"], rec["price"], rec["amount"], grid_key=rec["grid"], bot=bot, validated=g.get("validated", False))
 
 # ---------- Strategy tick ----------
-def run_grid_once():
+def run_grid_once(bot=None, quote=None):
+    bot = bot or bots[SYMBOL]
+    with bot.tick_lock:
+        t0 = time.perf_counter()
+        try:
+            grid_tick(bot, quote)
+        finally:
+            TICK_SECONDS.observe(time.perf_counter() - t0, bot.symbol)
+            startup.finish("first_tick")
+
+def grid_tick(bot, quote=None):
+    lock = bot.store.lock
+    with lock:
+        s = bot.state
+        low = s.get("price_low")
+        high = s.get("price_high")
+        ng = s.get("n_grids", N_GRIDS)
+        pad = s.get("price_padding", PRICE_PADDING)
+        mode = s.get("grid_mode", GRID_MODE)
+        signature = (low, high, ng, pad, mode)
+
+    current, low_seen, high_seen = quote or get_price_range(bot.symbol)
+    bot.last_quote = (current, time.time())
+    ladder = bot.ladder
+
+    # 설정(signature)이 바뀌었을 때 한 번만 래더를 만들고 검증한다. 주문 불가 레벨은 빼고(백테스트와 동일) 알림은 한 번,
+    # 설정 자체가 잘못돼도 기존 그리드의 매수/매도는 계속 돈다
+    if ladder.signature != signature:
+        low = low or (float(PRICE_LOW) if PRICE_LOW and bot.symbol == SYMBOL else current * 0.98)
+        high = high or (float(PRICE_HIGH) if PRICE_HIGH and bot.symbol == SYMBOL else current * 1.02)
+
+        if low >= high:
+            logger.warning(f"[{bot.symbol}] PRICE_LOW < PRICE_HIGH 이어야 합니다")
+            levels = {}
+        else:
+            levels, rejects = validate_ladder(bot.symbol, make_grid_orders(low, high, ng, pad, mode))
+            if rejects:
+                for k in rejects:
+                    del levels[k]
+                k, msg = next(iter(rejects.items()))
+                logger.warning(f"[{bot.symbol}] grid: {len(rejects)}/{ng} levels invalid, skipped (#{k}: {msg})")
+                head = f"⚠️ 그리드 일부 제외 ({bot.symbol})" if levels else f"❌ 그리드 설정 거절 ({bot.symbol}), 기존 그리드 유지"
+                tg_send(f"{head}: {len(rejects)}/{ng}개 레벨 주문 불가 → {len(levels)}개로 진행\n#{k}: {msg}\n범위/개수/TOTAL_KRW를 조정하세요")
+
+        with lock:
+            go = s.get("grid_orders", {})
+            created = {k: g for k, g in levels.items() if k not in go}
+            if not ladder.ready:
+                ladder.rebuild(go)
+            if created:
+                bot.store.record("grid_created", grids=created)
+            ladder.signature = signature
+
+    with lock:
+        go = s.get("grid_orders", {})
+        buys = [(k, go[k]) for k in ladder.buys_at(low_seen)]
+
     with state_lock:
-        s = load_state()
+        settings = load_state()
+        auto, test = settings.get("auto_mode", False), settings.get("test_mode")
 
-    current = get_price(SYMBOL)
+    # live 백엔드는 sync에서 지정가를 걸어두므로, 틱 루프는 수동 승인 매수만 처리
+    post_buys = auto or not (TELEGRAM_API and TELEGRAM_CHAT_ID)
+    bot.backend.sync(bot, current, post_buys)
+    if bot.backend.live and post_buys:
+        buys = []
 
-    low = s.get("price_low") or (float(PRICE_LOW) if PRICE_LOW else current * 0.98)
-    high = s.get("price_high") or (float(PRICE_HIGH) if PRICE_HIGH else current * 1.02)
-    ng = s.get("n_grids", N_GRIDS)
-    pad = s.get("price_padding", PRICE_PADDING)
+    for k, g in buys:
+        if g["status"] != "idle" or g.get("open_order") or approvals.is_pending(bot.symbol, k):
+            continue
+        if not auto and TELEGRAM_API and TELEGRAM_CHAT_ID:
+            rec = approvals.submit(bot.symbol, k, "buy", g["buy_price"], g["amount"])
+            tg_send_confirm(f"그리드 #{k} 매수 승인?\n코인: {bot.symbol}\n매수가: {int(g['buy_price']):,}\n수량: {g['amount']}\n(응답 {CONFIRM_TIMEOUT}s)", rec["id"])
+            continue
+        place_order("buy", g["buy_price"], g["amount"], grid_key=k, bot=bot, validated=g.get("validated", False))
 
-    if low >= high:
-        logger.warning("PRICE_LOW < PRICE_HIGH 이어야 합니다")
-        return
+    with lock:
+        sells = [] if bot.backend.live else [(k, go[k]) for k in ladder.sells_at(high_seen)]
 
-    levels = build_grid(low, high, ng, GRID_MODE)
-    go = s.get("grid_orders", {})
-    order_krw = TOTAL_KRW / ng
+    for k, g in sells:
+        if g["status"] == "bought":
+            place_order("sell", g["sell_price"], g["amount"], grid_key=k, bot=bot, validated=g.get("validated", False))
 
-    for i in range(ng):
-        buy_price = levels[i] + pad
-        sell_price = levels[i + 1] - pad
-        amount = round(order_krw / max(buy_price, 1), 8)
-        key = str(i)
-        if key not in go:
-            go[key] = {"buy_price": buy_price, "sell_price": sell_price, "amount": amount, "status": "idle"}
+    with lock:
+        bot.band = (current,) + ladder.band(current)
+    if stream_feed is not None:
+        stream_feed.watch(bot.symbol, *bot.band[1:])
 
-    for k, g in go.items():
-        if g["status"] == "idle" and current <= g["buy_price"]:
-            with state_lock:
-                s2 = load_state()
-                need_confirm = (not s2.get("auto_mode", False))
-            do_place = True
-            if need_confirm and TELEGRAM_API and TELEGRAM_CHAT_ID:
-                pid = f"buy_{k}_{int(time.time())}"
-                tg_send_confirm(f"그리드 #{k} 매수 승인?\n코인: {SYMBOL}\n매수가: {int(g['buy_price']):,}\n수량: {g['amount']}\n(응답 {CONFIRM_TIMEOUT}s)", pid)
-                waited = 0
-                ans = None
-                while waited < CONFIRM_TIMEOUT:
-                    if pid in telegram_answers:
-                        ans = telegram_answers.pop(pid)[0]
-                        break
-                    time.sleep(1)
-                    waited += 1
-                if ans != "yes":
-                    do_place = False
-            if do_place:
-                order = place_order("buy", g["buy_price"], g["amount"])
-                if order:
-                    go[k]["status"] = "bought"
-                    go[k]["buy_order"] = order
-
-        if g["status"] == "bought" and current >= g["sell_price"]:
-            order = place_order("sell", g["sell_price"], g["amount"])
-            if order:
-                go[k]["status"] = "sold"
-                go[k]["sell_order"] = order
-
-    s["grid_orders"] = go
-    save_state(s)
-    logger.info(f"tick | price={int(current):,} | auto={s.get('auto_mode')} | test={s.get('test_mode')}")
+    bus.publish("tick", {"symbol": bot.symbol, "price": current, "low": low_seen, "high": high_seen, "ts": time.time()}, bot.symbol)
+    logger.info(f"tick | {bot.symbol} | price={current:,.0f} | auto={auto} | test={test}")
 
 # ---------- Scheduler ----------
+CONFIG_FIELDS = {"price_low", "price_high", "n_grids", "price_padding", "grid_mode", "check_interval",
+                 "strategy", "auto_mode", "test_mode"}
+SCHED_WAKES = Counter("gridbot_scheduler_wakes_total", "Ticks started before their deadline", ["symbol", "reason"])
+
+# 심볼별 마감시각(monotonic, 틱 소요시간과 무관하게 anchor + interval)을 관리하고,
+# 같은 시점에 도래한 심볼들은 시세를 한 번에 받아 워커 풀에서 틱을 돌린다.
+# 레벨 근처면 짧게, 멀면 길게 폴링하고, 스트림 교차/설정 변경은 마감 전에 깨운다
+class TickScheduler:
+    def __init__(self, symbols):
+        self.due = {sym: 0.0 for sym in symbols}
+        self.intervals = {sym: None for sym in symbols}
+        self.wakeup = threading.Event()
+
+    def wake(self, symbol=None, reason="crossing"):
+        for sym in ([symbol] if symbol else list(self.due)):
+            if self.due[sym] > time.monotonic():
+                self.due[sym] = time.monotonic()
+                SCHED_WAKES.inc(sym, reason)
+        self.wakeup.set()
+
+    def on_state_event(self, s, ev):
+        if CONFIG_FIELDS.intersection(ev.get("fields") or ()):
+            self.wake(reason="config")
+
+    def next_interval(self, bot):
+        base = bot.interval()
+        if not ADAPTIVE_POLL or bot.band is None:
+            return base
+        price, lo, hi = bot.band
+        dist = min(price - lo if lo is not None else float("inf"), hi - price if hi is not None else float("inf")) / price
+        return min(max(base * dist / SCHED_NEAR_PCT, SCHED_MIN_INTERVAL), max(base, SCHED_MAX_INTERVAL))
+
+    def reschedule(self, sym, bot, anchor):
+        itv = self.next_interval(bot)
+        self.intervals[sym] = itv
+        now = time.monotonic()
+        # 틱이 늦어져 놓친 주기는 몰아서 돌리지 않고 건너뛴다
+        nxt = anchor + itv
+        if nxt <= now:
+            nxt = anchor + itv * (int((now - anchor) // itv) + 1)
+        self.due[sym] = nxt
+
+    def wait(self):
+        timeout = min(self.due.values()) - time.monotonic()
+        if timeout > 0:
+            self.wakeup.wait(min(timeout, 1.0))
+        self.wakeup.clear()
+
+scheduler = TickScheduler(SYMBOLS)
+for _bot in bots.values():
+    _bot.store.listeners.append(scheduler.on_state_event)
+if stream_feed is not None:
+    stream_feed.on_cross = scheduler.wake
+Gauge("gridbot_tick_interval_seconds", "Current adaptive polling interval", ["symbol"],
+      lambda: [((sym,), itv) for sym, itv in scheduler.intervals.items() if itv is not None])
+
 def loop_runner():
-    logger.info("Loop runner started")
-    while True:
-        try:
-            with state_lock:
-                s = load_state()
-                interval = s.get("check_interval", CHECK_INTERVAL)
-            run_grid_once()
-            time.sleep(interval)
-        except Exception as e:
-            logger.exception(f"loop err: {e}")
-            time.sleep(3)
+    logger.info(f"Loop runner started | symbols={SYMBOLS} | workers={SYMBOL_WORKERS} | adaptive={ADAPTIVE_POLL}")
+    with ThreadPoolExecutor(max_workers=SYMBOL_WORKERS, thread_name_prefix="tick") as pool:
+        while True:
+            try:
+                for rec in approvals.expire():
+                    logger.info(f"approval expired | {rec['symbol']} grid #{rec['grid']} {rec['id']}")
+                now = time.monotonic()
+                ready = {sym: t or now for sym, t in scheduler.due.items() if t <= now}
+                if ready:
+                    quotes = get_quotes(list(ready))
+                    futures = {sym: pool.submit(run_grid_once, bots[sym], quotes.get(sym)) for sym in ready}
+                    for sym, fut in futures.items():
+                        try:
+                            fut.result()
+                        except Exception as e:
+                            logger.exception(f"[{sym}] tick err: {e}")
+                        scheduler.reschedule(sym, bots[sym], ready[sym])
+                scheduler.wait()
+            except Exception as e:
+                logger.exception(f"loop err: {e}")
+                time.sleep(3)
 
 # ---------- News helpers ----------
-def news_fetch_from_sources(sources):
+def parse_feed_entries(name, feed):
     items = []
-    for name in sources:
-        url = RSS_MAP.get(name)
-        if not url:
-            continue
-        try:
-            feed = feedparser.parse(url)
-            for e in feed.entries[:20]:
-                eid = getattr(e, "id", None) or getattr(e, "link", None) or getattr(e, "title", "")[:80]
-                title = e.title if hasattr(e, "title") else ""
-                link = e.link if hasattr(e, "link") else ""
-                summary = getattr(e, "summary", "") or getattr(e, "description", "")
-                published = None
-                if hasattr(e, "published_parsed") and e.published_parsed:
-                    published = datetime(*e.published_parsed[:6]).astimezone(LOCAL_TZ)
-                items.append({"id": f"{name}:{eid}","source": name,"title": title,"link": link,"summary": summary,"published": published.isoformat() if published else None})
-        except Exception as ex:
-            logger.warning(f"RSS fetch fail {name}: {ex}")
+    for e in feed.entries[:20]:
+        eid = getattr(e, "id", None) or getattr(e, "link", None) or getattr(e, "title", "")[:80]
+        title = e.title if hasattr(e, "title") else ""
+        link = e.link if hasattr(e, "link") else ""
+        summary = getattr(e, "summary", "") or getattr(e, "description", "")
+        published = None
+        if hasattr(e, "published_parsed") and e.published_parsed:
+            published = datetime(*e.published_parsed[:6]).astimezone(LOCAL_TZ)
+        items.append({"id": f"{name}:{eid}","source": name,"title": title,"link": link,"summary": summary,"published": published.isoformat() if published else None})
     return items
 
+# 소스별 병렬 수집 + ETag/Last-Modified 조건부 GET. 304면 파싱 없이 캐시 재사용, 주기/즉시 요청이 같은 결과를 공유
+class NewsFeedCache:
+    def __init__(self, path=NEWS_CACHE_FILE, ttl=NEWS_CACHE_TTL, workers=NEWS_FETCH_WORKERS, timeout=NEWS_FETCH_TIMEOUT):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.fetch_lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rss")
+        self.session = requests.Session()
+        self.fetched_at = {}
+        self.fetched = self.not_modified = self.errors = 0
+        self.sources = self._read()
+
+    def _read(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.warning(f"news cache load failed: {e}")
+        return {}
+
+    def _write(self):
+        with self.lock:
+            payload = json.dumps(self.sources, default=str)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(payload)
+        os.replace(tmp, self.path)
+
+    def _fetch(self, name, url):
+        cached = self.sources.get(name) or {}
+        headers = {}
+        if cached.get("items") is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("modified"):
+                headers["If-Modified-Since"] = cached["modified"]
+        r = self.session.get(url, headers=headers, timeout=self.timeout)
+        if r.status_code == 304:
+            return None
+        r.raise_for_status()
+        import feedparser
+        feed = feedparser.parse(r.content)
+        return {"etag": r.headers.get("ETag"), "modified": r.headers.get("Last-Modified"), "items": parse_feed_entries(name, feed)}
+
+    def refresh(self, names, max_age):
+        with self.fetch_lock:
+            now = time.monotonic()
+            due = [n for n in names if n in RSS_MAP and now - self.fetched_at.get(n, -1e18) >= max_age]
+            if not due:
+                return
+            futures = {n: self.pool.submit(self._fetch, n, RSS_MAP[n]) for n in due}
+            changed = False
+            for name, fut in futures.items():
+                try:
+                    res = fut.result()
+                except Exception as ex:
+                    self.errors += 1
+                    logger.warning(f"RSS fetch fail {name}: {ex}")
+                    continue
+                self.fetched_at[name] = time.monotonic()
+                if res is None:
+                    self.not_modified += 1
+                    continue
+                self.fetched += 1
+                with self.lock:
+                    self.sources[name] = res
+                changed = True
+            if changed:
+                try:
+                    self._write()
+                except Exception as e:
+                    logger.warning(f"news cache save failed: {e}")
+
+    def get(self, names, max_age=None):
+        self.refresh(names, self.ttl if max_age is None else max_age)
+        with self.lock:
+            return [it for n in names for it in (self.sources.get(n) or {}).get("items") or []]
+
+    def stats(self):
+        return {"fetched": self.fetched, "not_modified": self.not_modified, "errors": self.errors}
+
+news_cache = NewsFeedCache()
+
+# 이미 보낸 기사 id. 삽입 순서대로 보관하고 오래된 것부터(개수/기간) 버림. 거래 상태와 분리된 파일에 저장
+class NewsSeenStore:
+    def __init__(self, path=NEWS_SEEN_FILE, maxlen=NEWS_SEEN_MAX, max_age_days=NEWS_SEEN_DAYS):
+        self.path = path
+        self.maxlen = maxlen
+        self.max_age = max_age_days * 86400
+        self.lock = threading.Lock()
+        self.ids = OrderedDict()
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.ids.update(json.load(f))
+            except Exception as e:
+                logger.warning(f"news seen load failed: {e}")
+
+    def __contains__(self, item_id):
+        return item_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, item_id, ts=None):
+        with self.lock:
+            if item_id in self.ids:
+                return
+            self.ids[item_id] = ts or time.time()
+            self.dirty = True
+            self._evict()
+
+    def _evict(self):
+        cutoff = time.time() - self.max_age
+        while self.ids and (len(self.ids) > self.maxlen or next(iter(self.ids.values())) < cutoff):
+            self.ids.popitem(last=False)
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            payload = json.dumps(list(self.ids.items()))
+            self.dirty = False
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(payload)
+        os.replace(tmp, self.path)
+
+    def migrate(self, state_store):
+        with state_store.lock:
+            legacy = state_store.data.get("news_seen_ids")
+        if legacy is None:
+            return
+        now = time.time()
+        for item_id in legacy:
+            self.add(item_id, now)
+        self.save()
+        state_store.record("news_seen_migrated", drop=["news_seen_ids"])
+        logger.info(f"news seen: migrated {len(legacy)} ids out of the state file")
+
+news_seen = NewsSeenStore()
+news_seen.migrate(store)
+
+def news_fetch_from_sources(sources, max_age=None):
+    return news_cache.get(sources, max_age)
+
+POS_KEYS = ["etf", "approval", "adoption", "institution", "upgrade", "partnership", "bull", "long"]
+NEG_KEYS = ["hack", "ban", "regulation", "lawsuit", "down", "restrict", "selloff", "liquidation", "bear", "short"]
+# 같은 키워드로 셀 변형은 명시적으로만 (어미를 일괄로 붙이면 longer/banish/bearing/shorter 같은 오탐).
+# 목록에 없는 키워드(NEWS_FILTER 등)는 그대로 + 복수형 s만
+KEYWORD_FORMS = {
+    "etf": ("etfs",),
+    "approval": ("approvals", "approve", "approves", "approved"),
+    "adoption": ("adopt", "adopts", "adopted"),
+    "institution": ("institutions", "institutional"),
+    "upgrade": ("upgrades", "upgraded"),
+    "partnership": ("partnerships", "partner", "partners", "partnered"),
+    "bull": ("bulls", "bullish"),
+    "long": ("longs",),
+    "hack": ("hacks", "hacked", "hacker", "hackers", "hacking"),
+    "ban": ("bans", "banned", "banning"),
+    "regulation": ("regulations", "regulatory", "regulator", "regulators"),
+    "lawsuit": ("lawsuits",),
+    "restrict": ("restricts", "restricted", "restricting", "restriction", "restrictions"),
+    "selloff": ("selloffs", "sell-off", "sell-offs"),
+    "liquidation": ("liquidations", "liquidated"),
+    "bear": ("bears", "bearish"),
+    "short": ("shorts", "shorted", "shorting"),
+}
+
+def keyword_forms(k):
+    return (k,) + KEYWORD_FORMS.get(k, (f"{k}s",))
+
+# 필터/호재/악재 키워드를 정규식 하나로 묶어 기사당 한 번만 스캔. 영숫자 경계만 봐서 "countdown"≠"down", 한글 조사는 허용
+class KeywordMatcher:
+    def __init__(self, include=(), pos=POS_KEYS, neg=NEG_KEYS):
+        self.include = tuple(k.strip().lower() for k in include if k.strip())
+        # 변형 → 원형, 원형 → 태그. 한 기사에서 같은 원형은 변형이 여러 개 나와도 1회
+        self.stems, self.tags = {}, {}
+        for tag, keys in (("include", self.include), ("pos", pos), ("neg", neg)):
+            for k in keys:
+                k = k.lower()
+                self.tags.setdefault(k, set()).add(tag)
+                for form in keyword_forms(k):
+                    self.stems.setdefault(form, k)
+        alts = "|".join(re.escape(k) for k in sorted(self.stems, key=len, reverse=True))
+        self.regex = re.compile(rf"(?<![a-z0-9])({alts})(?![a-z0-9])") if alts else None
+
+    def scan(self, text):
+        counts = {"include": 0, "pos": 0, "neg": 0}
+        if self.regex:
+            for k in {self.stems[form] for form in self.regex.findall(text.lower())}:
+                for tag in self.tags[k]:
+                    counts[tag] += 1
+        return counts
+
+_news_matcher = KeywordMatcher()
+
+def news_matcher(include_keywords):
+    global _news_matcher
+    m = _news_matcher
+    if m.include != tuple(k.strip().lower() for k in include_keywords if k.strip()):
+        m = _news_matcher = KeywordMatcher(include_keywords)
+    return m
+
 def news_filter_items(items, include_keywords):
-    if not include_keywords:
-        return items
-    keys = [k.lower() for k in include_keywords]
+    m = news_matcher(include_keywords)
     filtered = []
     for it in items:
-        text = f"{it['title']} {it['summary']}".lower()
-        if any(k in text for k in keys):
-            filtered.append(it)
+        hits = m.scan(f"{it['title']} {it['summary']}")
+        if m.include and not hits["include"]:
+            continue
+        filtered.append({**it, "sentiment": (hits["pos"], hits["neg"])})
     return filtered
 
-POS_KEYS = ["etf", "approval", "adoption", "institution", "upgrade", "partnership", "bull", "long"]
-NEG_KEYS = ["hack", "ban", "regulation", "lawsuit", "down", "restrict", "selloff", "liquidation", "bear", "short"]
-
 def news_recommend_strategy(item):
-    text = f"{item['title']} {item['summary']}".lower()
-    pos = sum(k in text for k in POS_KEYS)
-    neg = sum(k in text for k in NEG_KEYS)
+    if "sentiment" in item:
+        pos, neg = item["sentiment"]
+    else:
+        hits = _news_matcher.scan(f"{item['title']} {item['summary']}")
+        pos, neg = hits["pos"], hits["neg"]
     if neg > pos:
         return "down", "⚠️ 리스크 확대 가능성 — 보수적(down) 권장"
     if pos > neg:
@@ -471,32 +1898,32 @@ def tg_send_news_item(item):
     msg = f"📰 [{item['source']}] {title}{pub_s}\n{link}\n\n전략 제안: {note}\n바꾸기 → /strategy {strat}"
     tg_send(msg)
 
-def news_loop():
-    logger.info(f"News loop started | interval={NEWS_INTERVAL_MIN}m | sources={NEWS_SOURCES}")
-    while True:
-        try:
-            with state_lock:
-                s = load_state()
-            if not s.get("news_enabled", False):
-                time.sleep(NEWS_INTERVAL_MIN * 60)
-                continue
+def news_deliver(max_age=None):
+    with state_lock:
+        s = load_state()
+        include = list(s.get("news_filter", []))
 
-            items = news_fetch_from_sources(NEWS_SOURCES)
-            items = news_filter_items(items, s.get("news_filter", []))
+    items = news_fetch_from_sources(NEWS_SOURCES, max_age)
+    items = news_filter_items(items, include)
 
-            seen = set(s.get("news_seen_ids", []))
-            fresh = [it for it in items if it["id"] not in seen]
-            fresh = fresh[:NEWS_MAX_ITEMS]
+    fresh = [it for it in items if it["id"] not in news_seen]
+    fresh = fresh[:NEWS_MAX_ITEMS]
 
-            for it in fresh:
-                tg_send_news_item(it)
-                seen.add(it["id"])
+    for it in fresh:
+        tg_send_news_item(it)
+        news_seen.add(it["id"])
 
-            with state_lock:
-                s2 = load_state()
-                s2["news_seen_ids"] = list(seen)[-1000:]
-                save_state(s2)
+    news_seen.save()
+    return len(fresh)
 
+def news_loop():
+    logger.info(f"News loop started | interval={NEWS_INTERVAL_MIN}m | sources={NEWS_SOURCES}")
+    while True:
+        try:
+            with state_lock:
+                enabled = load_state().get("news_enabled", False)
+            if enabled:
+                news_deliver(max_age=0)
             time.sleep(NEWS_INTERVAL_MIN * 60)
 
         except Exception as e:
@@ -522,74 +1949,96 @@ def telegram_poll():
                     if "callback_query" in u:
                         cb = u["callback_query"]
                         data = json.loads(cb.get("data"))
-                        telegram_answers[data["id"]] = (data["ans"], datetime.utcnow().isoformat())
-                        requests.post(f"{TELEGRAM_API}/answerCallbackQuery", data={"callback_query_id": cb["id"]})
+                        requests.post(f"{TELEGRAM_API}/answerCallbackQuery", data={"callback_query_id": cb["id"]}, timeout=10)
+                        on_approval(data["id"], data["ans"])
                     elif "message" in u and "text" in u["message"]:
                         text = u["message"]["text"].strip()
+                        if text.startswith("/news_now"):
+                            sent = news_deliver(max_age=NEWS_NOW_MAX_AGE)
+                            tg_send(f"즉시 뉴스 {sent}건 전송 완료")
+                            continue
                         with state_lock:
                             s = load_state()
                             if text.startswith("/auto"):
-                                s["auto_mode"] = True; save_state(s); tg_send("자동 승인 모드 ON")
+                                store.record("mode_toggled", fields={"auto_mode": True}); tg_send("자동 승인 모드 ON")
                             elif text.startswith("/manual"):
-                                s["auto_mode"] = False; save_state(s); tg_send("수동 승인 모드 ON")
+                                store.record("mode_toggled", fields={"auto_mode": False}); tg_send("수동 승인 모드 ON")
                             elif text.startswith("/restart"):
-                                s["auto_mode"] = True; save_state(s); tg_send("자동매매 재시작 (AUTO_MODE=ON)")
+                                store.record("mode_toggled", fields={"auto_mode": True}); tg_send("자동매매 재시작 (AUTO_MODE=ON)")
                             elif text.startswith("/stop"):
-                                tg_send("자동매매 종료합니다."); save_state(s); os._exit(0)
+                                tg_send("자동매매 종료합니다.")
+                                for bot in bots.values():
+                                    bot.store.flush()
+                                stop_api_server()
+                                os._exit(0)
                             elif text.startswith("/balance"):
-                                tg_send(f"잔액\nKRW: {s.get('krw'):,}\nBTC: {s.get('btc')}")
+                                bot, _ = pick_bot(text.split())
+                                bs = bot.state
+                                tg_send(f"잔액 ({bot.symbol})\nKRW: {bs.get('krw'):,}\n{bot.base}: {bs.get('btc')}")
+                            elif text.startswith("/pnl"):
+                                bot, _ = pick_bot(text.split())
+                                mark = bot.last_quote[0] if bot.last_quote else None
+                                tg_send(pnl_text(trade_ledger.pnl(bot.symbol, mark, days=1, top=3)))
+                            elif text.startswith("/symbols"):
+                                lines = []
+                                for bot in bots.values():
+                                    with bot.store.lock:
+                                        bs = bot.state
+                                        n_bought = sum(1 for g in bs.get("grid_orders", {}).values() if g.get("status") == "bought")
+                                        lines.append(f"{bot.symbol} | 전략: {bs.get('strategy') or '-'} | KRW: {int(bs.get('krw', 0)):,} | {bot.base}: {bs.get('btc')} | 보유 그리드: {n_bought}")
+                                tg_send("심볼 목록\n" + "\n".join(lines))
                             elif text.startswith("/current_target"):
-                                go = s.get("grid_orders", {}); last = None
+                                bot, _ = pick_bot(text.split())
+                                go = bot.state.get("grid_orders", {}); last = None
                                 for k, v in go.items():
                                     if v.get("status") == "bought":
                                         last = (k, v)
                                 if last:
                                     k, g = last
-                                    tg_send(f"마지막 매수 Grid #{k}\n매수가: {int(g['buy_price']):,}\n목표가: {int(g['sell_price']):,}\n수량: {g['amount']}")
+                                    tg_send(f"[{bot.symbol}] 마지막 매수 Grid #{k}\n매수가: {int(g['buy_price']):,}\n목표가: {int(g['sell_price']):,}\n수량: {g['amount']}")
                                 else:
-                                    tg_send("진행 중 포지션 없음")
+                                    tg_send(f"[{bot.symbol}] 진행 중 포지션 없음")
                             elif text.startswith("/set_target"):
-                                parts = text.split()
+                                bot, parts = pick_bot(text.split())
                                 if len(parts) == 2 and parts[1].replace(".","",1).isdigit():
                                     target = float(parts[1])
-                                    go = s.get("grid_orders", {})
+                                    go = bot.state.get("grid_orders", {})
                                     if go:
                                         last_key = max(go.keys(), key=lambda x:int(x))
-                                        go[last_key]["sell_price"] = target
-                                        save_state(s)
-                                        tg_send(f"그리드 #{last_key} 목표가 {int(target):,}으로 변경")
+                                        # 주문 시 검증을 건너뛰는 validated 레벨이므로 새 목표가도 호가 단위/최소주문 검증을 거쳐 저장
+                                        checked, rejects = validate_ladder(bot.symbol, {last_key: {**go[last_key], "sell_price": target}})
+                                        if rejects:
+                                            tg_send(f"[{bot.symbol}] 목표가 거절: {rejects[last_key]}")
+                                        else:
+                                            target = checked[last_key]["sell_price"]
+                                            bot.store.record("target_changed", grids={last_key: {"sell_price": target, "validated": True}})
+                                            tg_send(f"[{bot.symbol}] 그리드 #{last_key} 목표가 {int(target):,}으로 변경")
                             elif text.startswith("/test_on"):
-                                s["test_mode"] = True; save_state(s); tg_send("테스트 모드 ON (랜덤 시세)")
+                                if not SIMULATION:
+                                    tg_send("실거래 모드(SIMULATION=false)에서는 테스트 모드를 켤 수 없습니다")
+                                else:
+                                    store.record("mode_toggled", fields={"test_mode": True}); tg_send("테스트 모드 ON (랜덤 시세)")
                             elif text.startswith("/test_off"):
-                                s["test_mode"] = False; save_state(s); tg_send("테스트 모드 OFF (실시세 시도)")
+                                store.record("mode_toggled", fields={"test_mode": False}); tg_send("테스트 모드 OFF (실시세 시도)")
+                            elif text.startswith("/pending"):
+                                pend = approvals.snapshot()
+                                if pend:
+                                    tg_send("승인 대기\n" + "\n".join(f"{r['symbol']} 그리드 #{r['grid']} {r['side'].upper()} {int(r['price']):,} ({max(0, int(r['expires_at'] - time.time()))}s 남음)" for r in pend))
+                                else:
+                                    tg_send("승인 대기 없음")
                             elif text.startswith("/mode"):
                                 tg_send(f"MODE\nAUTO_MODE: {s.get('auto_mode')}\nTEST_MODE: {s.get('test_mode')}")
                             # --- 뉴스 명령 ---
                             elif text.startswith("/news_on"):
-                                s["news_enabled"] = True; save_state(s); tg_send("🟢 뉴스 알림 ON")
+                                store.record("mode_toggled", fields={"news_enabled": True}); tg_send("🟢 뉴스 알림 ON")
                             elif text.startswith("/news_off"):
-                                s["news_enabled"] = False; save_state(s); tg_send("⚪️ 뉴스 알림 OFF")
-                            elif text.startswith("/news_now"):
-                                items = news_fetch_from_sources(NEWS_SOURCES)
-                                items = news_filter_items(items, s.get("news_filter", []))
-                                sent = 0
-                                seen = set(s.get("news_seen_ids", []))
-                                for it in items:
-                                    if it["id"] in seen:
-                                        continue
-                                    tg_send_news_item(it)
-                                    seen.add(it["id"]); sent += 1
-                                    if sent >= NEWS_MAX_ITEMS:
-                                        break
-                                s["news_seen_ids"] = list(seen)[-1000:]
-                                save_state(s)
-                                tg_send(f"즉시 뉴스 {sent}건 전송 완료")
+                                store.record("mode_toggled", fields={"news_enabled": False}); tg_send("⚪️ 뉴스 알림 OFF")
                             elif text.startswith("/news_filter"):
                                 parts = text.split(" ", 1)
                                 if len(parts) == 2:
                                     kws = [k.strip().lower() for k in parts[1].split(",") if k.strip()]
-                                    s["news_filter"] = kws
-                                    save_state(s)
+                                    store.record("news_filter_changed", fields={"news_filter": kws})
+                                    news_matcher(kws)
                                     tg_send(f"뉴스 필터 업데이트: {', '.join(kws) if kws else '(전체)'}")
                                 else:
                                     tg_send("사용법: /news_filter 키워드1,키워드2  (비우면 전체)")
@@ -601,30 +2050,33 @@ def telegram_poll():
                                 tg_send(conf + "\n\n즉시 받기: /news_now\nON: /news_on  OFF: /news_off\n필터변경: /news_filter bitcoin,btc")
                             # --- 전략 프리셋 ---
                             elif text.startswith("/strategy_show"):
-                                key = s.get("strategy")
+                                bot, _ = pick_bot(text.split())
+                                bs = bot.state
+                                key = bs.get("strategy")
                                 if key and key in STRATEGY_PROFILES:
                                     prof = STRATEGY_PROFILES[key]
-                                    low  = s.get("price_low")
-                                    high = s.get("price_high")
-                                    n    = s.get("n_grids", N_GRIDS)
-                                    pad  = s.get("price_padding", PRICE_PADDING)
-                                    itv  = s.get("check_interval", CHECK_INTERVAL)
-                                    tg_send(f"현재 전략: {prof['name']} ({key})\n범위: {int(low):,} ~ {int(high):,}\nN_GRIDS: {n} | PADDING: {pad} | INTERVAL: {itv}s")
+                                    low  = bs.get("price_low")
+                                    high = bs.get("price_high")
+                                    n    = bs.get("n_grids", N_GRIDS)
+                                    pad  = bs.get("price_padding", PRICE_PADDING)
+                                    itv  = bs.get("check_interval", CHECK_INTERVAL)
+                                    tg_send(f"[{bot.symbol}] 현재 전략: {prof['name']} ({key})\n범위: {int(low):,} ~ {int(high):,}\nN_GRIDS: {n} | PADDING: {pad} | INTERVAL: {itv}s")
                                 else:
                                     tg_send("현재 전략 프리셋 없음. /strategy up|middle|down 로 설정")
                             elif text.startswith("/strategy"):
-                                parts = text.split()
+                                bot, parts = pick_bot(text.split())
                                 if len(parts) == 2 and parts[1].lower() in STRATEGY_PROFILES:
                                     key = parts[1].lower()
-                                    curr = get_price(SYMBOL)
-                                    summary = apply_strategy_profile(s, curr, key)
-                                    save_state(s)
+                                    curr = get_price(bot.symbol)
+                                    changes = {}
+                                    summary = apply_strategy_profile(changes, curr, key)
                                     if summary:
-                                        tg_send("✅ 전략이 변경되었습니다.\n" + summary + "\n다음 tick부터 적용됩니다.")
+                                        bot.store.record("strategy_changed", fields=changes)
+                                        tg_send(f"✅ [{bot.symbol}] 전략이 변경되었습니다.\n" + summary + "\n다음 tick부터 적용됩니다.")
                                     else:
                                         tg_send("전략 적용 실패")
                                 else:
-                                    tg_send("사용법: /strategy up | /strategy middle | /strategy down")
+                                    tg_send("사용법: /strategy up | /strategy middle | /strategy down  (다른 심볼: /strategy up ETH/KRW)")
             time.sleep(1)
         except Exception as e:
             logger.warning(f"telegram poll err: {e}")
@@ -635,29 +2087,188 @@ app = Flask(__name__)
 
 @app.route("/")
 def home():
+    startup.finish("first_response")
     with state_lock:
         s = load_state()
     return f"Grid Trader running | AUTO_MODE={s.get('auto_mode')} TEST_MODE={s.get('test_mode')}"
 
+def request_bot():
+    bot, _ = pick_bot(["", request.args.get("symbol", SYMBOL)])
+    return bot
+
+# 변경이 없으면 ETag(심볼+version+쿼리 해시)로 304. 파라미터가 없으면 version별로 캐시된 전체 스냅샷 그대로
 @app.route("/status")
 def status():
-    with state_lock:
-        s = load_state()
-    return jsonify(s)
+    bot = request_bot()
+    etag = ipc.status_etag(bot.symbol, bot.store.version, request.args)
+    if etag in request.if_none_match:
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+    if any(k in request.args for k in ipc.STATUS_PARAMS):
+        with bot.store.lock:
+            version = bot.store.version
+            payload = ipc.status_view(bot.state, version, bot.symbol, bot.changes, request.args)
+    else:
+        version, payload = bot.store.dumps()
+    resp = Response(payload, mimetype="application/json")
+    resp.set_etag(ipc.status_etag(bot.symbol, version, request.args))
+    return resp
+
+@app.route("/symbols")
+def symbols():
+    out = {}
+    for sym, bot in bots.items():
+        with bot.store.lock:
+            bs = bot.state
+            out[sym] = {"krw": bs.get("krw"), "base": bs.get("btc"), "strategy": bs.get("strategy"),
+                        "grids": len(bs.get("grid_orders", {})), "version": bot.store.version}
+    return jsonify(out)
+
+@app.route("/specs")
+def specs():
+    sym = request_bot().symbol
+    return jsonify({"symbol": sym, "specs": spec_registry.get(sym), "cache": spec_registry.stats()})
+
+def tick_all():
+    quotes = get_quotes(SYMBOLS)
+    for sym, bot in bots.items():
+        run_grid_once(bot, quotes.get(sym))
+    return {"ok": True, "ts": datetime.utcnow().isoformat()}
 
 @app.route("/tick")
 def tick():
-    run_grid_once()
-    return jsonify({"ok": True, "ts": datetime.utcnow().isoformat()})
+    return jsonify(tick_all())
+
+@app.route("/metrics")
+def metrics():
+    return Response(metrics_text(), mimetype="text/plain; version=0.0.4")
+
+# 손익/체결 이력은 원장(SQLite)의 집계 테이블과 인덱스로만 조회. 미실현은 마지막 틱 시세 기준
+@app.route("/pnl")
+def pnl():
+    bot = request_bot()
+    t0 = time.perf_counter()
+    out = ledger.pnl_view(trade_ledger, bot.symbol, bot.last_quote[0] if bot.last_quote else None, request.args)
+    LEDGER_SECONDS.observe(time.perf_counter() - t0, "pnl")
+    return jsonify(out)
+
+@app.route("/fills")
+def fills():
+    bot = request_bot()
+    t0 = time.perf_counter()
+    out = ledger.fills_view(trade_ledger, bot.symbol, request.args)
+    LEDGER_SECONDS.observe(time.perf_counter() - t0, "fills")
+    return jsonify(out)
+
+@app.route("/stream")
+def stream():
+    kinds = set(request.args["events"].split(",")) if request.args.get("events") else None
+    sym = request.args.get("symbol")
+    sub = bus.subscribe(kinds, request_bot().symbol if sym else None)
+    return Response(bus.stream(sub), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/price")
 def price():
-    p = get_price(SYMBOL)
-    return jsonify({"price": p, "symbol": SYMBOL})
+    sym = request_bot().symbol
+    return jsonify({"price": get_price(sym), "symbol": sym})
 
 def run_web():
     app.run(host="0.0.0.0", port=PORT)
 
+# ---------- Engine process (RUN_MODE=engine/split) ----------
+# API 프로세스(api.py)는 이 프로세스를 import하지 않고 스냅샷 파일만 읽는다. 텔레그램/뉴스/주문은 엔진에만 있음
+def engine_meta():
+    out = {"pid": os.getpid(), "ts": time.time(), "primary": SYMBOL, "symbols": {}}
+    with state_lock:
+        s = load_state()
+        out["auto_mode"], out["test_mode"] = s.get("auto_mode"), s.get("test_mode")
+    with spec_registry.lock:
+        specs = {sym: spec_registry.specs.get(sym) for sym in bots}
+    for sym, bot in bots.items():
+        with bot.store.lock:
+            bs = bot.state
+            out["symbols"][sym] = {"base": bot.base, "version": bot.store.version, "quote": bot.last_quote,
+                                   "krw": bs.get("krw"), "btc": bs.get("btc"), "strategy": bs.get("strategy"),
+                                   "grids": len(bs.get("grid_orders", {})), "changes": bot.changes.to_dict(),
+                                   "specs": specs[sym]}
+    out["spec_cache"] = spec_registry.stats()
+    out["metrics"] = metrics_text()
+    return out
+
+class SnapshotPublisher:
+    def __init__(self, root=ipc.SNAPSHOT_DIR, interval=SNAPSHOT_INTERVAL):
+        self.interval = interval
+        self.writers = {sym: ipc.SnapshotWriter(ipc.snapshot_path(sym, root)) for sym in bots}
+        self.meta = ipc.SnapshotWriter(ipc.snapshot_path("_engine", root))
+        self.events = ipc.SnapshotWriter(ipc.snapshot_path("_events", root))
+        self.published = {}
+        self.last_event = None
+        bus.history = deque(maxlen=EVENT_HISTORY)
+
+    def publish_once(self):
+        for sym, bot in bots.items():
+            if self.published.get(sym) != bot.store.version:
+                version, payload = bot.store.dumps()
+                self.writers[sym].publish(payload.encode(), version)
+                self.published[sym] = version
+        self.meta.publish(json.dumps(engine_meta(), default=str).encode())
+        events = bus.recent()
+        last = events[-1][0] if events else 0
+        if last != self.last_event:
+            self.events.publish(json.dumps({"pid": os.getpid(), "events": events}).encode(), last)
+            self.last_event = last
+
+    def run(self):
+        while True:
+            try:
+                self.publish_once()
+            except Exception as e:
+                logger.exception(f"snapshot publish err: {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        self.publish_once()
+        Thread(target=self.run, daemon=True, name="snapshots").start()
+
+def engine_flush():
+    for bot in bots.values():
+        bot.store.flush()
+    return {"ok": True}
+
+ENGINE_COMMANDS = {
+    "ping": lambda: {"pid": os.getpid(), "symbols": SYMBOLS},
+    "tick": tick_all,
+    "flush": engine_flush,
+}
+
+api_server = None
+
+def spawn_api_server():
+    global api_server
+    cmd = ["gunicorn", "wsgi:app", "--bind", f"0.0.0.0:{PORT}", "--workers", str(WEB_WORKERS),
+           "--worker-class", "gthread", "--threads", str(WEB_THREADS)]
+    proc = api_server = subprocess.Popen(cmd, env={**os.environ, "RUN_MODE": "api"})
+    atexit.register(stop_api_server)
+    # SIGTERM 기본 동작은 atexit를 건너뛰므로 gunicorn이 고아로 남지 않게 정상 종료로 바꾼다 (종료 중 재수신은 무시)
+    def on_term(*_):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, on_term)
+    return proc
+
+# os._exit(/stop)는 atexit를 건너뛰므로 거기서도 직접 부른다: 안 그러면 gunicorn이 멈춘 스냅샷을 계속 서빙
+def stop_api_server(timeout=5):
+    proc = api_server
+    if proc is None or proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
 # ---------- Keep-alive (optional) ----------
 def keep_alive():
     url = os.getenv("PUBLIC_URL")
@@ -671,7 +2282,18 @@ def keep_alive():
         time.sleep(240)
 
 # ---------- Boot ----------
+startup.mark("module")
+
 if __name__ == "__main__":
+    if not SIMULATION and store.data.get("test_mode", True):
+        logger.warning("SIMULATION=false: 테스트 모드를 끄고 실시세로 시작합니다")
+        store.record("mode_toggled", fields={"test_mode": False})
+    for bot in bots.values():
+        bot.store.start()
+    spec_registry.start(SYMBOLS)
+    if stream_feed is not None:
+        stream_feed.start()
+
     if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
         Thread(target=telegram_poll, daemon=True).start()
         logger.info("Telegram poll started")
@@ -681,9 +2303,22 @@ if __name__ == "__main__":
     Thread(target=news_loop, daemon=True).start()
     logger.info("News loop thread started")
 
-    Thread(target=run_web, daemon=True).start()
-    logger.info(f"Flask running on :{PORT}")
+    if RUN_MODE in ("engine", "split"):
+        SnapshotPublisher().start()
+        try:
+            ipc.CommandServer(ENGINE_COMMANDS).start()
+        except RuntimeError as e:
+            logger.error(f"엔진 명령 소켓을 열 수 없습니다: {e}")
+            sys.exit(1)
+        logger.info(f"Engine snapshots -> {ipc.SNAPSHOT_DIR} | commands on {ipc.ENGINE_ADDRESS}")
+    if RUN_MODE == "split":
+        spawn_api_server()
+        logger.info(f"gunicorn wsgi:app on :{PORT} ({WEB_WORKERS}x{WEB_THREADS})")
+    elif RUN_MODE == "all":
+        Thread(target=run_web, daemon=True).start()
+        logger.info(f"Flask running on :{PORT}")
 
     Thread(target=keep_alive, daemon=True).start()
+    startup.mark("boot")
 
     loop_runner()
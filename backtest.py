@@ -0,0 +1,336 @@
+import os, sys, csv, json, time, argparse
+from bisect import bisect_left, insort
+from datetime import datetime
+import numpy as np
+
+import gridcore
+
+# 오프라인 백테스트: 봇과 같은 gridcore 그리드 생성/주문 검증/슬리피지 규칙을 그대로 쓰고, 체결 탐지만 NumPy로 일괄 처리
+# 사용: python backtest.py btc_1m.csv --strategy middle
+#       python backtest.py ticks.csv --low 68000000 --high 72000000 --n-grids 40 --interval 5 --out result/
+#       python backtest.py btc_1m.csv --strategy middle --fill-model book   (fillsim 호가창: 부분체결/큐/maker·taker/지연)
+
+DEFAULT_FEE = float(os.getenv("BACKTEST_FEE", 0.0005))
+
+# 기본은 거래소 미접속(호가 단위 표 + 기본 최소주문). --live-specs면 시작할 때 한 번 load_markets
+spec_registry = gridcore.MarketSpecRegistry()
+
+def _parse_ts(values):
+    try:
+        ts = np.asarray(values, dtype=float)
+    except ValueError:
+        ts = np.array([datetime.fromisoformat(v.replace("Z", "+00:00")).timestamp() for v in values])
+    if len(ts) and ts[0] > 1e11:
+        ts = ts / 1000.0
+    return ts
+
+def load_prices(path):
+    with open(path, newline="") as f:
+        header = [h.strip().lower() for h in f.readline().split(",")]
+        try:
+            arr = np.loadtxt(f, delimiter=",", ndmin=2)
+            cols = dict(zip(header, arr.T))
+        except ValueError:
+            f.seek(0)
+            next(f)
+            cols = dict(zip(header, (np.array(c) for c in zip(*csv.reader(f)))))
+    tcol = next(c for c in ("timestamp", "ts", "time") if c in cols)
+    ts = _parse_ts(cols[tcol])
+    if "high" in cols and "low" in cols:
+        out = {"ts": ts, "low": cols["low"].astype(float), "high": cols["high"].astype(float),
+               "close": cols["close"].astype(float), "kind": "ohlcv"}
+        if "volume" in cols:
+            out["volume"] = cols["volume"].astype(float)
+        return out
+    price = cols["price" if "price" in cols else "close"].astype(float)
+    return {"ts": ts, "low": price, "high": price, "close": price, "kind": "tick"}
+
+def resample_ticks(prices, interval, stream=False):
+    # REST 폴링은 interval마다 한 점만 보고, stream 모드는 구간 고가/저가까지 본다 (app.py get_price_range와 동일)
+    ts, close = prices["ts"], prices["close"]
+    bucket = np.floor((ts - ts[0]) / interval).astype(np.int64)
+    last = np.flatnonzero(np.r_[bucket[1:] != bucket[:-1], True])
+    out = {"ts": ts[last], "close": close[last], "kind": prices["kind"]}
+    if stream:
+        first = np.r_[0, last[:-1] + 1]
+        out["low"] = np.minimum.reduceat(prices["low"], first)
+        out["high"] = np.maximum.reduceat(prices["high"], first)
+    else:
+        out["low"] = out["high"] = out["close"]
+    return out
+
+def build_levels(symbol, low, high, n_grids, padding, mode, total_krw):
+    # 라이브와 같이 validate_ladder로 정규화된 가격에서 트리거/체결, 주문 불가 레벨은 라이브처럼 빼고 나머지로 진행
+    grids = gridcore.make_grid_orders(low, high, n_grids, padding, mode, total_krw)
+    checked, rejects = gridcore.validate_ladder(symbol, grids, spec_registry.get(symbol))
+    rows = []
+    for k, g in checked.items():
+        ok = k not in rejects
+        rows.append({"grid": k, "trigger_buy": g["buy_price"], "trigger_sell": g["sell_price"],
+                     "buy_px": g["buy_price"], "buy_amt": g["amount"], "sell_px": g["sell_price"], "sell_amt": g["amount"],
+                     "ok_buy": ok, "ok_sell": ok, "reject": rejects.get(k)})
+    return rows
+
+def find_fills(low, high, levels, recycle=False):
+    # 레벨별로 (저가<=매수가) / (고가>=매도가) 인덱스를 한 번에 뽑고 searchsorted로 매수→매도 사이클을 이어 붙인다.
+    fills = []
+    for li, lv in enumerate(levels):
+        if not lv["ok_buy"]:
+            continue
+        buy_hits = np.flatnonzero(low <= lv["trigger_buy"])
+        if not len(buy_hits):
+            continue
+        sell_hits = np.flatnonzero(high >= lv["trigger_sell"]) if lv["ok_sell"] else np.empty(0, dtype=np.int64)
+        t = -1
+        while True:
+            j = np.searchsorted(buy_hits, t, side="right")
+            if j >= len(buy_hits):
+                break
+            bi = int(buy_hits[j])
+            fills.append((bi, 0, lv["trigger_buy"], li, "buy"))
+            k = np.searchsorted(sell_hits, bi, side="right")
+            if k >= len(sell_hits):
+                break
+            si = int(sell_hits[k])
+            fills.append((si, 1, lv["trigger_sell"], li, "sell"))
+            if not recycle:
+                break
+            t = si
+    # 같은 봉에서는 라이브 틱과 같은 순서: 매수(낮은 가격부터) 다음 매도
+    fills.sort()
+    return fills
+
+def run_backtest(prices, low, high, n_grids, padding=0.0, mode="equal", symbol=gridcore.SYMBOL,
+                 total_krw=gridcore.TOTAL_KRW, fee=DEFAULT_FEE, slippage=gridcore.SIM_SLIPPAGE, recycle=False):
+    t0 = time.perf_counter()
+    close = prices["close"]
+    levels = build_levels(symbol, low, high, n_grids, padding, mode, total_krw)
+    raw = find_fills(prices["low"], prices["high"], levels, recycle)
+
+    krw, base = float(total_krw), 0.0
+    fees = turnover = 0.0
+    fills = []
+    skipped = 0
+    n = len(close)
+    krw_delta = np.zeros(n)
+    base_delta = np.zeros(n)
+    held = set()
+    for bi, _, _, li, side in raw:
+        lv = levels[li]
+        if side == "buy":
+            px = gridcore.sim_fill_price("buy", lv["buy_px"], slippage)
+            amt = lv["buy_amt"]
+            cost = px * amt
+            f = cost * fee
+            if krw < cost + f:
+                skipped += 1
+                continue
+            krw -= cost + f
+            base += amt
+            held.add(li)
+            krw_delta[bi] -= cost + f
+            base_delta[bi] += amt
+        else:
+            if li not in held:
+                continue
+            px = gridcore.sim_fill_price("sell", lv["sell_px"], slippage)
+            amt = lv["sell_amt"]
+            proceeds = px * amt
+            f = proceeds * fee
+            krw += proceeds - f
+            base -= amt
+            held.discard(li)
+            krw_delta[bi] += proceeds - f
+            base_delta[bi] -= amt
+        fees += f
+        turnover += px * amt
+        fills.append({"ts": float(prices["ts"][bi]), "bar": bi, "grid": lv["grid"], "side": side,
+                      "price": px, "amount": amt, "fee": f, "krw": krw, "base": base})
+
+    equity = total_krw + np.cumsum(krw_delta) + np.cumsum(base_delta) * close
+    peak = np.maximum.accumulate(equity)
+    drawdown = float(np.max((peak - equity) / peak)) if n else 0.0
+    final = float(equity[-1]) if n else float(total_krw)
+    return {
+        "summary": {
+            "symbol": symbol, "bars": n, "levels": n_grids, "low": low, "high": high, "mode": mode,
+            "fills": len(fills), "buys": sum(f["side"] == "buy" for f in fills), "sells": sum(f["side"] == "sell" for f in fills),
+            "rejected_levels": sum(1 for lv in levels if lv["reject"]), "cash_skipped": skipped,
+            "fees": fees, "turnover": turnover, "final_equity": final,
+            "pnl": final - total_krw, "pnl_pct": (final - total_krw) / total_krw * 100, "max_drawdown_pct": drawdown * 100,
+            "open_base": base, "elapsed_sec": time.perf_counter() - t0,
+        },
+        "fills": fills,
+        "equity": equity,
+        "rejects": [(lv["grid"], lv["reject"]) for lv in levels if lv["reject"]],
+    }
+
+def _bar_prints(prices):
+    # 봉 하나를 체결 틱 몇 개로 펼친다: 상승 봉은 저가→고가→종가, 하락 봉은 고가→저가→종가
+    low, high, close = prices["low"], prices["high"], prices["close"]
+    if prices["kind"] == "tick" and np.array_equal(low, high):
+        return close[:, None]
+    prev = np.r_[close[0], close[:-1]]
+    up = close >= prev
+    return np.column_stack([np.where(up, low, high), np.where(up, high, low), close])
+
+def run_book_backtest(prices, low, high, n_grids, padding=0.0, mode="equal", symbol=gridcore.SYMBOL,
+                      total_krw=gridcore.TOTAL_KRW, recycle=False, sim=None):
+    import fillsim
+    t0 = time.perf_counter()
+    ts, close = prices["ts"], prices["close"]
+    n = len(close)
+    levels = build_levels(symbol, low, high, n_grids, padding, mode, total_krw)
+    if sim is None:
+        quote = symbol.split("/")[1]
+        sim = fillsim.FillSim(tick_fn=(lambda p: gridcore.tick_size(quote, p)) if quote in gridcore.TICK_TABLES else fillsim.relative_tick)
+    prints = _bar_prints(prices)
+    spacing = float(np.median(np.diff(ts))) if n > 1 else 1.0
+    offsets = (spacing / prints.shape[1] * np.arange(prints.shape[1])).tolist()
+    volume = prices.get("volume")
+    qty_per_print = (volume / prints.shape[1]).tolist() if volume is not None else None
+
+    waiting = sorted((lv["buy_px"], li) for li, lv in enumerate(levels) if lv["ok_buy"])
+    owner = {}
+    krw, base, reserved = float(total_krw), 0.0, 0.0
+    fees = turnover = 0.0
+    counts = {"maker": 0, "taker": 0, "partial": 0}
+    fills = []
+    krw_delta = np.zeros(n)
+    base_delta = np.zeros(n)
+    rows = prints.tolist()
+    for i in range(n):
+        ref = float(close[i - 1]) if i else float(close[0])
+        k = bisect_left(waiting, (ref, -1))
+        posted = 0
+        for buy_px, li in waiting[:k]:
+            lv = levels[li]
+            cost = buy_px * lv["buy_amt"]
+            if krw - reserved < cost:
+                break
+            reserved += cost
+            owner[sim.submit(float(ts[i]), "buy", buy_px, lv["buy_amt"])] = li
+            posted += 1
+        del waiting[:posted]
+        qty = qty_per_print[i] if qty_per_print else None
+        for j, px in enumerate(rows[i]):
+            for oid, fts, side, fpx, fqty, fee, liq in sim.on_trade(float(ts[i]) + offsets[j], px, qty):
+                li = owner[oid]
+                lv = levels[li]
+                o = sim.orders[oid]
+                counts[liq] += 1
+                if o.status == fillsim.OPEN:
+                    counts["partial"] += 1
+                if side == "buy":
+                    reserved -= o.price * fqty
+                    krw -= fpx * fqty + fee
+                    base += fqty
+                    krw_delta[i] -= fpx * fqty + fee
+                    base_delta[i] += fqty
+                    if o.status == fillsim.CLOSED:
+                        owner[sim.submit(fts, "sell", lv["sell_px"], o.filled)] = li
+                else:
+                    krw += fpx * fqty - fee
+                    base -= fqty
+                    krw_delta[i] += fpx * fqty - fee
+                    base_delta[i] -= fqty
+                    if o.status == fillsim.CLOSED and recycle:
+                        insort(waiting, (lv["buy_px"], li))
+                fees += fee
+                turnover += fpx * fqty
+                fills.append({"ts": fts, "bar": i, "grid": lv["grid"], "side": side, "price": fpx, "amount": fqty,
+                              "fee": fee, "krw": krw, "base": base})
+
+    equity = total_krw + np.cumsum(krw_delta) + np.cumsum(base_delta) * close
+    peak = np.maximum.accumulate(equity)
+    drawdown = float(np.max((peak - equity) / peak)) if n else 0.0
+    final = float(equity[-1]) if n else float(total_krw)
+    return {
+        "summary": {
+            "symbol": symbol, "bars": n, "levels": n_grids, "low": low, "high": high, "mode": mode, "fill_model": "book",
+            "fills": len(fills), "buys": sum(f["side"] == "buy" for f in fills), "sells": sum(f["side"] == "sell" for f in fills),
+            "maker_fills": counts["maker"], "taker_fills": counts["taker"], "partial_fills": counts["partial"],
+            "rejected_levels": sum(1 for lv in levels if lv["reject"]), "sim_events": sim.events,
+            "fees": fees, "turnover": turnover, "final_equity": final,
+            "pnl": final - total_krw, "pnl_pct": (final - total_krw) / total_krw * 100, "max_drawdown_pct": drawdown * 100,
+            "open_base": base, "elapsed_sec": time.perf_counter() - t0,
+        },
+        "fills": fills,
+        "equity": equity,
+        "rejects": [(lv["grid"], lv["reject"]) for lv in levels if lv["reject"]],
+    }
+
+def resolve_params(args, start_price):
+    if args.strategy:
+        cfg = {}
+        if gridcore.apply_strategy_profile(cfg, start_price, args.strategy) is None:
+            raise SystemExit(f"unknown strategy: {args.strategy} (choose from {', '.join(gridcore.STRATEGY_PROFILES)})")
+        return cfg["price_low"], cfg["price_high"], cfg["n_grids"], cfg["price_padding"], cfg["check_interval"], cfg["grid_mode"]
+    low = args.low or (float(gridcore.PRICE_LOW) if gridcore.PRICE_LOW else start_price * 0.98)
+    high = args.high or (float(gridcore.PRICE_HIGH) if gridcore.PRICE_HIGH else start_price * 1.02)
+    return low, high, args.n_grids, args.padding, args.interval, args.mode
+
+def write_outputs(result, ts, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump({**result["summary"], "rejects": result["rejects"]}, f, indent=2)
+    with open(os.path.join(out_dir, "fills.csv"), "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=["ts", "bar", "grid", "side", "price", "amount", "fee", "krw", "base"])
+        w.writeheader()
+        w.writerows(result["fills"])
+    np.savetxt(os.path.join(out_dir, "equity.csv"), np.column_stack([ts, result["equity"]]),
+               delimiter=",", header="ts,equity", comments="", fmt=["%.3f", "%.2f"])
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Backtest the grid strategy on OHLCV or tick CSV data")
+    ap.add_argument("data", help="CSV with timestamp,open,high,low,close[,volume] or ts,price columns")
+    ap.add_argument("--symbol", default=gridcore.SYMBOL)
+    ap.add_argument("--strategy", help="use a STRATEGY_PROFILES preset centred on the first price")
+    ap.add_argument("--low", type=float)
+    ap.add_argument("--high", type=float)
+    ap.add_argument("--n-grids", type=int, default=gridcore.N_GRIDS)
+    ap.add_argument("--padding", type=float, default=gridcore.PRICE_PADDING)
+    ap.add_argument("--mode", default=gridcore.GRID_MODE, choices=["equal", "geometric"])
+    ap.add_argument("--interval", type=float, default=gridcore.CHECK_INTERVAL, help="tick data only: seconds between price checks")
+    ap.add_argument("--stream", action="store_true", help="tick data only: use the interval high/low like PRICE_FEED=stream")
+    ap.add_argument("--total-krw", type=float, default=gridcore.TOTAL_KRW)
+    ap.add_argument("--fee", type=float, default=DEFAULT_FEE)
+    ap.add_argument("--slippage", type=float, default=gridcore.SIM_SLIPPAGE)
+    ap.add_argument("--recycle", action="store_true", help="return sold levels to idle (live grids stay sold)")
+    ap.add_argument("--fill-model", default="fixed", choices=["fixed", "book"],
+                    help="fixed: fill at the level price with --slippage; book: fillsim order book with queue, partial fills and latency")
+    ap.add_argument("--maker-fee", type=float, help="book model only (default SIM_MAKER_FEE)")
+    ap.add_argument("--taker-fee", type=float, help="book model only (default SIM_TAKER_FEE)")
+    ap.add_argument("--latency", type=float, help="book model only: order latency in seconds (default SIM_LATENCY)")
+    ap.add_argument("--trade-qty", type=float, help="book model only: traded size per print when the data has no volume")
+    ap.add_argument("--live-specs", action="store_true", help="load market specs from the exchange for validate_ladder")
+    ap.add_argument("--out", help="directory for summary.json, fills.csv and equity.csv")
+    args = ap.parse_args(argv)
+
+    if args.live_specs:
+        spec_registry.exchange_factory = gridcore.make_exchange
+        spec_registry.preload([args.symbol])
+    prices = load_prices(args.data)
+    low, high, n_grids, padding, interval, mode = resolve_params(args, float(prices["close"][0]))
+    if prices["kind"] == "tick" and interval:
+        prices = resample_ticks(prices, interval, args.stream)
+
+    if args.fill_model == "book":
+        import fillsim
+        quote = args.symbol.split("/")[1]
+        opts = {k: v for k, v in (("maker_fee", args.maker_fee), ("taker_fee", args.taker_fee),
+                                  ("latency", args.latency), ("trade_qty", args.trade_qty)) if v is not None}
+        sim = fillsim.FillSim(tick_fn=(lambda p: gridcore.tick_size(quote, p)) if quote in gridcore.TICK_TABLES else fillsim.relative_tick, **opts)
+        result = run_book_backtest(prices, low, high, n_grids, padding, mode, args.symbol, args.total_krw, args.recycle, sim)
+    else:
+        result = run_backtest(prices, low, high, n_grids, padding, mode, args.symbol,
+                              args.total_krw, args.fee, args.slippage, args.recycle)
+    for k, v in result["summary"].items():
+        print(f"{k:>18}: {v:,.4f}" if isinstance(v, float) else f"{k:>18}: {v}")
+    for grid, msg in result["rejects"]:
+        print(f"  grid #{grid} rejected: {msg}", file=sys.stderr)
+    if args.out:
+        write_outputs(result, prices["ts"], args.out)
+
+if __name__ == "__main__":
+    main()
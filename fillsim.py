@@ -0,0 +1,243 @@
+import os, sys, time, heapq, random, argparse, itertools
+from bisect import bisect_left, bisect_right, insort
+import numpy as np
+
+# 지정가 체결 시뮬레이터: 배열 기반 L2 호가창 + 큐 위치 + 부분체결 + maker/taker 수수료 + 주문 지연
+# 라이브 시뮬레이션(SIM_ENGINE=book → mock_exchange)과 오프라인 재생(backtest.py --fill-model book)이 같이 쓴다
+# 부하 측정: python fillsim.py --events 3000000 --orders 40
+
+MAKER_FEE = float(os.getenv("SIM_MAKER_FEE", 0.0005))
+TAKER_FEE = float(os.getenv("SIM_TAKER_FEE", 0.0005))
+SIM_LATENCY = float(os.getenv("SIM_LATENCY", 0.05))
+BOOK_DEPTH = int(os.getenv("SIM_BOOK_DEPTH", 20))
+LEVEL_QTY = float(os.getenv("SIM_LEVEL_QTY", 0.5))
+TRADE_QTY = float(os.getenv("SIM_TRADE_QTY", 0.05))
+
+OPEN, CLOSED, CANCELED = "open", "closed", "canceled"
+
+def relative_tick(price):
+    return 10.0 ** np.floor(np.log10(max(price, 1e-12) * 1e-4))
+
+# 호가 단계별 가격/잔량을 고정 길이 배열로 보관. 합성(mid 기준) 또는 기록된 스냅샷(set)
+class L2Book:
+    def __init__(self, depth=BOOK_DEPTH, level_qty=LEVEL_QTY, tick_fn=relative_tick):
+        self.depth = depth
+        self.tick_fn = tick_fn
+        self.shape = level_qty * (1.0 + 0.5 * np.arange(depth))
+        self.steps = np.arange(depth, dtype=float)
+        self.bid_px = np.zeros(depth)
+        self.bid_qty = np.zeros(depth)
+        self.ask_px = np.zeros(depth)
+        self.ask_qty = np.zeros(depth)
+        self.mid = None
+
+    def synth(self, price):
+        tick = self.tick_fn(price)
+        best_bid = np.floor(price / tick + 1e-9) * tick
+        self.bid_px[:] = best_bid - self.steps * tick
+        self.ask_px[:] = best_bid + tick + self.steps * tick
+        self.bid_qty[:] = self.shape
+        self.ask_qty[:] = self.shape
+        self.mid = price
+
+    def set(self, bid_px, bid_qty, ask_px, ask_qty):
+        n, m = min(len(bid_px), self.depth), min(len(ask_px), self.depth)
+        self.bid_px[:] = -np.inf
+        self.ask_px[:] = np.inf
+        self.bid_qty[:] = self.ask_qty[:] = 0.0
+        self.bid_px[:n], self.bid_qty[:n] = bid_px[:n], bid_qty[:n]
+        self.ask_px[:m], self.ask_qty[:m] = ask_px[:m], ask_qty[:m]
+        self.mid = (self.bid_px[0] + self.ask_px[0]) / 2
+
+    def resting_qty(self, side, price):
+        if side == "buy":
+            i = np.searchsorted(-self.bid_px, -price)
+            return float(self.bid_qty[i]) if i < self.depth and self.bid_px[i] == price else 0.0
+        i = np.searchsorted(self.ask_px, price)
+        return float(self.ask_qty[i]) if i < self.depth and self.ask_px[i] == price else 0.0
+
+    # 반대편 호가를 limit까지 소진하며 체결: (수량, 금액)
+    def take(self, side, limit, qty):
+        if side == "buy":
+            px, book = self.ask_px, self.ask_qty
+            n = int(np.searchsorted(px, limit, side="right"))
+        else:
+            px, book = self.bid_px, self.bid_qty
+            n = int(np.searchsorted(-px, -limit, side="right"))
+        if n == 0:
+            return 0.0, 0.0
+        cum = np.cumsum(book[:n])
+        k = int(np.searchsorted(cum, qty))
+        if k >= n:
+            filled = float(cum[-1])
+            cost = float(px[:n] @ book[:n])
+            book[:n] = 0.0
+        else:
+            prev = float(cum[k - 1]) if k else 0.0
+            filled = qty
+            cost = float(px[:k] @ book[:k]) + (qty - prev) * float(px[k])
+            book[:k] = 0.0
+            book[k] -= qty - prev
+        return filled, cost
+
+class SimOrder:
+    __slots__ = ("id", "side", "price", "amount", "remaining", "queue", "filled", "cost", "fee", "status", "active_at", "ts")
+
+    def __init__(self, oid, side, price, amount, ts, active_at):
+        self.id, self.side, self.price, self.amount = oid, side, float(price), float(amount)
+        self.remaining = float(amount)
+        self.queue = 0.0
+        self.filled = self.cost = self.fee = 0.0
+        self.status = OPEN
+        self.ts, self.active_at = ts, active_at
+
+    @property
+    def average(self):
+        return self.cost / self.filled if self.filled else None
+
+class FillSim:
+    def __init__(self, maker_fee=MAKER_FEE, taker_fee=TAKER_FEE, latency=SIM_LATENCY, depth=BOOK_DEPTH,
+                 level_qty=LEVEL_QTY, trade_qty=TRADE_QTY, tick_fn=relative_tick):
+        self.maker_fee, self.taker_fee, self.latency = maker_fee, taker_fee, latency
+        self.trade_qty = trade_qty
+        self.book = L2Book(depth, level_qty, tick_fn)
+        self.recorded = False
+        self.orders = {}
+        self.pending = []
+        self.buys = []
+        self.sells = []
+        self.last = None
+        self.events = 0
+        self._ids = itertools.count(1)
+
+    def submit(self, ts, side, price, amount):
+        o = SimOrder(next(self._ids), side, price, amount, ts, ts + self.latency)
+        self.orders[o.id] = o
+        heapq.heappush(self.pending, (o.active_at, o.id))
+        return o.id
+
+    def cancel(self, oid):
+        o = self.orders.get(oid)
+        if o is None or o.status != OPEN:
+            return False
+        o.status = CANCELED
+        book = self.buys if o.side == "buy" else self.sells
+        i = bisect_left(book, (o.price, o.id))
+        if i < len(book) and book[i][1] == oid:
+            del book[i]
+        return True
+
+    def on_book(self, ts, bid_px, bid_qty, ask_px, ask_qty):
+        self.recorded = True
+        self.book.set(bid_px, bid_qty, ask_px, ask_qty)
+        fills = []
+        self._activate(ts, fills)
+        return fills
+
+    # 체결 틱 하나: 지연이 끝난 주문을 현재 호가창에 넣고(taker 소진 후 잔량은 큐 맨 뒤), 이 틱 거래량으로 대기 주문을 체결
+    def on_trade(self, ts, price, qty=None):
+        self.events += 1
+        fills = []
+        if self.pending and self.pending[0][0] <= ts:
+            if not self.recorded and self.book.mid != self.last and self.last is not None:
+                self.book.synth(self.last)
+            self._activate(ts, fills)
+        self._trade(ts, float(price), self.trade_qty if qty is None else qty, fills)
+        self.last = price
+        return fills
+
+    def _activate(self, ts, fills):
+        while self.pending and self.pending[0][0] <= ts:
+            _, oid = heapq.heappop(self.pending)
+            o = self.orders[oid]
+            if o.status != OPEN:
+                continue
+            if self.book.mid is None:
+                if self.last is None:
+                    heapq.heappush(self.pending, (ts, oid))
+                    return
+                self.book.synth(self.last)
+            filled, cost = self.book.take(o.side, o.price, o.remaining)
+            if filled > 0:
+                self._fill(o, ts, filled, cost, self.taker_fee, "taker", fills)
+            if o.status == OPEN:
+                o.queue = self.book.resting_qty(o.side, o.price)
+                insort(self.buys if o.side == "buy" else self.sells, (o.price, o.id))
+
+    def _trade(self, ts, price, qty, fills):
+        # 가격이 주문가를 관통하면 전량 maker 체결, 같은 가격이면 앞선 대기 물량을 먼저 소진
+        if self.buys and self.buys[-1][0] >= price:
+            i = bisect_left(self.buys, (price, -1))
+            j = bisect_right(self.buys, (price, float("inf")))
+            for _, oid in self.buys[j:]:
+                o = self.orders[oid]
+                self._fill(o, ts, o.remaining, o.remaining * o.price, self.maker_fee, "maker", fills)
+            qty = self._queue(self.buys[i:j], ts, qty, fills)
+            self.buys = self.buys[:i] + [e for e in self.buys[i:j] if self.orders[e[1]].status == OPEN]
+        if self.sells and self.sells[0][0] <= price:
+            i = bisect_left(self.sells, (price, -1))
+            j = bisect_right(self.sells, (price, float("inf")))
+            for _, oid in self.sells[:i]:
+                o = self.orders[oid]
+                self._fill(o, ts, o.remaining, o.remaining * o.price, self.maker_fee, "maker", fills)
+            self._queue(self.sells[i:j], ts, qty, fills)
+            self.sells = [e for e in self.sells[i:j] if self.orders[e[1]].status == OPEN] + self.sells[j:]
+
+    def _queue(self, entries, ts, qty, fills):
+        for _, oid in entries:
+            o = self.orders[oid]
+            if qty <= o.queue:
+                o.queue -= qty
+                return 0.0
+            qty -= o.queue
+            o.queue = 0.0
+            take = min(qty, o.remaining)
+            self._fill(o, ts, take, take * o.price, self.maker_fee, "maker", fills)
+            qty -= take
+            if qty <= 0:
+                return 0.0
+        return qty
+
+    def _fill(self, o, ts, qty, cost, fee_rate, liquidity, fills):
+        fee = cost * fee_rate
+        o.filled += qty
+        o.cost += cost
+        o.fee += fee
+        o.remaining -= qty
+        if o.remaining <= o.amount * 1e-9:
+            o.remaining = 0.0
+            o.status = CLOSED
+        fills.append((o.id, ts, o.side, cost / qty, qty, fee, liquidity))
+
+def stress(events, n_orders, seed=7):
+    rnd = random.Random(seed)
+    sim = FillSim(latency=0.0)
+    price = 70_000_000.0
+    step = 1000.0
+    levels = [price + (i - n_orders // 2) * 20 * step for i in range(n_orders)]
+    for px in levels:
+        sim.submit(0.0, "buy" if px < price else "sell", px, 0.001)
+    walk = np.cumsum(np.random.default_rng(seed).choice([-step, 0.0, step], size=events)) + price
+    fills = 0
+    t0 = time.perf_counter()
+    for i, px in enumerate(walk.tolist()):
+        for oid, ts, side, fpx, qty, fee, liq in sim.on_trade(float(i), px, rnd.random() * 0.1):
+            o = sim.orders[oid]
+            fills += 1
+            if o.status == CLOSED:
+                back = o.price + 20 * step if side == "buy" else o.price - 20 * step
+                sim.submit(float(i), "sell" if side == "buy" else "buy", back, o.amount)
+    elapsed = time.perf_counter() - t0
+    return {"events": events, "fills": fills, "elapsed_sec": elapsed, "events_per_min": events / elapsed * 60}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Stress the order-book fill simulator with a random walk")
+    ap.add_argument("--events", type=int, default=1_000_000)
+    ap.add_argument("--orders", type=int, default=40)
+    args = ap.parse_args(argv)
+    res = stress(args.events, args.orders)
+    for k, v in res.items():
+        print(f"{k:>15}: {v:,.2f}" if isinstance(v, float) else f"{k:>15}: {v:,}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import os, json, time, logging, threading
+from bisect import bisect_right
+from threading import Thread
+
+# 그리드 계산 / 호가 단위·최소주문 검증 / 마켓 스펙 캐시 / 전략 프리셋. 상태 파일·원장·로그 파일을 건드리지 않는 규칙만 모았다
+# app.py(봇)와 backtest.py·sweep.py(오프라인)가 같은 규칙을 쓰도록 공유. import해도 파일에 쓰거나 거래소에 접속하지 않는다
+# numpy(~45ms)는 일괄 검증 함수 안에서 import: 봇 기동 경로에서 빠지고 첫 래더 생성 때 한 번 로드된다
+
+# ---------- Config ----------
+EXCHANGE_ID = os.getenv("EXCHANGE", "upbit")
+API_KEY = os.getenv("API_KEY", "")
+API_SECRET = os.getenv("API_SECRET", "")
+SYMBOL = os.getenv("SYMBOL", "BTC/KRW")
+TOTAL_KRW = float(os.getenv("TOTAL_KRW", 200000))
+N_GRIDS = int(os.getenv("N_GRIDS", 20))
+PRICE_LOW = os.getenv("PRICE_LOW")
+PRICE_HIGH = os.getenv("PRICE_HIGH")
+GRID_MODE = os.getenv("GRID_MODE", "equal")
+STRATEGY_PROFILES_FILE = os.getenv("STRATEGY_PROFILES_FILE", "strategy_profiles.json")
+PRICE_PADDING = float(os.getenv("PRICE_PADDING", 0.0))
+CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", 5))
+SIM_SLIPPAGE = float(os.getenv("SIM_SLIPPAGE", 0.003))
+MARKET_SPEC_TTL = float(os.getenv("MARKET_SPEC_TTL", 3600))
+MARKET_SPEC_RETRY = float(os.getenv("MARKET_SPEC_RETRY", 60))
+
+# 핸들러는 app.py가 붙인다 (오프라인 도구에서는 경고만 stderr로)
+logger = logging.getLogger("grid_trader")
+
+# ---------- Exchange ----------
+def make_exchange():
+    if EXCHANGE_ID == "mock":
+        import mock_exchange
+        return mock_exchange.shared()
+    import ccxt
+    ex_class = getattr(ccxt, EXCHANGE_ID)
+    cfg = {"apiKey": API_KEY, "secret": API_SECRET, "enableRateLimit": True}
+    proxy = os.getenv("HTTPS_PROXY") or os.getenv("HTTP_PROXY")
+    if proxy:
+        cfg["proxies"] = {"http": proxy, "https": proxy}
+    return ex_class(cfg)
+
+# ---------- Grid ----------
+def frange(start, stop, n):
+    if n <= 1:
+        return [start]
+    step = (stop - start) / float(n - 1)
+    return [start + i * step for i in range(n)]
+
+def build_grid(price_low, price_high, n_grids, mode='equal'):
+    if mode == 'equal':
+        return frange(price_low, price_high, n_grids + 1)
+    ratios = [i / n_grids for i in range(n_grids + 1)]
+    return [price_low * (price_high / price_low) ** r for r in ratios]
+
+def make_grid_orders(price_low, price_high, n_grids, padding=0.0, mode='equal', total_krw=TOTAL_KRW):
+    levels = build_grid(price_low, price_high, n_grids, mode)
+    order_krw = total_krw / n_grids
+    grids = {}
+    for i in range(n_grids):
+        buy_price = levels[i] + padding
+        sell_price = levels[i + 1] - padding
+        amount = round(order_krw / max(buy_price, 1), 8)
+        grids[str(i)] = {"buy_price": buy_price, "sell_price": sell_price, "amount": amount, "status": "idle"}
+    return grids
+
+def sim_fill_price(side, price, slippage=SIM_SLIPPAGE):
+    return price * (1 + slippage if side == "sell" else 1 - slippage)
+
+# --- [VALIDATION] Tick/Min rules for Upbit ------------------------------------
+# 호가 단위 표: (가격 하한, tick) 오름차순. 가격이 속한 구간은 bisect로 찾는다
+TICK_TABLES = {
+    "KRW": ((0, 0.00000001), (0.00001, 0.0000001), (0.0001, 0.000001), (0.001, 0.00001), (0.01, 0.0001),
+            (0.1, 0.001), (1, 0.01), (10, 0.1), (100, 1), (5_000, 5), (10_000, 10), (50_000, 50),
+            (100_000, 100), (500_000, 500), (1_000_000, 1000)),
+    "USDT": ((0, 0.0001), (0.1, 0.001), (1, 0.01)),
+}
+TICK_FLOORS = {q: [f for f, _ in t] for q, t in TICK_TABLES.items()}
+TICK_SIZES = {q: [s for _, s in t] for q, t in TICK_TABLES.items()}
+
+def tick_size(quote, price):
+    return TICK_SIZES[quote][max(bisect_right(TICK_FLOORS[quote], float(price)) - 1, 0)]
+
+def tick_sizes(quote, prices):
+    import numpy as np
+    idx = np.clip(np.searchsorted(TICK_FLOORS[quote], prices, side="right") - 1, 0, None)
+    return np.asarray(TICK_SIZES[quote])[idx]
+
+def krw_tick_size(price: float) -> float:
+    return tick_size("KRW", price)
+
+def normalize_to_tick(value: float, tick: float) -> float:
+    if tick <= 0:
+        return float(value)
+    return round(round(float(value) / tick) * tick, 8)
+
+def normalize_decimals(x: float, precision_decimals: int or None) -> float:
+    if precision_decimals is None:
+        return float(x)
+    q = 10 ** precision_decimals
+    return round(float(x) * q) / q
+
+def market_specs(m):
+    price_prec = None
+    amt_prec = None
+    if isinstance(m.get("precision"), dict):
+        price_prec = m["precision"].get("price")
+        amt_prec = m["precision"].get("amount")
+    limits = (m.get("limits") or {})
+    min_cost = (limits.get("cost") or {}).get("min")
+    min_amt  = (limits.get("amount") or {}).get("min")
+    return {"price_prec": price_prec, "amt_prec": amt_prec, "min_cost": min_cost, "min_amt": min_amt}
+
+# 마켓 스펙 캐시: load_markets()는 백그라운드에서 TTL마다 1회, 실패 시 마지막 스펙 유지
+class MarketSpecRegistry:
+    def __init__(self, exchange_factory=None, ttl=MARKET_SPEC_TTL, retry=MARKET_SPEC_RETRY,
+                 enabled=None):
+        self.exchange_factory = exchange_factory
+        # False면 거래소에 아예 접근하지 않는다 (테스트 모드). 캐시에 없으면 None → 호가 단위 테이블로 검증
+        self.enabled = enabled or (lambda: True)
+        self.ttl = ttl
+        self.retry = retry
+        self.lock = threading.Lock()
+        self.specs = {}
+        self.loaded_at = None
+        self.failed_at = None
+        self.hits = self.misses = self.stale = self.refreshes = self.errors = 0
+        self._ex = None
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        if self.exchange_factory is None or not self.enabled():
+            return False
+        with self._refresh_lock:
+            try:
+                if self._ex is None:
+                    self._ex = self.exchange_factory()
+                markets = self._ex.load_markets(True)
+                specs = {sym: market_specs(m) for sym, m in markets.items()}
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                    self.failed_at = time.monotonic()
+                logger.warning(f"market specs refresh failed (keeping {len(self.specs)} cached): {e}")
+                return False
+            with self.lock:
+                self.specs = specs
+                self.loaded_at = time.monotonic()
+                self.failed_at = None
+                self.refreshes += 1
+            return True
+
+    # 틱 스레드에서 불린다: 네트워크는 타지 않고, 미스면 None을 돌려주며 백그라운드 갱신만 깨운다
+    def get(self, symbol):
+        with self.lock:
+            now = time.monotonic()
+            fresh = self.loaded_at is not None and now - self.loaded_at < self.ttl
+            if symbol in self.specs:
+                if fresh:
+                    self.hits += 1
+                else:
+                    self.stale += 1
+                return self.specs[symbol]
+            self.misses += 1
+            if fresh or (self.failed_at is not None and now - self.failed_at < self.retry):
+                return None
+        if self._thread is not None and self.enabled():
+            self._wake.set()
+        return None
+
+    def preload(self, symbols):
+        self.refresh()
+        missing = [sym for sym in symbols if sym not in self.specs]
+        if missing and self.loaded_at is not None:
+            logger.warning(f"market specs: unknown symbols {missing}")
+
+    def _refresh_loop(self, symbols):
+        self.preload(symbols)
+        while True:
+            self._wake.wait(self.ttl if self.failed_at is None else self.retry)
+            self._wake.clear()
+            self.refresh()
+
+    def start(self, symbols):
+        if self._thread is None:
+            self._thread = Thread(target=self._refresh_loop, args=(list(symbols),), daemon=True, name="market-specs")
+            self._thread.start()
+
+    def stats(self):
+        with self.lock:
+            age = None if self.loaded_at is None else round(time.monotonic() - self.loaded_at, 1)
+            return {"hits": self.hits, "misses": self.misses, "stale": self.stale,
+                    "refreshes": self.refreshes, "errors": self.errors,
+                    "symbols": len(self.specs), "age_sec": age}
+
+# specs: market_specs() 결과 (없으면 호가 단위 표와 기본 최소주문 규칙만 적용)
+def validate_order(symbol: str, side: str, price: float, amount: float, specs=None):
+    s = symbol.upper()
+    px = float(price)
+    qty = float(amount)
+    price_prec = specs.get("price_prec") if specs else None
+    amt_prec   = specs.get("amt_prec") if specs else None
+    min_cost   = specs.get("min_cost") if specs else None
+    min_amt    = specs.get("min_amt") if specs else None
+
+    if s.endswith("/KRW"):
+        tick = krw_tick_size(px)
+        px = normalize_to_tick(px, tick)
+        min_total = 5000.0
+        if isinstance(min_cost, (int, float)) and min_cost > 0:
+            min_total = max(min_total, float(min_cost))
+        qty = normalize_decimals(qty, amt_prec)
+        total = px * qty
+        if total + 1e-9 < min_total:
+            need = min_total / max(px, 1e-12)
+            return (False, f"KRW 최소주문금액 {int(min_total):,}원 미만 (현재 {int(total):,}원). 수량≥{need:.8f} 필요", px, qty)
+
+    elif s.endswith("/USDT"):
+        if price_prec is not None:
+            px = normalize_decimals(px, price_prec)
+        else:
+            px = normalize_to_tick(px, tick_size("USDT", px))
+        min_total = 0.5
+        if isinstance(min_cost, (int, float)) and min_cost > 0:
+            min_total = max(min_total, float(min_cost))
+        qty = normalize_decimals(qty, amt_prec)
+        total = px * qty
+        if total + 1e-12 < min_total:
+            need = min_total / max(px, 1e-12)
+            return (False, f"USDT 최소주문금액 {min_total} USDT 미만 (현재 {total:.6f}). 수량≥{need:.8f} 필요", px, qty)
+
+    elif s.endswith("/BTC"):
+        min_q = 0.00005
+        if isinstance(min_amt, (int, float)) and min_amt > 0:
+            min_q = max(min_q, float(min_amt))
+        qty = normalize_decimals(qty, amt_prec)
+        if qty + 1e-12 < min_q:
+            return (False, f"BTC 마켓 최소 주문수량 {min_q} BTC 미만 (현재 {qty})", px, qty)
+        px = normalize_decimals(px, price_prec)
+
+    else:
+        px = normalize_decimals(px, price_prec)
+        qty = normalize_decimals(qty, amt_prec)
+        if isinstance(min_cost, (int, float)) and min_cost > 0 and px * qty + 1e-12 < float(min_cost):
+            need = float(min_cost) / max(px, 1e-12)
+            return (False, f"최소 주문 금액 {min_cost} 미만. 수량≥{need:.8f} 필요", px, qty)
+        if isinstance(min_amt, (int, float)) and min_amt > 0 and qty + 1e-12 < float(min_amt):
+            return (False, f"최소 주문 수량 {min_amt} 미만 (현재 {qty})", px, qty)
+
+    return (True, "OK", px, qty)
+
+def _batch_decimals(x, precision_decimals):
+    import numpy as np
+    if precision_decimals is None:
+        return x
+    q = 10 ** precision_decimals
+    return np.round(x * q) / q
+
+def _batch_ticks(px, ticks):
+    import numpy as np
+    return np.round(np.round(px / ticks) * ticks, 8)
+
+def _batch_side(s, specs, px, qty):
+    import numpy as np
+    price_prec, amt_prec = specs.get("price_prec"), specs.get("amt_prec")
+    min_cost, min_amt = specs.get("min_cost"), specs.get("min_amt")
+    qty = _batch_decimals(qty, amt_prec)
+    has_cost = isinstance(min_cost, (int, float)) and min_cost > 0
+    has_amt = isinstance(min_amt, (int, float)) and min_amt > 0
+    if s.endswith("/KRW"):
+        px = _batch_ticks(px, tick_sizes("KRW", px))
+        ok = px * qty + 1e-9 >= max(5000.0, float(min_cost) if has_cost else 0.0)
+    elif s.endswith("/USDT"):
+        px = _batch_decimals(px, price_prec) if price_prec is not None else _batch_ticks(px, tick_sizes("USDT", px))
+        ok = px * qty + 1e-12 >= max(0.5, float(min_cost) if has_cost else 0.0)
+    elif s.endswith("/BTC"):
+        ok = qty + 1e-12 >= max(0.00005, float(min_amt) if has_amt else 0.0)
+        px = _batch_decimals(px, price_prec)
+    else:
+        px = _batch_decimals(px, price_prec)
+        ok = np.ones(len(px), dtype=bool)
+        if has_cost:
+            ok &= px * qty + 1e-12 >= float(min_cost)
+        if has_amt:
+            ok &= qty + 1e-12 >= float(min_amt)
+    return px, qty, ok
+
+# 그리드 전체를 한 번에 정규화/검증. 통과한 레벨은 validated=True로 표시되어 주문 시 validate_order를 건너뛴다
+def validate_ladder(symbol, grids, specs=None):
+    import numpy as np
+    keys = list(grids)
+    s = symbol.upper()
+    specs = specs or {}
+    amount = np.array([grids[k]["amount"] for k in keys], dtype=float)
+    buy_px, qty, ok_buy = _batch_side(s, specs, np.array([grids[k]["buy_price"] for k in keys], dtype=float), amount)
+    sell_px, _, ok_sell = _batch_side(s, specs, np.array([grids[k]["sell_price"] for k in keys], dtype=float), amount)
+    checked, rejects = {}, {}
+    for i, k in enumerate(keys):
+        checked[k] = {**grids[k], "buy_price": float(buy_px[i]), "sell_price": float(sell_px[i]),
+                      "amount": float(qty[i]), "validated": True}
+        if not (ok_buy[i] and ok_sell[i]):
+            side, price = ("buy", grids[k]["buy_price"]) if not ok_buy[i] else ("sell", grids[k]["sell_price"])
+            rejects[k] = validate_order(symbol, side, price, grids[k]["amount"], specs)[1]
+    return checked, rejects
+# --- [VALIDATION] END ----------------------------------------------------------
+
+# ---------- Strategy Presets ----------
+STRATEGY_PROFILES = {
+    "up": {"name":"Up (상승장)","up_pct":0.025,"down_pct":0.010,"n_grids":30,"padding":0.0,"interval":3,"target_note":"다음 그리드 도달 시 매도"},
+    "middle":{"name":"Middle (횡보장)","up_pct":0.015,"down_pct":0.015,"n_grids":40,"padding":0.0,"interval":3,"target_note":"다음 그리드 도달 시 매도"},
+    "down":{"name":"Down (하락장)","up_pct":0.008,"down_pct":0.030,"n_grids":20,"padding":0.0,"interval":5,"target_note":"반등 시 빠른 매도"},
+}
+
+# sweep.py --export 결과 등 추가 프리셋 (같은 키면 덮어씀)
+if STRATEGY_PROFILES_FILE and os.path.exists(STRATEGY_PROFILES_FILE):
+    try:
+        with open(STRATEGY_PROFILES_FILE) as f:
+            STRATEGY_PROFILES.update(json.load(f))
+    except Exception as e:
+        logger.warning(f"strategy profiles load failed: {e}")
+
+def apply_strategy_profile(s, current_price, key):
+    prof = STRATEGY_PROFILES.get(key)
+    if not prof:
+        return None
+    low = current_price * (1.0 - prof["down_pct"])
+    high = current_price * (1.0 + prof["up_pct"])
+    s["strategy"] = key
+    s["price_low"] = low
+    s["price_high"] = high
+    s["n_grids"] = prof["n_grids"]
+    s["price_padding"] = prof["padding"]
+    s["check_interval"] = prof["interval"]
+    s["grid_mode"] = prof.get("grid_mode", GRID_MODE)
+    return (f"전략: {prof['name']} ({key})\n"
+            f"범위: {int(low):,} ~ {int(high):,}\n"
+            f"N_GRIDS: {prof['n_grids']} | PADDING: {prof['padding']} | INTERVAL: {prof['interval']}s\n"
+            f"목표가: {prof['target_note']}")
@@ -0,0 +1,383 @@
+import sys, json, zlib, struct, argparse
+from array import array
+from collections import deque
+from collections.abc import Mapping, MutableMapping
+
+# 압축 그리드 저장소: 레벨별 dict 대신 타입 배열 열(가격/수량/상태 코드) + 드문 필드만 행별 extras
+# 체결 이력은 그리드에 주문 dict를 박지 않고 고정 길이 링(FillRing)에 따로 보관
+# 바이너리 스냅샷(STATE_FORMAT=binary): magic | 헤더 길이 | 열 블록 길이 | zlib(JSON 헤더) | zlib(바이트 셔플한 그리드 열 + 체결 열)
+# JSON 내보내기: python gridstore.py export grid_state.json [-o state.json]
+
+MAGIC = b"GRIDST1\n"
+HEAD = struct.Struct("<II")
+FLOAT_COLS = ("buy_price", "sell_price", "amount")
+INT_COLS = (("attempt", "i"), ("status", "b"), ("validated", "b"))
+COLUMNS = [(name, "d") for name in FLOAT_COLS] + list(INT_COLS)
+COLUMN_NAMES = {name for name, _ in COLUMNS}
+LEGACY_ORDER_FIELDS = ("buy_order", "sell_order")
+FILL_FIELDS = ("ts", "grid", "side", "price", "amount", "fee", "order_id")
+FILL_FLOATS = ("ts", "price", "amount", "fee")
+
+MISSING = object()
+NAN = float("nan")
+
+class GridRow(Mapping):
+    __slots__ = ("table", "i")
+
+    def __init__(self, table, i):
+        self.table, self.i = table, i
+
+    def __getitem__(self, field):
+        v = self.table._get(self.i, field)
+        if v is MISSING:
+            raise KeyError(field)
+        return v
+
+    def get(self, field, default=None):
+        v = self.table._get(self.i, field)
+        return default if v is MISSING else v
+
+    def __contains__(self, field):
+        return self.table._get(self.i, field) is not MISSING
+
+    def __iter__(self):
+        return iter(self.table._fields(self.i))
+
+    def __len__(self):
+        return len(self.table._fields(self.i))
+
+    def update(self, upd):
+        for f, v in upd.items():
+            self.table._set(self.i, f, v)
+
+    def to_json(self):
+        t, i = self.table, self.i
+        return {f: t._get(i, f) for f in t._fields(i)}
+
+    def __repr__(self):
+        return repr(self.to_json())
+
+class GridTable(MutableMapping):
+    def __init__(self):
+        self.keys_ = []
+        self.index = {}
+        self.cols = {name: array(code) for name, code in COLUMNS}
+        self.status_names = []
+        self.status_codes = {}
+        self.extras = {}
+
+    @classmethod
+    def from_dict(cls, go, fills=None):
+        t = cls()
+        rows = list(go.values())
+        if any(f in g for g in rows for f in LEGACY_ORDER_FIELDS):
+            rows = [t._split_legacy(k, g, fills) for k, g in go.items()]
+        t.keys_ = list(go)
+        t.index = {k: i for i, k in enumerate(t.keys_)}
+        # 열 단위로 한 번에 채우고, 타입이 섞인 열만 행별 _set으로
+        for name, code in COLUMNS:
+            vals = [g.get(name, MISSING) for g in rows]
+            packed = t._pack(name, vals)
+            if packed is not None:
+                t.cols[name] = array(code, packed)
+                continue
+            t.cols[name] = array(code, [NAN if code == "d" else -1]) * len(rows)
+            for i, v in enumerate(vals):
+                if v is not MISSING:
+                    t._set(i, name, v)
+        for i, g in enumerate(rows):
+            ex = {f: v for f, v in g.items() if f not in COLUMN_NAMES and v is not None}
+            if ex:
+                t.extras.setdefault(i, {}).update(ex)
+        return t
+
+    @staticmethod
+    def _split_legacy(k, g, fills):
+        g = dict(g)
+        for f in LEGACY_ORDER_FIELDS:
+            o = g.pop(f, None)
+            if o and fills is not None:
+                fills.append({"grid": k, "side": o.get("side"), "price": o.get("price"),
+                              "amount": o.get("amount"), "order_id": o.get("id")})
+        return g
+
+    def _pack(self, name, vals):
+        if name in FLOAT_COLS:
+            if all(type(v) is float or v is MISSING for v in vals):
+                return [NAN if v is MISSING else v for v in vals]
+        elif name == "status":
+            if all(type(v) is str or v is MISSING for v in vals):
+                for v in set(vals) - {MISSING} - set(self.status_codes):
+                    self.status_codes[v] = len(self.status_names)
+                    self.status_names.append(v)
+                if len(self.status_names) <= 127:
+                    return [-1 if v is MISSING else self.status_codes[v] for v in vals]
+        elif name == "validated":
+            if all(type(v) is bool or v is MISSING for v in vals):
+                return [-1 if v is MISSING else int(v) for v in vals]
+        elif all(v is MISSING or (type(v) is int and 0 <= v < 2 ** 31) for v in vals):
+            return [-1 if v is MISSING else v for v in vals]
+        return None
+
+    # ----- 열 접근 -----
+    def _get(self, i, f):
+        col = self.cols.get(f)
+        if col is None:
+            return self.extras.get(i, {}).get(f, MISSING)
+        v = col[i]
+        if col.typecode == "d":
+            if v == v:
+                return v
+        elif v >= 0:
+            if f == "status":
+                return self.status_names[v]
+            return bool(v) if f == "validated" else v
+        return self.extras.get(i, {}).get(f, MISSING) if self.extras else MISSING
+
+    def _set(self, i, f, v):
+        col = self.cols.get(f)
+        ex = self.extras.get(i)
+        if ex and f in ex:
+            del ex[f]
+            if not ex:
+                del self.extras[i]
+        if col is not None:
+            if col.typecode == "d" and isinstance(v, (int, float)) and not isinstance(v, bool):
+                col[i] = float(v)
+                return
+            if f == "status" and isinstance(v, str):
+                code = self.status_codes.get(v)
+                if code is None and len(self.status_names) < 127:
+                    code = self.status_codes[v] = len(self.status_names)
+                    self.status_names.append(v)
+                if code is not None:
+                    col[i] = code
+                    return
+            elif f == "validated" and isinstance(v, bool):
+                col[i] = int(v)
+                return
+            elif f == "attempt" and isinstance(v, int) and not isinstance(v, bool) and 0 <= v < 2 ** 31:
+                col[i] = v
+                return
+            col[i] = NAN if col.typecode == "d" else -1
+        if v is not None:
+            self.extras.setdefault(i, {})[f] = v
+
+    def _fields(self, i):
+        out = [f for f, _ in COLUMNS if self._get(i, f) is not MISSING]
+        ex = self.extras.get(i)
+        return out + [f for f in ex if f not in out] if ex else out
+
+    def _append(self, k):
+        i = len(self.keys_)
+        self.keys_.append(k)
+        self.index[k] = i
+        for name, code in COLUMNS:
+            self.cols[name].append(NAN if code == "d" else -1)
+        return i
+
+    # ----- dict 인터페이스 (기존 코드는 grid_orders를 dict처럼 쓴다) -----
+    def __getitem__(self, k):
+        return GridRow(self, self.index[k])
+
+    def __setitem__(self, k, g):
+        i = self.index.get(k)
+        if i is None:
+            i = self._append(k)
+        else:
+            for name, code in COLUMNS:
+                self.cols[name][i] = NAN if code == "d" else -1
+            self.extras.pop(i, None)
+        for f, v in g.items():
+            self._set(i, f, v)
+
+    def __delitem__(self, k):
+        rows = [(key, self[key].to_json()) for key in self.keys_ if key != k]
+        if len(rows) == len(self.keys_):
+            raise KeyError(k)
+        self.__init__()
+        for key, g in rows:
+            self[key] = g
+
+    def __contains__(self, k):
+        return k in self.index
+
+    def setdefault(self, k, default=None):
+        if k not in self.index:
+            self[k] = default or {}
+        return self[k]
+
+    def __iter__(self):
+        return iter(self.keys_)
+
+    def __len__(self):
+        return len(self.keys_)
+
+    def count(self, status):
+        code = self.status_codes.get(status)
+        return 0 if code is None else self.cols["status"].tobytes().count(bytes([code]))
+
+    def to_json(self):
+        return {k: GridRow(self, i).to_json() for i, k in enumerate(self.keys_)}
+
+    # ----- 바이너리 -----
+    def header(self):
+        n = len(self.keys_)
+        contiguous = self.keys_ == [str(i) for i in range(n)]
+        return {"n": n, "keys": None if contiguous else self.keys_, "statuses": self.status_names,
+                "extras": {str(i): ex for i, ex in self.extras.items()}}
+
+    def column_bytes(self):
+        return b"".join(shuffle(self.cols[name].tobytes(), self.cols[name].itemsize) for name, _ in COLUMNS)
+
+    @classmethod
+    def from_binary(cls, header, blob):
+        t = cls()
+        n = header["n"]
+        t.keys_ = header["keys"] or [str(i) for i in range(n)]
+        t.index = {k: i for i, k in enumerate(t.keys_)}
+        t.status_names = list(header["statuses"])
+        t.status_codes = {s: i for i, s in enumerate(t.status_names)}
+        t.extras = {int(i): ex for i, ex in header["extras"].items()}
+        pos = 0
+        for name, code in COLUMNS:
+            col = array(code)
+            size = n * col.itemsize
+            col.frombytes(unshuffle(blob[pos:pos + size], col.itemsize))
+            t.cols[name] = col
+            pos += size
+        return t
+
+# 같은 자리 바이트끼리 모으면(지수/상위 바이트가 반복) zlib이 훨씬 잘 줄인다
+def shuffle(raw, width):
+    return b"".join(raw[j::width] for j in range(width)) if width > 1 else raw
+
+def unshuffle(raw, width):
+    if width == 1:
+        return raw
+    n = len(raw) // width
+    out = bytearray(len(raw))
+    for j in range(width):
+        out[j::width] = raw[j * n:(j + 1) * n]
+    return bytes(out)
+
+class FillRing:
+    def __init__(self, capacity, items=()):
+        self.items = deque(maxlen=capacity)
+        for f in items:
+            self.append(f)
+
+    def append(self, fill):
+        self.items.append(tuple(fill.get(k) for k in FILL_FIELDS))
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return (dict(zip(FILL_FIELDS, t)) for t in self.items)
+
+    def tail(self, n):
+        return [dict(zip(FILL_FIELDS, t)) for t in list(self.items)[-n:]]
+
+    def to_json(self):
+        return list(self)
+
+    # 숫자 필드는 float 열(None은 NaN), 나머지는 헤더의 문자열 목록. 숫자가 아닌 값이 섞이면 행 그대로
+    def encode(self):
+        cols = list(zip(*self.items)) or [()] * len(FILL_FIELDS)
+        by_name = dict(zip(FILL_FIELDS, cols))
+        if not all(type(v) is float or v is None for f in FILL_FLOATS for v in by_name[f]):
+            return {"capacity": self.items.maxlen, "rows": [list(t) for t in self.items]}, b""
+        header = {"capacity": self.items.maxlen, "n": len(self.items)}
+        header.update((f, list(c)) for f, c in by_name.items() if f not in FILL_FLOATS)
+        blob = b"".join(shuffle(array("d", [NAN if v is None else v for v in by_name[f]]).tobytes(), 8)
+                        for f in FILL_FLOATS)
+        return header, blob
+
+    @classmethod
+    def decode(cls, header, blob):
+        ring = cls(header["capacity"])
+        if "rows" in header:
+            ring.items.extend(tuple(r) for r in header["rows"])
+            return ring
+        n = header["n"]
+        cols = {}
+        for i, f in enumerate(FILL_FLOATS):
+            col = array("d")
+            col.frombytes(unshuffle(blob[i * n * 8:(i + 1) * n * 8], 8))
+            cols[f] = [None if v != v else v for v in col]
+        cols.update((f, header[f]) for f in FILL_FIELDS if f not in FILL_FLOATS)
+        ring.items.extend(zip(*(cols[f] for f in FILL_FIELDS)))
+        return ring
+
+def json_default(o):
+    to_json = getattr(o, "to_json", None)
+    return to_json() if to_json else str(o)
+
+# 디스크에서 읽은 상태(dict/list)를 압축 형태로. 예전 형식의 buy_order/sell_order는 체결 이력 링으로 옮긴다
+def normalize_state(s, fill_history):
+    fills = s.get("fills")
+    ring = fills if isinstance(fills, FillRing) else FillRing(fill_history, fills or ())
+    go = s.get("grid_orders")
+    if not isinstance(go, GridTable):
+        go = GridTable.from_dict(go or {}, ring)
+    s["grid_orders"], s["fills"] = go, ring
+    return s
+
+def encode_state(s, level=1):
+    go = s["grid_orders"]
+    meta = {k: v for k, v in s.items() if k not in ("grid_orders", "fills")}
+    meta["__grids__"] = go.header()
+    meta["__fills__"], fill_bytes = s["fills"].encode()
+    grid_bytes = go.column_bytes()
+    meta["__grid_bytes__"] = len(grid_bytes)
+    head = zlib.compress(json.dumps(meta, default=json_default, separators=(",", ":")).encode(), level)
+    blob = zlib.compress(grid_bytes + fill_bytes, level)
+    return MAGIC + HEAD.pack(len(head), len(blob)) + head + blob
+
+def decode_state(raw):
+    hlen, blen = HEAD.unpack_from(raw, len(MAGIC))
+    pos = len(MAGIC) + HEAD.size
+    meta = json.loads(zlib.decompress(raw[pos:pos + hlen]))
+    blob = zlib.decompress(raw[pos + hlen:pos + hlen + blen])
+    split = meta.pop("__grid_bytes__")
+    go = GridTable.from_binary(meta.pop("__grids__"), blob[:split])
+    meta["grid_orders"] = go
+    meta["fills"] = FillRing.decode(meta.pop("__fills__"), blob[split:])
+    return meta
+
+def is_binary(raw):
+    return raw[:len(MAGIC)] == MAGIC
+
+def load_any(path, fill_history=1000):
+    with open(path, "rb") as f:
+        raw = f.read()
+    if is_binary(raw):
+        return decode_state(raw)
+    return normalize_state(json.loads(raw), fill_history)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Convert grid bot state files between binary and JSON")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="write a state file (binary or JSON) as indented JSON")
+    ex.add_argument("path")
+    ex.add_argument("-o", "--out")
+    enc = sub.add_parser("encode", help="write a state file as binary")
+    enc.add_argument("path")
+    enc.add_argument("-o", "--out", required=True)
+    args = ap.parse_args(argv)
+    s = load_any(args.path)
+    if args.cmd == "export":
+        text = json.dumps(s, default=json_default, indent=2, ensure_ascii=False)
+        if args.out:
+            with open(args.out, "w") as f:
+                f.write(text)
+        else:
+            print(text)
+    else:
+        with open(args.out, "wb") as f:
+            f.write(encode_state(s))
+    print(f"{args.path}: {len(s['grid_orders'])} grids, {len(s['fills'])} fills", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
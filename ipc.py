@@ -0,0 +1,202 @@
+import os, json, mmap, time, struct, hashlib
+from threading import Thread
+from multiprocessing.connection import Listener, Client
+from gridstore import json_default
+
+# 엔진 ↔ API 프로세스 통신: 상태 스냅샷은 mmap 파일(seqlock), 명령은 multiprocessing.connection 소켓
+# 스냅샷 파일: [magic][seq][length][capacity][version] + payload. seq가 홀수면 쓰는 중, 읽기 전후 seq가 같아야 유효
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+ENGINE_ADDRESS = os.getenv("ENGINE_ADDRESS", "engine.sock")
+# 명령 채널은 pickle이 오가므로 키 = 실행 권한. 기본값 없음: unix 소켓이면 엔진이 무작위 키를 만들어 환경변수로 API 자식에게 넘기고,
+# TCP(host:port)는 ENGINE_AUTHKEY를 직접 정해야만 연다. RUN_MODE=engine + 따로 띄운 gunicorn이면 양쪽에 같은 키를 지정
+ENGINE_AUTHKEY = os.getenv("ENGINE_AUTHKEY", "")
+ENGINE_TIMEOUT = float(os.getenv("ENGINE_TIMEOUT", 10))
+
+MAGIC = b"GRIDSNAP"
+HEADER = struct.Struct("<8sQQQQ")
+SEQ = struct.Struct("<Q")
+BODY = struct.Struct("<QQQ")
+
+def engine_address(addr=ENGINE_ADDRESS):
+    host, sep, port = addr.rpartition(":")
+    return (host, int(port)) if sep and port.isdigit() else addr
+
+def engine_authkey(address=ENGINE_ADDRESS, create=False):
+    global ENGINE_AUTHKEY
+    if not ENGINE_AUTHKEY:
+        if not isinstance(engine_address(address), str):
+            raise RuntimeError(f"ENGINE_AUTHKEY must be set to serve or call engine commands over TCP ({address})")
+        if not create:
+            raise RuntimeError("ENGINE_AUTHKEY is not set (the engine passes it to the API process it spawns)")
+        ENGINE_AUTHKEY = os.environ["ENGINE_AUTHKEY"] = os.urandom(32).hex()
+    return ENGINE_AUTHKEY.encode()
+
+def snapshot_path(name, root=SNAPSHOT_DIR):
+    return os.path.join(root, f"{name.replace('/', '-')}.snap")
+
+class SnapshotWriter:
+    def __init__(self, path, capacity=1 << 16):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        # 기존 파일은 자르지 않는다: 매핑 중인 reader가 잘린 영역을 읽으면 SIGBUS
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(self.fd).st_size
+        self.capacity = max(capacity, size - HEADER.size)
+        if size < HEADER.size + self.capacity:
+            os.ftruncate(self.fd, HEADER.size + self.capacity)
+        self.mm = mmap.mmap(self.fd, HEADER.size + self.capacity)
+        magic, seq, _, _, _ = HEADER.unpack_from(self.mm, 0)
+        self.seq = (seq + 1) & ~1 if magic == MAGIC else 0
+        self.mm[:8] = MAGIC
+
+    def publish(self, payload, version=0):
+        n = len(payload)
+        self.seq += 1
+        SEQ.pack_into(self.mm, 8, self.seq)
+        if n > self.capacity:
+            while self.capacity < n:
+                self.capacity *= 2
+            os.ftruncate(self.fd, HEADER.size + self.capacity)
+            self.mm.close()
+            self.mm = mmap.mmap(self.fd, HEADER.size + self.capacity)
+        self.mm[HEADER.size:HEADER.size + n] = payload
+        BODY.pack_into(self.mm, 16, n, self.capacity, version)
+        self.seq += 1
+        SEQ.pack_into(self.mm, 8, self.seq)
+
+class SnapshotReader:
+    def __init__(self, path):
+        self.path = path
+        self.mm = None
+        self.last = (None, None)
+
+    def _map(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return True
+
+    def read(self):
+        if self.mm is None and not self._map():
+            return None
+        for _ in range(1000):
+            magic, s1, n, cap, version = HEADER.unpack_from(self.mm, 0)
+            if magic != MAGIC or s1 & 1:
+                time.sleep(0)
+                continue
+            seq, cached = self.last
+            if s1 == seq:
+                return cached
+            if HEADER.size + cap > len(self.mm):
+                self._map()
+                continue
+            data = self.mm[HEADER.size:HEADER.size + n]
+            if SEQ.unpack_from(self.mm, 8)[0] == s1:
+                self.last = (s1, (version, data))
+                return self.last[1]
+        return self.last[1]
+
+class CommandServer:
+    def __init__(self, handlers, address=ENGINE_ADDRESS, authkey=None):
+        self.handlers = handlers
+        self.address = engine_address(address)
+        self.authkey = authkey or engine_authkey(address, create=True)
+        self.listener = None
+
+    def start(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+        self.listener = Listener(self.address, authkey=self.authkey)
+        if isinstance(self.address, str):
+            os.chmod(self.address, 0o600)
+        Thread(target=self._accept_loop, daemon=True, name="engine-commands").start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except Exception:
+                continue
+            Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    return
+                handler = self.handlers.get(msg.get("cmd"))
+                try:
+                    if handler is None:
+                        raise KeyError(f"unknown command {msg.get('cmd')!r}")
+                    conn.send({"ok": True, "result": handler(**msg.get("args", {}))})
+                except Exception as e:
+                    conn.send({"ok": False, "error": f"{type(e).__name__}: {e}"})
+
+def call(cmd, address=ENGINE_ADDRESS, authkey=None, timeout=ENGINE_TIMEOUT, **args):
+    with Client(engine_address(address), authkey=authkey or engine_authkey(address)) as conn:
+        conn.send({"cmd": cmd, "args": args})
+        if not conn.poll(timeout):
+            raise TimeoutError(f"engine did not answer {cmd!r} within {timeout}s")
+        res = conn.recv()
+    if not res["ok"]:
+        raise RuntimeError(res["error"])
+    return res["result"]
+
+# ---------- /status 뷰 (엔진 내 Flask와 API 프로세스가 공용) ----------
+STATUS_PARAMS = ("since", "fields", "grid_fields", "offset", "limit")
+# 상태 파일에는 있지만 /status·스냅샷에는 싣지 않는 필드 (체결 이력은 /fills)
+HIDDEN_FIELDS = ("fills",)
+
+# 심볼 전체 + version + 정규화한 쿼리 해시. 전체/델타/필드 선택/페이지 응답이 서로 다른 태그를 갖도록
+def status_etag(symbol, version, args):
+    query = {k: args[k] for k in STATUS_PARAMS if k in args}
+    if "fields" in query:
+        query["fields"] = ",".join(sorted(set(query["fields"].split(","))))
+    digest = hashlib.sha1(json.dumps(query, sort_keys=True).encode()).hexdigest()[:12] if query else "full"
+    return f"{symbol.replace('/', '-')}-{version}-{digest}"
+
+def grid_sort_key(k):
+    return (0, int(k), "") if k.isdigit() else (1, 0, k)
+
+class SnapshotChanges:
+    def __init__(self, d):
+        self.base = d.get("base", 0)
+        self.fields = d.get("fields", {})
+        self.grids = d.get("grids", {})
+        self.removed = d.get("removed", {})
+
+    def since(self, version):
+        return ([k for k, v in self.fields.items() if v > version],
+                [k for k, v in self.grids.items() if v > version],
+                [k for k, v in self.removed.items() if v > version])
+
+def status_view(s, version, symbol, changes, args):
+    since = args.get("since", type=int)
+    select = set(args["fields"].split(",")) if args.get("fields") else None
+    grid_fields = args["grid_fields"].split(",") if args.get("grid_fields") else None
+    offset = args.get("offset", 0, type=int)
+    limit = args.get("limit", type=int)
+    delta = since is not None and changes is not None and since >= changes.base
+    if delta:
+        fields, grids, removed = changes.since(since)
+    else:
+        fields, grids, removed = [k for k in s if k != "grid_orders" and k not in HIDDEN_FIELDS], list(s.get("grid_orders", {})), []
+    out = {"version": version, "symbol": symbol, "full": not delta,
+           "fields": {k: s[k] for k in fields if k in s and k not in HIDDEN_FIELDS and (select is None or k in select)},
+           "removed": [k for k in removed if select is None or k in select]}
+    if select is None or "grid_orders" in select:
+        go = s.get("grid_orders", {})
+        keys = sorted(grids, key=grid_sort_key)
+        page = keys[offset:offset + limit] if limit is not None else keys[offset:]
+        if grid_fields:
+            out["grid_orders"] = {k: {f: go[k][f] for f in grid_fields if f in go[k]} for k in page}
+        else:
+            out["grid_orders"] = {k: go[k] for k in page}
+        out["grids_total"] = len(keys)
+        end = offset + len(page)
+        out["next_offset"] = end if end < len(keys) else None
+    return json.dumps(out, default=json_default)
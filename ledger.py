@@ -0,0 +1,300 @@
+import os, sys, json, time, sqlite3, argparse, threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# 체결 원장: 모든 체결을 SQLite(WAL)에 쌓는다. 상태 파일과 별개라 그리드가 한 바퀴 돌아도 이력이 남음
+# 조회는 인덱스(심볼+시간/그리드/방향)와 체결 때마다 같이 갱신하는 집계 테이블(positions/daily/grids)만 읽는다
+# 손익: 심볼 전체는 평균단가 기준(미실현 = 보유수량 × 현재가 - 취득원가), 그리드별은 그 그리드의 매수원가 기준
+# 사용: python ledger.py pnl BTC/KRW [--mark 70000000]
+#       python ledger.py fills BTC/KRW --since 1790000000 --limit 50
+#       python ledger.py import grid_state.json --symbol BTC/KRW   (상태 파일의 체결 이력 링을 빈 원장에 한 번 옮김)
+
+LEDGER_FILE = os.getenv("LEDGER_FILE", "ledger.db")
+DAY_TZ = ZoneInfo(os.getenv("TIMEZONE", "Asia/Seoul"))
+DUST = 1e-9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fills (
+    id INTEGER PRIMARY KEY, ts REAL NOT NULL, symbol TEXT NOT NULL, grid TEXT, side TEXT NOT NULL,
+    price REAL NOT NULL, amount REAL NOT NULL, fee REAL NOT NULL, order_id TEXT, realized REAL NOT NULL,
+    v INTEGER, n INTEGER);
+CREATE INDEX IF NOT EXISTS fills_symbol_ts ON fills (symbol, ts);
+CREATE INDEX IF NOT EXISTS fills_symbol_grid_ts ON fills (symbol, grid, ts);
+CREATE INDEX IF NOT EXISTS fills_symbol_side_ts ON fills (symbol, side, ts);
+CREATE TABLE IF NOT EXISTS positions (
+    symbol TEXT PRIMARY KEY, qty REAL NOT NULL, cost REAL NOT NULL, realized REAL NOT NULL, fees REAL NOT NULL,
+    fills INTEGER NOT NULL, round_trips INTEGER NOT NULL, hold_sec REAL NOT NULL, first_ts REAL, last_ts REAL);
+CREATE TABLE IF NOT EXISTS daily (
+    symbol TEXT NOT NULL, day TEXT NOT NULL, buys INTEGER NOT NULL, sells INTEGER NOT NULL,
+    buy_qty REAL NOT NULL, sell_qty REAL NOT NULL, buy_value REAL NOT NULL, sell_value REAL NOT NULL,
+    fees REAL NOT NULL, realized REAL NOT NULL, round_trips INTEGER NOT NULL,
+    PRIMARY KEY (symbol, day)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS grids (
+    symbol TEXT NOT NULL, grid TEXT NOT NULL, open_qty REAL NOT NULL, open_cost REAL NOT NULL, opened_ts REAL,
+    buys INTEGER NOT NULL, sells INTEGER NOT NULL, round_trips INTEGER NOT NULL, realized REAL NOT NULL,
+    hold_sec REAL NOT NULL, last_ts REAL, PRIMARY KEY (symbol, grid)) WITHOUT ROWID;
+"""
+
+UPSERT_POSITION = """
+INSERT INTO positions VALUES (:symbol, :qty, :cost, :realized, :fee, 1, :trip, :hold, :ts, :ts)
+ON CONFLICT (symbol) DO UPDATE SET qty = excluded.qty, cost = excluded.cost, realized = realized + excluded.realized,
+    fees = fees + excluded.fees, fills = fills + 1, round_trips = round_trips + excluded.round_trips,
+    hold_sec = hold_sec + excluded.hold_sec, last_ts = excluded.last_ts"""
+
+UPSERT_DAILY = """
+INSERT INTO daily VALUES (:symbol, :day, :buy, :sell, :buy_qty, :sell_qty, :buy_value, :sell_value, :fee, :realized, :trip)
+ON CONFLICT (symbol, day) DO UPDATE SET buys = buys + excluded.buys, sells = sells + excluded.sells,
+    buy_qty = buy_qty + excluded.buy_qty, sell_qty = sell_qty + excluded.sell_qty,
+    buy_value = buy_value + excluded.buy_value, sell_value = sell_value + excluded.sell_value,
+    fees = fees + excluded.fees, realized = realized + excluded.realized, round_trips = round_trips + excluded.round_trips"""
+
+UPSERT_GRID = """
+INSERT INTO grids VALUES (:symbol, :grid, :open_qty, :open_cost, :opened_ts, :buy, :sell, :trip, :grid_realized, :hold, :ts)
+ON CONFLICT (symbol, grid) DO UPDATE SET open_qty = excluded.open_qty, open_cost = excluded.open_cost,
+    opened_ts = excluded.opened_ts, buys = buys + excluded.buys, sells = sells + excluded.sells,
+    round_trips = round_trips + excluded.round_trips, realized = realized + excluded.realized,
+    hold_sec = hold_sec + excluded.hold_sec, last_ts = excluded.last_ts"""
+
+FILL_COLUMNS = "id, ts, grid, side, price, amount, fee, order_id, realized"
+
+def day_of(ts, tz=DAY_TZ):
+    return datetime.fromtimestamp(ts, tz).strftime("%Y-%m-%d")
+
+def close_part(qty, cost, amount):
+    closed = min(amount, qty)
+    basis = cost * closed / qty if qty > 0 else 0.0
+    qty, cost = qty - closed, cost - basis
+    if qty <= DUST * max(amount, 1e-12):
+        qty, cost = 0.0, 0.0
+    return closed, basis, qty, cost
+
+# 쓰기는 엔진의 연결 하나(+lock), 읽기는 스레드별 연결. readonly=True면 API 프로세스처럼 읽기만
+class Ledger:
+    def __init__(self, path=LEDGER_FILE, readonly=False, tz=DAY_TZ):
+        self.path = path
+        self.readonly = readonly
+        self.tz = tz
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.db = None
+        # 쓰기 경로가 매번 SELECT하지 않도록 포지션/그리드 미결 수량은 메모리에 들고 있는다
+        self.positions = {}
+        self.open_grids = {}
+        if not readonly:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(SCHEMA)
+            # 상태 journal 이벤트 (version, 순번, 체결 시각)당 한 줄: 같은 이벤트를 다시 넣어도(재시도/재생) 중복되지 않음
+            if "v" not in {r[1] for r in self.db.execute("PRAGMA table_info(fills)")}:
+                self.db.execute("ALTER TABLE fills ADD COLUMN v INTEGER")
+                self.db.execute("ALTER TABLE fills ADD COLUMN n INTEGER")
+            self.db.execute("CREATE UNIQUE INDEX IF NOT EXISTS fills_source ON fills (symbol, v, n, ts)")
+            for sym, qty, cost in self.db.execute("SELECT symbol, qty, cost FROM positions"):
+                self.positions[sym] = (qty, cost)
+            for sym, grid, qty, cost, opened in self.db.execute(
+                    "SELECT symbol, grid, open_qty, open_cost, opened_ts FROM grids WHERE open_qty > 0"):
+                self.open_grids[(sym, grid)] = (qty, cost, opened)
+
+    def available(self):
+        return os.path.exists(self.path)
+
+    def reader(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            if self.readonly:
+                db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            else:
+                db = sqlite3.connect(self.path, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            self.local.db = db
+        return db
+
+    # version(상태 이벤트 번호)을 주면 이미 들어간 체결은 건너뛴다. 반환값은 새로 기록한 건수
+    def add(self, symbol, fills, version=None):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                added = sum(self._apply(symbol, f, version, i if version is not None else None)
+                            for i, f in enumerate(fills))
+                self.db.execute("COMMIT")
+                return added
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                self._reload(symbol)
+                raise
+
+    def _reload(self, symbol):
+        row = self.db.execute("SELECT qty, cost FROM positions WHERE symbol = ?", (symbol,)).fetchone()
+        self.positions[symbol] = row or (0.0, 0.0)
+        for key in [k for k in self.open_grids if k[0] == symbol]:
+            del self.open_grids[key]
+        for grid, qty, cost, opened in self.db.execute(
+                "SELECT grid, open_qty, open_cost, opened_ts FROM grids WHERE symbol = ? AND open_qty > 0", (symbol,)):
+            self.open_grids[(symbol, grid)] = (qty, cost, opened)
+
+    def _apply(self, symbol, f, version=None, n=None):
+        ts = f.get("ts") or time.time()
+        side = f["side"]
+        price, amount, fee = float(f["price"]), float(f["amount"]), float(f.get("fee") or 0.0)
+        grid = None if f.get("grid") is None else str(f["grid"])
+        buy = side == "buy"
+        qty, cost = self.positions.get(symbol, (0.0, 0.0))
+        realized = 0.0
+        if buy:
+            qty, cost = qty + amount, cost + price * amount + fee
+        else:
+            _, basis, qty, cost = close_part(qty, cost, amount)
+            realized = price * amount - fee - basis
+        cur = self.db.execute("INSERT OR IGNORE INTO fills (ts, symbol, grid, side, price, amount, fee, order_id, realized, v, n) "
+                              "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              (ts, symbol, grid, side, price, amount, fee, f.get("order_id"), realized, version, n))
+        if not cur.rowcount:
+            return 0
+        self.positions[symbol] = (qty, cost)
+        v = {"symbol": symbol, "ts": ts, "qty": qty, "cost": cost, "realized": realized, "fee": fee, "trip": 0, "hold": 0.0,
+             "day": day_of(ts, self.tz), "buy": int(buy), "sell": int(not buy),
+             "buy_qty": amount if buy else 0.0, "sell_qty": 0.0 if buy else amount,
+             "buy_value": price * amount if buy else 0.0, "sell_value": 0.0 if buy else price * amount}
+        if grid is not None:
+            oq, oc, opened = self.open_grids.pop((symbol, grid), (0.0, 0.0, None))
+            grid_realized = 0.0
+            if buy:
+                oq, oc, opened = oq + amount, oc + price * amount + fee, opened or ts
+            else:
+                closed, basis, oq, oc = close_part(oq, oc, amount)
+                grid_realized = price * amount - fee - basis
+                if closed > 0 and oq == 0.0:
+                    v["trip"] = 1
+                    v["hold"] = ts - opened if opened else 0.0
+                    opened = None
+            if oq > 0:
+                self.open_grids[(symbol, grid)] = (oq, oc, opened)
+            v.update(grid=grid, open_qty=oq, open_cost=oc, opened_ts=opened, grid_realized=grid_realized)
+            self.db.execute(UPSERT_GRID, v)
+        self.db.execute(UPSERT_POSITION, v)
+        self.db.execute(UPSERT_DAILY, v)
+        return 1
+
+    # ----- 조회 (집계 테이블/인덱스만 사용) -----
+    def pnl(self, symbol, mark=None, days=7, top=10):
+        db = self.reader()
+        pos = db.execute("SELECT * FROM positions WHERE symbol = ?", (symbol,)).fetchone()
+        pos = dict(pos) if pos else {"qty": 0.0, "cost": 0.0, "realized": 0.0, "fees": 0.0, "fills": 0,
+                                     "round_trips": 0, "hold_sec": 0.0, "first_ts": None, "last_ts": None}
+        unrealized = pos["qty"] * mark - pos["cost"] if mark is not None else None
+        daily = [dict(r) for r in db.execute(
+            "SELECT day, buys, sells, buy_qty, sell_qty, buy_value, sell_value, fees, realized, round_trips "
+            "FROM daily WHERE symbol = ? ORDER BY day DESC LIMIT ?", (symbol, days))]
+        today = day_of(time.time(), self.tz)
+        return {"symbol": symbol, "mark": mark, "position": pos["qty"], "cost": pos["cost"],
+                "avg_cost": pos["cost"] / pos["qty"] if pos["qty"] else None,
+                "realized": pos["realized"], "unrealized": unrealized,
+                "total": pos["realized"] + unrealized if unrealized is not None else None,
+                "fees": pos["fees"], "fills": pos["fills"], "round_trips": pos["round_trips"],
+                "avg_hold_sec": pos["hold_sec"] / pos["round_trips"] if pos["round_trips"] else None,
+                "first_ts": pos["first_ts"], "last_ts": pos["last_ts"],
+                "today": daily[0] if daily and daily[0]["day"] == today else None,
+                "daily": daily, "grids": self.grid_stats(symbol, top=top)}
+
+    def grid_stats(self, symbol, grid=None, top=10):
+        db = self.reader()
+        cols = "grid, buys, sells, round_trips, realized, hold_sec, open_qty, open_cost, opened_ts, last_ts"
+        if grid is not None:
+            rows = db.execute(f"SELECT {cols} FROM grids WHERE symbol = ? AND grid = ?", (symbol, str(grid)))
+        else:
+            rows = db.execute(f"SELECT {cols} FROM grids WHERE symbol = ? ORDER BY realized DESC LIMIT ?", (symbol, top))
+        out = []
+        for r in rows:
+            r = dict(r)
+            r["avg_hold_sec"] = r["hold_sec"] / r["round_trips"] if r["round_trips"] else None
+            out.append(r)
+        return out
+
+    # since는 시각 또는 (시각, id) 커서. 같은 시각의 체결이 페이지 경계에 걸려도 id로 이어받는다
+    def fills(self, symbol, since=None, until=None, grid=None, side=None, limit=100):
+        where, params = ["symbol = ?"], [symbol]
+        if grid is not None:
+            where.append("grid = ?")
+            params.append(str(grid))
+        if side is not None:
+            where.append("side = ?")
+            params.append(side)
+        if isinstance(since, tuple):
+            where.append("(ts, id) > (?, ?)")
+            params.extend(since)
+        elif since is not None:
+            where.append("ts > ?")
+            params.append(since)
+        if until is not None:
+            where.append("ts <= ?")
+            params.append(until)
+        # since가 있으면 그 뒤로 오래된 순(페이지 넘김), 없으면 최근 limit건
+        order = "ASC" if since is not None else "DESC"
+        rows = [dict(r) for r in self.reader().execute(
+            f"SELECT {FILL_COLUMNS} FROM fills WHERE {' AND '.join(where)} ORDER BY ts {order}, id {order} LIMIT ?", params + [limit])]
+        return rows if since is not None else rows[::-1]
+
+# ---------- HTTP 뷰 (엔진 내 Flask와 API 프로세스가 공용) ----------
+def pnl_view(ledger, symbol, mark, args):
+    out = ledger.pnl(symbol, mark, days=args.get("days", 7, type=int), top=args.get("top", 10, type=int))
+    if args.get("grid"):
+        out["grid"] = (ledger.grid_stats(symbol, grid=args["grid"]) or [None])[0]
+    return out
+
+def parse_cursor(value):
+    if value is None:
+        return None
+    ts, sep, fill_id = value.partition(":")
+    return (float(ts), int(fill_id)) if sep else float(ts)
+
+def fills_view(ledger, symbol, args):
+    limit = min(args.get("limit", 100, type=int), 1000)
+    since = args.get("since", type=parse_cursor)
+    rows = ledger.fills(symbol, since=since, until=args.get("until", type=float), grid=args.get("grid"),
+                        side=args.get("side"), limit=limit)
+    last = rows[-1] if since is not None and len(rows) == limit else None
+    return {"symbol": symbol, "fills": rows, "next_since": f"{last['ts']!r}:{last['id']}" if last else None}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Query or seed the grid bot trade ledger")
+    ap.add_argument("--db", default=LEDGER_FILE)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("pnl", help="realized/unrealized PnL, daily rollups and top grids")
+    p.add_argument("symbol")
+    p.add_argument("--mark", type=float, help="price for unrealized PnL")
+    p.add_argument("--days", type=int, default=7)
+    f = sub.add_parser("fills", help="fills for a symbol, oldest first after --since")
+    f.add_argument("symbol")
+    f.add_argument("--since", type=parse_cursor, help="epoch seconds or a ts:id cursor from next_since")
+    f.add_argument("--grid")
+    f.add_argument("--side", choices=("buy", "sell"))
+    f.add_argument("--limit", type=int, default=50)
+    im = sub.add_parser("import", help="seed an empty ledger from a state file's fill history")
+    im.add_argument("path")
+    im.add_argument("--symbol", required=True)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "import":
+        import gridstore
+        ledger = Ledger(args.db)
+        if args.symbol in ledger.positions:
+            sys.exit(f"{args.db} already has fills for {args.symbol}")
+        fills = sorted(gridstore.load_any(args.path)["fills"], key=lambda x: x["ts"] or 0.0)
+        ledger.add(args.symbol, fills)
+        print(f"{args.path}: {len(fills)} fills -> {args.db}", file=sys.stderr)
+        return
+    ledger = Ledger(args.db, readonly=True)
+    if not ledger.available():
+        sys.exit(f"{args.db} not found")
+    t0 = time.perf_counter()
+    if args.cmd == "pnl":
+        out = ledger.pnl(args.symbol.upper(), args.mark, days=args.days)
+    else:
+        out = ledger.fills(args.symbol.upper(), since=args.since, grid=args.grid, side=args.side, limit=args.limit)
+    print(json.dumps(out, indent=2, ensure_ascii=False))
+    print(f"query {(time.perf_counter() - t0) * 1000:.2f}ms", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
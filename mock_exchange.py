@@ -0,0 +1,203 @@
+import os, time, random, threading, itertools
+
+# 로컬 테스트용 ccxt 흉내 거래소: 시세 랜덤워크 + 지정가 주문장 매칭(지정가에 maker 체결)
+# engine_factory를 주면 심볼별 fillsim.FillSim이 매칭(부분체결/큐/수수료/지연)
+# 사용: EXCHANGE=mock SIMULATION=false TEST_MODE=false python app.py
+
+try:
+    from ccxt import DuplicateOrderId, InsufficientFunds, OrderNotFound
+except ImportError:
+    class DuplicateOrderId(Exception): pass
+    class InsufficientFunds(Exception): pass
+    class OrderNotFound(Exception): pass
+
+MOCK_PRICE = float(os.getenv("MOCK_PRICE", 70_000_000))
+MOCK_VOL = float(os.getenv("MOCK_VOL", 0.002))
+MOCK_BALANCE = float(os.getenv("MOCK_BALANCE", 10_000_000))
+MOCK_FEE = float(os.getenv("MOCK_FEE", 0.0005))
+
+class MockExchange:
+    id = "mock"
+    rateLimit = 50
+
+    def __init__(self, config=None, price=MOCK_PRICE, vol=MOCK_VOL, balance=MOCK_BALANCE, fee=MOCK_FEE, seed=42, engine_factory=None):
+        self.config = config or {}
+        self.has = {"fetchTickers": True, "fetchOpenOrders": True, "fetchClosedOrders": True, "fetchMyTrades": True}
+        self.vol = vol
+        self.fee = fee
+        self.rnd = random.Random(seed)
+        self.lock = threading.RLock()
+        self.start_price = price
+        self.prices = {}
+        self.balances = {"KRW": balance}
+        self.orders = {}
+        self.by_cid = {}
+        self.trades = []
+        self.calls = {}
+        self._ids = itertools.count(1)
+        self.markets = None
+        self.engine_factory = engine_factory
+        self.engines = {}
+        self.by_sim = {}
+
+    def fund(self, asset, amount):
+        with self.lock:
+            self.balances[asset] = self.balances.get(asset, 0.0) + amount
+
+    def _engine(self, symbol):
+        if symbol not in self.engines:
+            self.engines[symbol] = self.engine_factory(symbol)
+        return self.engines[symbol]
+
+    def _call(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def load_markets(self, reload=False):
+        self._call("load_markets")
+        quotes = {"KRW": (5000, 8), "USDT": (0.5, 8), "BTC": (None, 8)}
+        self.markets = {}
+        for sym in set(self.prices) | {"BTC/KRW", "ETH/KRW", "XRP/KRW"}:
+            min_cost, amt_prec = quotes.get(sym.split("/")[1], (None, 8))
+            self.markets[sym] = {"symbol": sym, "precision": {"price": None, "amount": amt_prec},
+                                 "limits": {"cost": {"min": min_cost}, "amount": {"min": None}}}
+        return self.markets
+
+    # 시세 이동과 매칭은 조회 시점에 일어난다
+    def set_price(self, symbol, price):
+        with self.lock:
+            self.prices[symbol] = float(price)
+            self._match(symbol)
+
+    def _step(self, symbol):
+        px = self.prices.get(symbol, self.start_price)
+        self.set_price(symbol, round(px * (1 + self.rnd.uniform(-self.vol, self.vol)), 0))
+
+    def _match(self, symbol):
+        px = self.prices[symbol]
+        if self.engine_factory:
+            for sim_id, _, _, price, qty, fee, _ in self._engine(symbol).on_trade(time.time(), px):
+                self._fill(self.orders[self.by_sim[(symbol, sim_id)]], price, qty, fee)
+            return
+        for o in list(self.orders.values()):
+            if o["status"] != "open" or o["symbol"] != symbol:
+                continue
+            if (o["side"] == "buy" and px <= o["price"]) or (o["side"] == "sell" and px >= o["price"]):
+                self._fill(o, o["price"], o["remaining"], o["price"] * o["remaining"] * self.fee)
+
+    def _fill(self, o, price, qty, fee):
+        base, quote = o["symbol"].split("/")
+        cost = price * qty
+        if o["side"] == "buy":
+            self.balances[base] = self.balances.get(base, 0.0) + qty
+            self.balances[quote] += o["price"] * qty - cost - fee
+        else:
+            self.balances[quote] = self.balances.get(quote, 0.0) + cost - fee
+        now = int(time.time() * 1000)
+        o["filled"] += qty
+        o["cost"] += cost
+        o["remaining"] = o["amount"] - o["filled"]
+        o["average"] = o["cost"] / o["filled"]
+        o["fee"] = {"currency": quote, "cost": (o["fee"] or {}).get("cost", 0.0) + fee}
+        o["lastTradeTimestamp"] = now
+        if o["remaining"] <= o["amount"] * 1e-9:
+            o.update(status="closed", remaining=0.0)
+        self.trades.append({"id": str(len(self.trades) + 1), "order": o["id"], "symbol": o["symbol"], "side": o["side"],
+                            "price": price, "amount": qty, "cost": cost,
+                            "fee": {"currency": quote, "cost": fee}, "timestamp": now})
+
+    def fetch_ticker(self, symbol):
+        self._call("fetch_ticker")
+        with self.lock:
+            self._step(symbol)
+            return {"symbol": symbol, "last": self.prices[symbol]}
+
+    def fetch_tickers(self, symbols=None):
+        self._call("fetch_tickers")
+        with self.lock:
+            for sym in symbols or list(self.prices):
+                self._step(sym)
+            return {sym: {"symbol": sym, "last": self.prices[sym]} for sym in (symbols or self.prices)}
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        self._call("create_order")
+        cid = (params or {}).get("clientOrderId")
+        with self.lock:
+            if cid and cid in self.by_cid:
+                raise DuplicateOrderId(f"mock: duplicate clientOrderId {cid}")
+            base, quote = symbol.split("/")
+            if side == "buy":
+                need, asset = price * amount, quote
+            else:
+                need, asset = amount, base
+            if self.balances.get(asset, 0.0) + 1e-12 < need:
+                raise InsufficientFunds(f"mock: insufficient {asset} ({self.balances.get(asset, 0.0)} < {need})")
+            self.balances[asset] -= need
+            o = {"id": f"M{next(self._ids)}", "clientOrderId": cid, "symbol": symbol, "type": type, "side": side,
+                 "price": float(price), "amount": float(amount), "filled": 0.0, "remaining": float(amount),
+                 "average": None, "cost": 0.0, "fee": None, "status": "open", "timestamp": int(time.time() * 1000)}
+            self.orders[o["id"]] = o
+            if cid:
+                self.by_cid[cid] = o["id"]
+            if self.engine_factory:
+                o["sim_id"] = self._engine(symbol).submit(time.time(), side, price, amount)
+                self.by_sim[(symbol, o["sim_id"])] = o["id"]
+            elif symbol in self.prices:
+                self._match(symbol)
+            return dict(o)
+
+    def cancel_order(self, id, symbol=None, params=None):
+        self._call("cancel_order")
+        with self.lock:
+            o = self.orders.get(id)
+            if o is None or o["status"] != "open":
+                raise OrderNotFound(f"mock: order {id} not open")
+            if "sim_id" in o:
+                self._engine(o["symbol"]).cancel(o["sim_id"])
+            base, quote = o["symbol"].split("/")
+            if o["side"] == "buy":
+                self.balances[quote] += o["price"] * o["remaining"]
+            else:
+                self.balances[base] += o["remaining"]
+            o["status"] = "canceled"
+            return dict(o)
+
+    def fetch_order(self, id, symbol=None, params=None):
+        self._call("fetch_order")
+        with self.lock:
+            if id not in self.orders:
+                raise OrderNotFound(f"mock: order {id} not found")
+            return dict(self.orders[id])
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        self._call("fetch_open_orders")
+        with self.lock:
+            return [dict(o) for o in self.orders.values() if o["status"] == "open" and symbol in (None, o["symbol"])]
+
+    def fetch_closed_orders(self, symbol=None, since=None, limit=None, params=None):
+        self._call("fetch_closed_orders")
+        with self.lock:
+            out = [dict(o) for o in self.orders.values()
+                   if o["status"] != "open" and symbol in (None, o["symbol"]) and (since is None or o["timestamp"] >= since)]
+            return out[-limit:] if limit else out
+
+    def fetch_my_trades(self, symbol=None, since=None, limit=None, params=None):
+        self._call("fetch_my_trades")
+        with self.lock:
+            out = [dict(t) for t in self.trades if symbol in (None, t["symbol"]) and (since is None or t["timestamp"] >= since)]
+            return out[-limit:] if limit else out
+
+    def fetch_balance(self, params=None):
+        self._call("fetch_balance")
+        with self.lock:
+            return {"free": dict(self.balances)}
+
+_shared = None
+_shared_lock = threading.Lock()
+
+# 시세 피드/스펙/주문 백엔드가 같은 주문장을 보도록 프로세스당 하나
+def shared(config=None):
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = MockExchange(config)
+        return _shared
@@ -0,0 +1,164 @@
+import os, sys, csv, json, time, random, argparse, itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+import gridcore
+import backtest
+
+# 전략 프리셋 파라미터 탐색: 가격 배열은 공유 메모리에 한 번만 올리고 워커 프로세스들이 백테스트를 나눠 돌린다
+# 사용: python sweep.py btc_1m.csv --up 0.005,0.01,0.02 --down 0.005,0.01,0.02 --n-grids 20,30,40 --mode equal,geometric
+#       python sweep.py btc_1m.csv --random 2000 --up 0.003:0.05 --down 0.003:0.05 --n-grids 10:80 --export strategy_profiles.json
+
+PRICE_FIELDS = ("ts", "low", "high", "close")
+
+_shared = {}
+_prices = None
+_kind = None
+_resampled = {}
+
+def share_prices(prices):
+    blocks = {}
+    for name in PRICE_FIELDS:
+        arr = np.ascontiguousarray(prices[name], dtype=np.float64)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=np.float64, buffer=shm.buf)[:] = arr
+        blocks[name] = shm
+    return blocks
+
+def _init_worker(names, length, kind):
+    global _prices, _kind
+    for name, shm_name in names.items():
+        _shared[name] = shared_memory.SharedMemory(name=shm_name)
+    _prices = {name: np.ndarray((length,), dtype=np.float64, buffer=shm.buf) for name, shm in _shared.items()}
+    _kind = kind
+
+def _prices_for(interval, stream):
+    if _kind != "tick" or not interval:
+        return _prices
+    key = (interval, stream)
+    if key not in _resampled:
+        _resampled[key] = backtest.resample_ticks({**_prices, "kind": _kind}, interval, stream)
+    return _resampled[key]
+
+def run_one(params):
+    prices = _prices_for(params["interval"], params["stream"])
+    p0 = float(prices["close"][0])
+    low = p0 * (1.0 - params["down_pct"])
+    high = p0 * (1.0 + params["up_pct"])
+    res = backtest.run_backtest(prices, low, high, params["n_grids"], params["padding"], params["mode"],
+                                params["symbol"], params["total_krw"], params["fee"], params["slippage"], params["recycle"])
+    s = res["summary"]
+    return {**params, "pnl": s["pnl"], "pnl_pct": s["pnl_pct"], "max_drawdown_pct": s["max_drawdown_pct"],
+            "turnover": s["turnover"], "fees": s["fees"], "fills": s["fills"], "rejected_levels": s["rejected_levels"]}
+
+def parse_values(spec, cast):
+    if ":" in spec:
+        lo, hi = spec.split(":", 1)
+        return ("range", cast(lo), cast(hi))
+    return ("list", [cast(v) for v in spec.split(",") if v.strip()])
+
+def expand(spec, rnd=None):
+    if spec[0] == "list":
+        return rnd.choice(spec[1]) if rnd else spec[1]
+    _, lo, hi = spec
+    if rnd is None:
+        raise SystemExit("lo:hi ranges need --random N")
+    return rnd.randint(lo, hi) if isinstance(lo, int) else rnd.uniform(lo, hi)
+
+def param_space(args):
+    specs = {
+        "up_pct": parse_values(args.up, float),
+        "down_pct": parse_values(args.down, float),
+        "n_grids": parse_values(args.n_grids, int),
+        "interval": parse_values(args.interval, float),
+        "mode": ("list", args.mode.split(",")),
+    }
+    fixed = {"padding": args.padding, "symbol": args.symbol, "total_krw": args.total_krw, "fee": args.fee,
+             "slippage": args.slippage, "recycle": args.recycle, "stream": args.stream}
+    if args.random:
+        rnd = random.Random(args.seed)
+        return [{**{k: expand(v, rnd) for k, v in specs.items()}, **fixed} for _ in range(args.random)]
+    keys = list(specs)
+    return [{**dict(zip(keys, combo)), **fixed} for combo in itertools.product(*(expand(specs[k]) for k in keys))]
+
+RANKINGS = {
+    "pnl": lambda r: (-r["pnl"], r["max_drawdown_pct"]),
+    "drawdown": lambda r: (r["max_drawdown_pct"], -r["pnl"]),
+    "turnover": lambda r: (-r["turnover"], -r["pnl"]),
+    "calmar": lambda r: (-(r["pnl_pct"] / max(r["max_drawdown_pct"], 1e-9)), -r["pnl"]),
+}
+
+def to_profiles(results, prefix):
+    profiles = {}
+    for i, r in enumerate(results, 1):
+        profiles[f"{prefix}{i}"] = {
+            "name": f"Sweep #{i} (PnL {r['pnl_pct']:+.2f}%, MDD {r['max_drawdown_pct']:.2f}%)",
+            "up_pct": round(r["up_pct"], 6), "down_pct": round(r["down_pct"], 6), "n_grids": int(r["n_grids"]),
+            "padding": r["padding"], "interval": r["interval"], "grid_mode": r["mode"],
+            "target_note": "다음 그리드 도달 시 매도",
+        }
+    return profiles
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Parallel parameter sweep of grid strategy profiles over historical data")
+    ap.add_argument("data", help="CSV accepted by backtest.py")
+    ap.add_argument("--up", default="0.008,0.015,0.025", help="list a,b,c or range lo:hi (with --random)")
+    ap.add_argument("--down", default="0.010,0.015,0.030")
+    ap.add_argument("--n-grids", default="20,30,40")
+    ap.add_argument("--interval", default="3,5", help="tick data only; ignored for OHLCV bars")
+    ap.add_argument("--mode", default="equal,geometric")
+    ap.add_argument("--random", type=int, help="sample N random combinations instead of the full grid")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--padding", type=float, default=0.0)
+    ap.add_argument("--symbol", default=gridcore.SYMBOL)
+    ap.add_argument("--total-krw", type=float, default=gridcore.TOTAL_KRW)
+    ap.add_argument("--fee", type=float, default=backtest.DEFAULT_FEE)
+    ap.add_argument("--slippage", type=float, default=gridcore.SIM_SLIPPAGE)
+    ap.add_argument("--recycle", action="store_true")
+    ap.add_argument("--stream", action="store_true")
+    ap.add_argument("--workers", type=int, default=os.cpu_count())
+    ap.add_argument("--rank", default="pnl", choices=sorted(RANKINGS))
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--csv", help="write every result row to this CSV")
+    ap.add_argument("--export", help="write the top results as STRATEGY_PROFILES entries (JSON)")
+    ap.add_argument("--prefix", default="sweep")
+    args = ap.parse_args(argv)
+
+    prices = backtest.load_prices(args.data)
+    if prices["kind"] != "tick":
+        args.interval = args.interval.split(",")[0].split(":")[0]
+    space = param_space(args)
+    blocks = share_prices(prices)
+    t0 = time.perf_counter()
+    try:
+        names = {k: shm.name for k, shm in blocks.items()}
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(names, len(prices["close"]), prices["kind"])) as pool:
+            results = list(pool.map(run_one, space, chunksize=max(1, len(space) // (args.workers * 8))))
+    finally:
+        for shm in blocks.values():
+            shm.close()
+            shm.unlink()
+    elapsed = time.perf_counter() - t0
+
+    results.sort(key=RANKINGS[args.rank])
+    print(f"{len(results)} combinations on {len(prices['close'])} rows in {elapsed:.1f}s ({args.workers} workers)", file=sys.stderr)
+    print(f"{'rank':>4} {'up':>7} {'down':>7} {'grids':>5} {'itv':>4} {'mode':>9} {'pnl%':>8} {'mdd%':>7} {'turnover':>14} {'fills':>6}")
+    for i, r in enumerate(results[:args.top], 1):
+        print(f"{i:>4} {r['up_pct']:>7.4f} {r['down_pct']:>7.4f} {r['n_grids']:>5} {r['interval']:>4g} {r['mode']:>9} "
+              f"{r['pnl_pct']:>8.3f} {r['max_drawdown_pct']:>7.3f} {r['turnover']:>14,.0f} {r['fills']:>6}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=list(results[0]))
+            w.writeheader()
+            w.writerows(results)
+    if args.export:
+        profiles = to_profiles(results[:args.top], args.prefix)
+        with open(args.export, "w") as f:
+            json.dump(profiles, f, indent=2, ensure_ascii=False)
+        print(f"exported {len(profiles)} profiles -> {args.export} (load with STRATEGY_PROFILES_FILE)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import os, sys, importlib
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# app은 import 시점에 상태/원장/로그 파일을 만들므로 임시 디렉터리에서 오프라인 설정으로 한 번만 불러온다
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("app")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.environ.update({"SIMULATION": "true", "TEST_MODE": "true", "TELEGRAM_BOT_TOKEN": "", "TELEGRAM_CHAT_ID": "",
+                       "PRICE_FEED": "rest", "RUN_MODE": "all", "NEWS_ENABLED": "false", "SYMBOLS": ""})
+    sys.path.insert(0, ROOT)
+    try:
+        yield importlib.import_module("app")
+    finally:
+        os.chdir(cwd)
+
+@pytest.mark.parametrize("text, pos, neg", [
+    ("SEC approved the spot ETFs", 2, 0),
+    ("Institutional adoption keeps growing", 2, 0),
+    ("Exchange hacked, regulators weigh a ban", 0, 3),
+    ("Bullish bulls vs bearish shorts", 1, 2),
+    ("Restrictions after the sell-off", 0, 2),
+])
+def test_inflections_match(app, text, pos, neg):
+    hits = app.KeywordMatcher().scan(text)
+    assert (hits["pos"], hits["neg"]) == (pos, neg)
+
+@pytest.mark.parametrize("text", [
+    "That is no longer relevant",
+    "Interest-bearing notes",
+    "Regulators banish the old rule",
+    "A shorter timeframe",
+    "Countdown to the halving",
+    "Banking partner program",
+])
+def test_unrelated_words_do_not_match(app, text):
+    hits = app.KeywordMatcher(pos=["long"], neg=["bear", "ban", "short", "down"]).scan(text)
+    assert (hits["pos"], hits["neg"]) == (0, 0)
+
+def test_include_keywords_match_plural_only(app):
+    m = app.KeywordMatcher(["bitcoin"])
+    assert m.scan("Bitcoins rally")["include"] == 1
+    assert m.scan("Bitcoiner meetup")["include"] == 0
@@ -0,0 +1,104 @@
+import os, sys, csv, json, time, base64, hashlib, argparse, socketserver
+
+# 녹화된 틱(csv: ts,price)을 Upbit WebSocket ticker 형식으로 재생하는 로컬 서버
+# 사용: python ws_replay.py ticks.csv --port 8765 --speed 10
+#       PRICE_FEED=stream STREAM_URL=ws://127.0.0.1:8765 TEST_MODE=false python app.py
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+def load_ticks(path):
+    ticks = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            ts = float(row.get("ts") or row.get("timestamp"))
+            if ts > 1e11:
+                ts /= 1000.0
+            ticks.append((ts, float(row.get("price") or row.get("close"))))
+    return ticks
+
+def encode_frame(payload, opcode=0x2):
+    n = len(payload)
+    if n < 126:
+        header = bytes([0x80 | opcode, n])
+    elif n < 65536:
+        header = bytes([0x80 | opcode, 126]) + n.to_bytes(2, "big")
+    else:
+        header = bytes([0x80 | opcode, 127]) + n.to_bytes(8, "big")
+    return header + payload
+
+def read_frame(rfile):
+    b1, b2 = rfile.read(2)
+    n = b2 & 0x7F
+    if n == 126:
+        n = int.from_bytes(rfile.read(2), "big")
+    elif n == 127:
+        n = int.from_bytes(rfile.read(8), "big")
+    mask = rfile.read(4) if b2 & 0x80 else b"\0\0\0\0"
+    data = rfile.read(n)
+    return b1 & 0x0F, bytes(c ^ mask[i % 4] for i, c in enumerate(data))
+
+class ReplayHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        headers = {}
+        self.rfile.readline()
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                break
+            k, _, v = line.partition(":")
+            headers[k.strip().lower()] = v.strip()
+        accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + WS_GUID).encode()).digest()).decode()
+        self.wfile.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                          f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+
+        codes = [self.server.code]
+        opcode, data = read_frame(self.rfile)
+        if opcode in (0x1, 0x2):
+            for part in json.loads(data):
+                if part.get("type") in ("ticker", "trade") and part.get("codes"):
+                    codes = part["codes"]
+
+        try:
+            self.replay(codes)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def replay(self, codes):
+        ticks = self.server.ticks
+        while True:
+            start_wall, start_ts = time.monotonic(), ticks[0][0]
+            for ts, price in ticks:
+                delay = (ts - start_ts) / self.server.speed - (time.monotonic() - start_wall)
+                if delay > 0:
+                    time.sleep(delay)
+                for code in codes:
+                    msg = {"type": "ticker", "code": code, "trade_price": price, "timestamp": int(ts * 1000), "stream_type": "REALTIME"}
+                    self.wfile.write(encode_frame(json.dumps(msg).encode()))
+            if not self.server.loop:
+                self.wfile.write(encode_frame(b"", opcode=0x8))
+                return
+
+class ReplayServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay recorded ticks as an Upbit-style WebSocket ticker stream")
+    ap.add_argument("ticks", help="CSV with ts(or timestamp),price(or close) columns")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=int(os.getenv("REPLAY_PORT", 8765)))
+    ap.add_argument("--speed", type=float, default=1.0, help="playback speed multiplier")
+    ap.add_argument("--code", default="KRW-BTC", help="market code when the client does not subscribe to one")
+    ap.add_argument("--loop", action="store_true", help="restart from the first tick when the file ends")
+    args = ap.parse_args(argv)
+
+    server = ReplayServer((args.host, args.port), ReplayHandler)
+    server.ticks = load_ticks(args.ticks)
+    server.speed = args.speed
+    server.code = args.code
+    server.loop = args.loop
+    print(f"replaying {len(server.ticks)} ticks on ws://{args.host}:{args.port} x{args.speed}", file=sys.stderr)
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# gunicorn 진입점: gunicorn wsgi:app -k gthread --threads 8 (엔진은 RUN_MODE=engine python app.py)
+from api import app